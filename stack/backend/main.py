@@ -16,6 +16,8 @@ from services.activity_monitor import AgentActivityMonitor
 from services.agents.neuralizer import Neuralizer
 from services.clients.llm import LlamaCppClient
 from services.mcp_client import get_mcp_client, shutdown_mcp_client
+from services.scrub_index import ScrubReaper
+from services.scrub_jobs import ScrubJobQueue
 from websockets.prompt_stream import prompt_stream
 
 DEV_MODE = os.getenv("DEV_MODE", "false").lower() == "true"
@@ -54,9 +56,19 @@ async def lifespan(app: FastAPI):
             monitor=app.state.monitor,
         )
 
-        # Start MCP subprocess
+        # Start MCP pool: subprocesses (prompt ones now, file ones on use),
+        # or networked scrub servers with SCRUB_MCP_ENDPOINTS
         app.state.mcp = await get_mcp_client()
-        logger.info("MCP client started")
+        logger.info("MCP pool started")
+
+        # Background file scrub jobs (the pool's file sub-pool)
+        app.state.scrub_jobs = ScrubJobQueue(
+            redis, app.state.neuralizer, client=app.state.mcp
+        )
+        await app.state.scrub_jobs.start()
+        # Deletes job files past SCRUB_JOB_TTL_SECS / SCRUB_STORAGE_QUOTA_MB
+        app.state.scrub_reaper = ScrubReaper(redis)
+        await app.state.scrub_reaper.start()
 
     except Exception as e:
         logger.error(f"Startup failed: {e}")
@@ -65,8 +77,11 @@ async def lifespan(app: FastAPI):
     yield
 
     # Clean shutdown
+    await app.state.scrub_reaper.stop()
+    await app.state.scrub_jobs.stop()
+    logger.info("Scrub job queue stopped")
     await shutdown_mcp_client()
-    logger.info("MCP client stopped")
+    logger.info("MCP pool stopped")
     await redis.close()
     logger.info("Redis connection closed")
 
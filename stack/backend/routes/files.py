@@ -1,25 +1,61 @@
-"""File upload interception — validate, detect, scrub, publish."""
+"""File upload interception — validate, save, queue for detection/scrubbing.
 
-import json
+gzip and zstd uploads are kept compressed on disk: the checks run on the
+decompressed stream as it arrives, and the scrubber decompresses as it reads.
+"""
+
+import asyncio
+import codecs
+import hashlib
 import logging
 import os
 from pathlib import Path
+from typing import Optional
 from uuid import uuid4
 
 import httpx
 import magic
-from fastapi import APIRouter, File, HTTPException, Request, UploadFile
-from fastapi.responses import StreamingResponse
-
-from services.mcp_client import get_mcp_client
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse, Response, StreamingResponse
+
+from services.scrub_index import ACTIVE_STATES, storage_metrics, touch
+from services.scrub_jobs import (
+    ScrubJob,
+    get_job_status,
+    output_codec_for,
+    publish_file_event,
+)
+from services.scrub_store import blob_path
+from utils.compression import (
+    ENCODINGS,
+    SUFFIXES,
+    Inflater,
+    available_codecs,
+    iter_decompressed,
+    sniff_codec,
+    strip_suffix,
+)
 from utils.paths import scrub_sandbox
+from utils.uploads import UploadFormError, iter_upload
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1")
 
 SCRUB_FILE_LIMIT = int(os.getenv("SCRUB_FILE_LIMIT_KB", "2048")) * 1024
+# Decompressed size allowed for a gzip/zstd upload (default 32x the file limit)
+SCRUB_INFLATED_LIMIT = (
+    int(os.getenv("SCRUB_FILE_INFLATED_LIMIT_KB", "0")) * 1024 or 32 * SCRUB_FILE_LIMIT
+)
 OPENWEBUI_URL = os.getenv("OPENWEBUI_URL", "http://open-webui:8081")
+# Leading bytes handed to libmagic for the MIME check
+SNIFF_BYTES = 2048
+# Multipart framing allowed on top of SCRUB_FILE_LIMIT in Content-Length
+FORM_OVERHEAD_BYTES = 64 * 1024
+# Leading bytes that identify a compressed upload (longest magic)
+CODEC_SNIFF_BYTES = 4
+# Download chunk per ASGI send (file reads and on-the-fly decompression)
+DOWNLOAD_CHUNK_BYTES = 1024 * 1024
 
 ALLOWED_TYPES = {
     "text/plain",
@@ -38,194 +74,284 @@ REJECTED_TYPES = {
 }
 
 
-async def _publish_file_event(
-    redis,
-    filename: str,
-    status: str,
-    event_type: str = "file_event",
-    content: str = "",
-    **extra,
-):
-    """Publish file event to panel.
+async def _proxy_file_to_openwebui(
+    filename: str, path: Path, content_type: Optional[str]
+) -> dict:
+    """Proxy file upload to Open WebUI for normal processing."""
+    upload = await asyncio.to_thread(open, path, "rb")
+    try:
+        async with httpx.AsyncClient(timeout=60.0) as client:
+            files = {"file": (filename, upload, content_type or "text/plain")}
+            resp = await client.post(f"{OPENWEBUI_URL}/api/v1/files", files=files)
+            return resp.json()
+    finally:
+        upload.close()
 
-    Required fields: {prompt, sanitized, status}
-    Extra metadata included for future use.
-    """
-    payload = {
-        # Required by frontend
-        "prompt": f"[File Upload: {filename}]",
-        "sanitized": content,
-        "status": status,
-        # Extra metadata
-        "type": event_type,
-        "filename": filename,
-        **extra,
-    }
-    await redis.publish("prompt_intercept", json.dumps(payload))
 
+class _UploadRejected(Exception):
+    """Upload failed validation — becomes an HTTP error plus a panel event."""
+
+    def __init__(self, status_code: int, error: str):
+        super().__init__(error)
+        self.status_code = status_code
+        self.error = error
+
+
+def _check_mime(head: bytes) -> str:
+    """Sniff the MIME type from the first bytes; reject non-text types."""
+    mime = magic.from_buffer(head, mime=True)
+    for prefix, msg in REJECTED_TYPES.items():
+        if mime.startswith(prefix) or mime == prefix:
+            raise _UploadRejected(415, msg)
+
+    if mime not in ALLOWED_TYPES and not mime.startswith("text/"):
+        raise _UploadRejected(415, f"Unsupported file type: {mime}")
+    return mime
+
+
+def _too_large(
+    size: int, limit: int = SCRUB_FILE_LIMIT, what="File"
+) -> _UploadRejected:
+    return _UploadRejected(
+        413,
+        f"{what} too large ({size // 1024} KB). Max {limit // 1024} KB.",
+    )
 
-async def _proxy_file_to_openwebui(file: UploadFile, content: bytes) -> dict:
-    """Proxy file upload to Open WebUI for normal processing."""
-    async with httpx.AsyncClient(timeout=60.0) as client:
-        # Reset file position and send to Open WebUI
-        files = {"file": (file.filename, content, file.content_type or "text/plain")}
-        resp = await client.post(f"{OPENWEBUI_URL}/api/v1/files", files=files)
-        return resp.json()
+
+class _TextCheck:
+    """MIME, UTF-8 and size checks over the (decompressed) file content."""
+
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit
+        self.decoder = codecs.getincrementaldecoder("utf-8")()
+        self.is_utf8 = True
+        self.mime: Optional[str] = None
+        self.head = b""
+        self.size = 0
+        self.digest = hashlib.sha256()  # Content address (see scrub_store.py)
+
+    async def add(self, data: bytes) -> None:
+        self.size += len(data)
+        self.digest.update(data)
+        if self.limit is not None and self.size > self.limit:
+            raise _too_large(self.size, self.limit, "Decompressed file")
+        if self.mime is None:
+            self.head += data
+            if len(self.head) < SNIFF_BYTES:
+                return
+            self.mime = await asyncio.to_thread(_check_mime, self.head)
+            data, self.head = self.head, b""
+        self.is_utf8 = self.is_utf8 and _decodes(self.decoder, data)
+
+    async def finish(self) -> None:
+        if self.mime is None:  # Shorter than SNIFF_BYTES
+            self.mime = await asyncio.to_thread(_check_mime, self.head)
+            self.is_utf8 = _decodes(self.decoder, self.head)
+        self.is_utf8 = self.is_utf8 and _decodes(self.decoder, b"", final=True)
+
+
+def _upload_inflater(head: bytes) -> Optional[Inflater]:
+    """Inflater for a gzip/zstd upload, None for an uncompressed one."""
+    codec = sniff_codec(head)
+    if codec is None:
+        return None
+    if codec not in available_codecs():
+        raise _UploadRejected(415, f"{codec} compressed files are not supported.")
+    return Inflater(codec)
+
+
+async def _receive_upload(
+    request: Request, part_path: Path, uploaded: dict
+) -> tuple[str, bool, Optional[str], str]:
+    """Stream the "file" field to part_path, validating as bytes arrive.
+
+    The size limit is enforced per chunk, the MIME type is sniffed from the
+    first SNIFF_BYTES and UTF-8 is checked incrementally, so memory stays at
+    about one network chunk. File writes and libmagic run in threads.
+    uploaded["filename"] is set as soon as the part headers arrive.
+
+    A gzip/zstd upload is saved as sent; SCRUB_FILE_LIMIT applies to the
+    compressed bytes, and the MIME/UTF-8 checks and SCRUB_INFLATED_LIMIT to
+    the decompressed stream, which is never held whole.
+
+    Returns:
+        (MIME type, whether the file is valid UTF-8, compression codec or
+        None, SHA-256 hex digest of the decompressed content)
+
+    Raises:
+        _UploadRejected: On a malformed form, bad filename, size, type or
+            corrupt compressed data
+    """
+    declared = int(request.headers.get("content-length") or 0)
+    check = _TextCheck(None)
+    inflater = None
+    pending = b""  # Until the codec is known
+    sniffed = False
+    size = 0
+    outfile = None
+
+    async def add(data: bytes) -> None:
+        await asyncio.to_thread(outfile.write, data)
+        if inflater is None:
+            await check.add(data)
+            return
+        for piece in inflater.feed(data):
+            await check.add(piece)
+
+    try:
+        async for filename, chunk in iter_upload(request):
+            if outfile is None:
+                # 1. Sanitize filename
+                uploaded["filename"] = Path(filename).name
+                if not uploaded["filename"] or uploaded["filename"].startswith("."):
+                    raise _UploadRejected(400, "Invalid filename")
+                # Reject on the declared body size before reading the rest
+                if declared > SCRUB_FILE_LIMIT + FORM_OVERHEAD_BYTES:
+                    raise _too_large(declared)
+                await asyncio.to_thread(
+                    part_path.parent.mkdir, parents=True, exist_ok=True
+                )
+                outfile = await asyncio.to_thread(open, part_path, "wb")
+
+            # 2. Validate size as bytes arrive (always, regardless of mode)
+            size += len(chunk)
+            if size > SCRUB_FILE_LIMIT:
+                raise _too_large(size)
+
+            # 3. Compressed? Decided on the first bytes
+            if not sniffed:
+                pending += chunk
+                if len(pending) < CODEC_SNIFF_BYTES:
+                    continue
+                sniffed = True
+                inflater = _upload_inflater(pending)
+                if inflater is not None:
+                    check.limit = SCRUB_INFLATED_LIMIT
+                chunk, pending = pending, b""
+
+            # 4. Validate MIME on the first SNIFF_BYTES, UTF-8 incrementally
+            await add(chunk)
+
+        if not sniffed:  # Shorter than CODEC_SNIFF_BYTES
+            await add(pending)
+        if inflater is not None:
+            inflater.finish()
+        await check.finish()
+    except UploadFormError as e:
+        raise _UploadRejected(400, str(e))
+    except ValueError as e:  # Corrupt or truncated gzip/zstd
+        raise _UploadRejected(415, f"{e}.")
+    finally:
+        if outfile is not None:
+            await asyncio.to_thread(outfile.close)
+    codec = inflater and inflater.codec
+    return check.mime, check.is_utf8, codec, check.digest.hexdigest()
+
+
+def _decodes(decoder: codecs.IncrementalDecoder, data: bytes, final=False) -> bool:
+    try:
+        decoder.decode(data, final)
+    except UnicodeDecodeError:
+        return False
+    return True
 
 
 @router.post("/files")
-async def intercept_file_upload(request: Request, file: UploadFile = File(...)):
-    """Validate file, run detection, scrub if log, publish results.
+async def intercept_file_upload(request: Request):
+    """Validate and save the file, then queue it for detection and scrubbing.
+
+    Returns as soon as the job is queued — detection, scrubbing and the
+    panel events happen in the background (services/scrub_jobs.py). Poll
+    /files/status/{job_id} or watch prompt_intercept for progress.
 
     When scrubbing is OFF:
     - Non-text files: Rejected with error (always)
+    - Compressed files: Rejected with error
     - Text files: Proxied to Open WebUI for normal flow
     """
     redis = request.app.state.redis
-    neuralizer = request.app.state.neuralizer
     job_id = str(uuid4())[:8]
-
-    # Sanitize filename
-    safe_filename = Path(file.filename).name
-    if not safe_filename or safe_filename.startswith("."):
-        raise HTTPException(400, "Invalid filename")
+    uploaded = {"filename": ""}
+    part_path = scrub_sandbox.resolve(f"{job_id}.part", "in")
 
     try:
-        content = await file.read()
-
-        # 1. Validate size (always, regardless of mode)
-        if len(content) > SCRUB_FILE_LIMIT:
-            error = (
-                f"File too large ({len(content) // 1024} KB). "
-                f"Max {SCRUB_FILE_LIMIT // 1024} KB."
+        # 1-4. Stream to disk: filename, size, MIME and UTF-8 checks
+        try:
+            mime, is_utf8, codec, content_hash = await _receive_upload(
+                request, part_path, uploaded
             )
-            await _publish_file_event(redis, safe_filename, f"Error: {error}")
-            raise HTTPException(413, error)
-
-        # 2. Validate MIME
-        mime = magic.from_buffer(content[:2048], mime=True)
-        for prefix, msg in REJECTED_TYPES.items():
-            if mime.startswith(prefix) or mime == prefix:
-                await _publish_file_event(redis, safe_filename, f"Error: {msg}")
-                raise HTTPException(415, msg)
-
-        if mime not in ALLOWED_TYPES and not mime.startswith("text/"):
-            error = f"Unsupported file type: {mime}"
-            await _publish_file_event(redis, safe_filename, f"Error: {error}")
-            raise HTTPException(415, error)
-
-        # 3. Check scrubbing mode — if OFF, proxy text files to Open WebUI
+        except _UploadRejected as e:
+            await asyncio.to_thread(part_path.unlink, missing_ok=True)
+            if e.status_code != 400:
+                await publish_file_event(
+                    redis, uploaded["filename"], f"Error: {e.error}"
+                )
+            raise HTTPException(e.status_code, e.error)
+        safe_filename = uploaded["filename"]
+
+        # 5. Check scrubbing mode — if OFF, proxy text files to Open WebUI
         if not request.app.state.scrubbing_enabled:
-            return await _proxy_file_to_openwebui(file, content)
-
-        # 4. Decode
-        try:
-            text = content.decode("utf-8")
-        except UnicodeDecodeError:
+            if codec:
+                # Open WebUI would only see an opaque archive
+                await asyncio.to_thread(part_path.unlink, missing_ok=True)
+                error = "Compressed files are only accepted while scrubbing is on."
+                await publish_file_event(redis, safe_filename, f"Error: {error}")
+                raise HTTPException(415, error)
+            try:
+                return await _proxy_file_to_openwebui(safe_filename, part_path, mime)
+            finally:
+                await asyncio.to_thread(part_path.unlink, missing_ok=True)
+
+        if not is_utf8:
+            await asyncio.to_thread(part_path.unlink, missing_ok=True)
             error = "File does not appear to be valid text."
-            await _publish_file_event(redis, safe_filename, f"Error: {error}")
+            await publish_file_event(redis, safe_filename, f"Error: {error}")
             raise HTTPException(415, error)
 
-        # 5. Neuralizer detection (peek at sample to determine category)
-        detection = await neuralizer.detect(text[:4096])
-        category = detection.get("category", "")
-
-        # Fail-closed: detection errors block the upload
-        if category == "error":
-            error_msg = detection.get("summary", "Detection failed")
-            await _publish_file_event(redis, safe_filename, f"Error: {error_msg}")
-            raise HTTPException(
-                503, f"Detection failed: {error_msg}. Upload blocked for safety."
-            )
+        # 6. Complete the input file for the scrub job
+        in_path = scrub_sandbox.resolve(f"{job_id}.txt{SUFFIXES.get(codec, '')}", "in")
+        await asyncio.to_thread(part_path.rename, in_path)
+        input_filename = in_path.name
 
-        # 6. Determine scrub patterns based on category
-        # For log files: use ALL log + standard patterns (union)
-        # For other text: use ALL standard patterns
-        # Detection sample determines category, but we scrub entire file with all patterns
-        is_log = category == "log_file"
-
-        if not detection.get("needs_sanitization", False):
-            # Clean file — return fake success to Open WebUI
-            await _publish_file_event(
-                redis, safe_filename, "🛡️ Clean — no sensitive content detected"
-            )
-            return _fake_openwebui_response(job_id, safe_filename, "clean")
-
-        # 7. Save input file
-        input_filename = f"{job_id}.txt"
-        output_filename = f"{job_id}_{safe_filename}"
-        in_path = scrub_sandbox.resolve(input_filename, "in")
-        in_path.parent.mkdir(parents=True, exist_ok=True)
-        in_path.write_text(text)
-
-        # 8. Scrub file via MCP
-        # Log files: ALL log + standard patterns (catches emails, API keys in logs)
-        # Other text files: ALL standard patterns
-        mcp = await get_mcp_client()
-        if is_log:
-            all_patterns = [
-                "ip",
-                "private_ip",
-                "internal_url",
-                "timestamp",
-                "endpoint",
-                "user",  # log
-                "email",
-                "phone",
-                "name",
-                "api_key",
-                "secret",
-                "bearer",
-                "path",
-                "resource_id",  # standard
-            ]
-        else:
-            all_patterns = [
-                "email",
-                "phone",
-                "name",
-                "api_key",
-                "secret",
-                "bearer",
-                "path",
-                "resource_id",
-            ]
-        summary = await mcp.scrub_log_as_file(
-            input_filename, output_filename, all_patterns
-        )
-
-        # 9. Publish to panel
-        items_scrubbed = summary.get("items_scrubbed", 0)
-        lines_processed = summary.get("lines_processed", 0)
-        type_summary = summary.get("summary", {})
-        breakdown = (
-            ", ".join(f"{k}: {v}" for k, v in type_summary.items())
-            if type_summary
-            else ""
+        # 7. Queue detection + scrubbing
+        output_codec = output_codec_for(codec)
+        output_name = strip_suffix(safe_filename, codec)
+        output_name += SUFFIXES.get(output_codec, "")
+        job = ScrubJob(
+            job_id=job_id,
+            filename=safe_filename,
+            input_filename=input_filename,
+            output_filename=f"{job_id}_{output_name}",
+            output_codec=output_codec,
+            content_hash=content_hash,
         )
-        status_msg = f"🛡️ {category.replace('_', ' ').title()} — {items_scrubbed} items scrubbed in {lines_processed} lines"
-        if breakdown:
-            status_msg += f" ({breakdown})"
-        status_msg += f"\nDownload: /api/v1/files/download/{job_id}"
-        await _publish_file_event(
+        try:
+            record = await request.app.state.scrub_jobs.submit(job)
+        except asyncio.QueueFull:
+            await asyncio.to_thread(in_path.unlink, missing_ok=True)
+            error = "Scrub queue is full. Try again shortly."
+            await publish_file_event(redis, safe_filename, f"Error: {error}")
+            raise HTTPException(503, error)
+        if record["status"] != "queued":  # Seen before — finished from the store
+            return _fake_openwebui_response(job_id, safe_filename, record["status"])
+        await publish_file_event(
             redis,
             safe_filename,
-            status_msg,
-            event_type="file_scrubbed",
+            "⏳ Queued for scrubbing",
+            event_type="file_queued",
             job_id=job_id,
-            category=category,
-            summary=summary,
-            download_url=f"/api/v1/files/download/{job_id}",
+            status_url=f"/api/v1/files/status/{job_id}",
         )
 
-        # 10. Return fake success to Open WebUI (no RAG processing)
-        return _fake_openwebui_response(job_id, safe_filename, "scrubbed")
+        # 8. Return fake success to Open WebUI (no RAG processing)
+        return _fake_openwebui_response(job_id, safe_filename, "queued")
 
     except HTTPException:
         raise
     except Exception as e:
+        await asyncio.to_thread(part_path.unlink, missing_ok=True)
         error = f"Unexpected error: {e!s}"
-        await _publish_file_event(redis, safe_filename, f"Error: {error}")
+        await publish_file_event(redis, uploaded["filename"], f"Error: {error}")
         raise HTTPException(500, error)
 
 
@@ -244,35 +370,121 @@ def _fake_openwebui_response(job_id: str, filename: str, status: str) -> dict:
     }
 
 
+@router.get("/files/status/{job_id}")
+async def scrub_job_status(request: Request, job_id: str):
+    """Status of a scrub job: queued, detecting, scrubbing, done, clean or error.
+
+    While scrubbing: lines_processed, bytes_done/bytes_total, percent,
+    lines_per_sec and eta_secs. When done: summary and download_url.
+    """
+    job = await get_job_status(request.app.state.redis, job_id)
+    if job is None:
+        raise HTTPException(404, f"No scrub job {job_id}")
+    return job
+
+
+@router.get("/files/storage")
+async def scrub_storage(request: Request):
+    """Scrub sandbox usage and reaper metrics (see services/scrub_index.py)."""
+    return await storage_metrics(request.app.state.redis)
+
+
 @router.get("/files/download/{job_id}")
-async def download_scrubbed_file(job_id: str):
+async def download_scrubbed_file(request: Request, job_id: str):
     """Download a scrubbed file by job ID.
 
+    The file is found through the job record (no directory scan) and sent
+    with FileResponse: large chunks (or pathsend, where the server supports
+    it), Range/If-Range, and an ETag — If-None-Match gets a 304.
+
+    A compressed output is sent as is with Content-Encoding when the
+    client accepts that encoding, otherwise decompressed on the fly (no
+    ranges); either way the client gets the plain file.
+
     SECURITY NOTE: Unauthenticated by design — assumes localhost-only access.
     This is a local development tool, not exposed to public internet.
     """
-    out_dir = scrub_sandbox.root / "out"
-
-    matches = list(out_dir.glob(f"{job_id}_*"))
-    if not matches:
+    # The output file exists (partially written) while the job runs
+    job = await get_job_status(request.app.state.redis, job_id)
+    if job is not None and job["status"] != "done":
+        detail = f"Scrub job {job_id} is {job['status']}"
+        if job["status"] in ACTIVE_STATES:
+            detail += " — see /api/v1/files/status/" + job_id
+        raise HTTPException(409, detail)
+    if job is None or not job.get("output_filename"):
         raise HTTPException(404, f"No scrubbed file found for job {job_id}")
 
-    file_path = matches[0]
-    original_filename = file_path.name[len(job_id) + 1 :]
+    try:
+        if job.get("output_blob"):  # Shared output in the content store
+            file_path = blob_path(job["output_blob"])
+        else:
+            file_path = scrub_sandbox.resolve(job["output_filename"], "out")
+        stat_result, codec = await asyncio.to_thread(_stat_output, file_path)
+    except (ValueError, FileNotFoundError):
+        raise HTTPException(404, f"No scrubbed file found for job {job_id}")
+    await touch(request.app.state.redis, job_id)  # Keeps it from LRU eviction
+    original_filename = strip_suffix(job["output_filename"][len(job_id) + 1 :], codec)
 
     # Sanitize filename for Content-Disposition header (remove quotes, newlines)
     safe_download_name = (
         original_filename.replace('"', "").replace("\n", "").replace("\r", "")
     )
 
-    def iter_file():
-        with open(file_path, "rb") as f:
-            yield from f
-
-    return StreamingResponse(
-        iter_file(),
-        media_type="text/plain",
-        headers={
-            "Content-Disposition": f'attachment; filename="scrubbed_{safe_download_name}"'
-        },
+    headers = {
+        "Content-Disposition": f'attachment; filename="scrubbed_{safe_download_name}"'
+    }
+    encoded = codec is not None and _accepts_encoding(
+        request.headers.get("accept-encoding", ""), ENCODINGS[codec]
+    )
+    # Each representation (encoded or not) has its own validator
+    etag = f"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"
+    if codec is not None:
+        headers["Vary"] = "Accept-Encoding"
+        etag += f"-{ENCODINGS[codec]}" if encoded else "-identity"
+    headers["ETag"] = f'"{etag}"'
+    if encoded:
+        headers["Content-Encoding"] = ENCODINGS[codec]
+
+    if _etag_matches(request.headers.get("if-none-match", ""), headers["ETag"]):
+        del headers["Content-Disposition"]
+        return Response(status_code=304, headers=headers)
+
+    if codec is not None and not encoded:
+        headers["Accept-Ranges"] = "none"
+
+        def iter_file():
+            with open(file_path, "rb") as f:
+                yield from iter_decompressed(f, codec, DOWNLOAD_CHUNK_BYTES)
+
+        return StreamingResponse(iter_file(), media_type="text/plain", headers=headers)
+
+    response = FileResponse(
+        file_path, media_type="text/plain", headers=headers, stat_result=stat_result
     )
+    response.chunk_size = DOWNLOAD_CHUNK_BYTES
+    return response
+
+
+def _stat_output(path: Path) -> tuple[os.stat_result, Optional[str]]:
+    with open(path, "rb") as f:
+        return os.fstat(f.fileno()), sniff_codec(f.read(CODEC_SNIFF_BYTES))
+
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """If-None-Match comparison — weak, as RFC 9110 requires for it."""
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def _accepts_encoding(accept_encoding: str, encoding: str) -> bool:
+    """Whether an Accept-Encoding header allows encoding (q=0 refuses it)."""
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        if name.strip().lower() not in (encoding, "*"):
+            continue
+        q = params.strip().removeprefix("q=")
+        try:
+            return not params or float(q) > 0
+        except ValueError:
+            return False
+    return False
@@ -10,7 +10,11 @@ LLM_BASE_URL = os.getenv("LLM_BASE_URL", "http://llm:8080")
 
 @router.get("/health")
 async def health(request: Request):
-    """Health check with dependency status for Redis and LLM."""
+    """Health check with dependency status for Redis and LLM.
+
+    Also reports the MCP scrub subprocess pool (sizes, calls in flight,
+    restarts) under "mcp_pool".
+    """
     redis_ok = False
     llm_ok = False
 
@@ -30,10 +34,12 @@ async def health(request: Request):
         pass
 
     all_ok = redis_ok and llm_ok
+    mcp = getattr(request.app.state, "mcp", None)
     return {
         "status": "ok" if all_ok else "degraded",
         "services": {
             "redis": "ok" if redis_ok else "unavailable",
             "llm": "ok" if llm_ok else "unavailable",
         },
+        "mcp_pool": mcp.metrics() if mcp is not None else None,
     }
@@ -143,29 +143,9 @@ async def chat_completions(request: Request):
 
     mcp = await get_mcp_client()
 
-    # For log data: use ALL log + standard patterns (catches emails, API keys in logs)
-    # For other prompts: use ALL standard patterns
-    # Detection determines category, but we scrub with all patterns for that category
-    # Always use all patterns (log + standard) to catch everything
+    # Always use the "all" profile (log + standard patterns) to catch everything
     # Detection categorizes content, but we scrub comprehensively
-    all_patterns = [
-        "ip",
-        "private_ip",
-        "internal_url",
-        "timestamp",
-        "endpoint",
-        "user",
-        "terminal_user",  # log
-        "email",
-        "phone",
-        "name",
-        "api_key",
-        "secret",
-        "bearer",
-        "path",
-        "resource_id",  # standard
-    ]
-    result = await mcp.scrub_log_as_prompt(prompt_text, all_patterns)
+    result = await mcp.scrub_log_as_prompt(prompt_text, profile="all")
 
     sanitized = result["sanitized_text"]
     replacements = result["replacements"]
@@ -0,0 +1,153 @@
+"""Scrubber micro-benchmarks on synthetic log data.
+
+Usage (from stack/backend):
+    python -m scrubbing.bench
+    python -m scrubbing.bench --file-lines 200000 --workers 1 2 4 8
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from pathlib import Path
+
+from scrubbing.scrubbers import log
+from scrubbing.scrubbers.core import ScanPlan, ScanStats, Tokenizer
+from scrubbing.scrubbers.profiles import get_profile
+
+
+def synthetic_log(lines: int, seed: int = 0, quiet: float = 0.0) -> str:
+    """Build a dense access log — several IPs, timestamps and users per line.
+
+    quiet is the fraction of lines replaced by plain messages with nothing
+    to scrub, as in most application logs.
+    """
+    rng = random.Random(seed)
+    out = []
+    for i in range(lines):
+        if quiet and rng.random() < quiet:
+            out.append(f"worker heartbeat ok, queue depth {i % 97}, nothing to do\n")
+            continue
+        ip = ".".join(str(rng.randint(1, 254)) for _ in range(4))
+        out.append(
+            f"2024-01-15T10:{i % 60:02d}:{rng.randint(0, 59):02d} INFO "
+            f"user=user{rng.randint(0, 999)} from {ip} via 10.0.{i % 256}.1 "
+            f"GET /api/v1/items/{i} 200 {rng.randint(1, 999)}ms\n"
+        )
+    return "".join(out)
+
+
+def bench_scrub_text(sizes: list[int]) -> list[dict]:
+    """Time scrub_text over one text block per size; report time per match."""
+    results = []
+    profile = get_profile("all")
+    for lines in sizes:
+        text = synthetic_log(lines)
+        start = time.perf_counter()
+        _, replacements, _ = profile.scrub(text, Tokenizer())
+        elapsed = time.perf_counter() - start
+        results.append(
+            {
+                "lines": lines,
+                "matches": len(replacements),
+                "seconds": elapsed,
+                "us_per_match": elapsed / max(len(replacements), 1) * 1e6,
+            }
+        )
+    return results
+
+
+def _line_loop(src: Path, dst: Path, plan: ScanPlan) -> dict:
+    """The original scrub_log_file loop — text mode, one scrub and write per line."""
+    tokenizer = Tokenizer()
+    lines = 0
+    with (
+        open(src, encoding="utf-8", errors="replace") as infile,
+        open(dst, "w", encoding="utf-8") as outfile,
+    ):
+        for line in infile:
+            lines += 1
+            outfile.write(plan.scrub(line, tokenizer)[0])
+    return {"lines_processed": lines}
+
+
+def bench_scrub_file(lines: int, workers: list[int], quiet: float = 0.0) -> list[dict]:
+    """Time file scrubbing: the per-line loop, then per worker count.
+
+    1 worker is the in-process block path (mmap reader, buffered writer).
+    """
+    results = []
+    plan = get_profile("all").plan
+    with tempfile.TemporaryDirectory() as tmp:
+        src, dst = Path(tmp) / "in.log", Path(tmp) / "out.log"
+        src.write_text(synthetic_log(lines, quiet=quiet))
+        megabytes = src.stat().st_size / (1024 * 1024)
+        for count in [0, *workers]:
+            start = time.perf_counter()
+            if count == 0:
+                result = _line_loop(src, dst, plan)
+            else:
+                result = log._scrub_file(
+                    src, dst, plan, Tokenizer(), ScanStats(), count, log.CHUNK_BYTES
+                )
+            elapsed = time.perf_counter() - start
+            results.append(
+                {
+                    "mode": f"{count} workers" if count else "line loop",
+                    "seconds": elapsed,
+                    "mb_per_sec": megabytes / elapsed,
+                    "lines_per_sec": result["lines_processed"] / elapsed,
+                }
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[500, 1000, 2000, 4000, 8000],
+        help="Line counts for the scrub_text scaling run",
+    )
+    parser.add_argument(
+        "--file-lines",
+        type=int,
+        default=0,
+        help="Also time scrub_log_file on a synthetic log of this many lines",
+    )
+    parser.add_argument(
+        "--quiet",
+        type=float,
+        default=0.0,
+        help="Fraction of file lines with nothing to scrub (0-1)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        nargs="+",
+        default=[1, 2, 4],
+        help="Worker counts for the file run (1 = sequential)",
+    )
+    args = parser.parse_args()
+
+    print(f"{'lines':>8} {'matches':>9} {'seconds':>9} {'us/match':>9}")
+    for row in bench_scrub_text(args.sizes):
+        print(
+            f"{row['lines']:>8} {row['matches']:>9} "
+            f"{row['seconds']:>9.3f} {row['us_per_match']:>9.2f}"
+        )
+
+    if args.file_lines:
+        # Includes pool startup on the first parallel run
+        print(f"\n{'mode':>10} {'seconds':>9} {'MB/s':>7} {'lines/s':>10}")
+        for row in bench_scrub_file(args.file_lines, args.workers, args.quiet):
+            print(
+                f"{row['mode']:>10} {row['seconds']:>9.3f} "
+                f"{row['mb_per_sec']:>7.2f} {row['lines_per_sec']:>10.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""Regex backends for the scrub patterns — stdlib re or linear-time RE2.
+
+The pattern tables stay written for Python's re. When the optional
+google-re2 package is installed, each pattern is also compiled for RE2,
+whose automaton runs in time linear in the input, so adversarial chunks
+(e.g. a long word run before a lone '@' for email) can't backtrack.
+
+RE2's \\w, \\d and \\b are ASCII-only while re's are Unicode. On ASCII
+chunks both engines see the same character classes and return the same
+spans. For non-ASCII chunks, compile_unicode spells re's \\w, \\d and \\s
+out as code point ranges taken from re itself, and RE2 scans the UTF-8
+bytes. Patterns it can't express that way (\\b, IGNORECASE) are left to
+the caller, which windows them (see ScanPlan). Chunks shorter than
+SCRUB_RE2_MIN_CHARS and any pattern RE2 can't compile run on re.
+
+ASCII chunks that stay on re are scanned as bytes too (compile_ascii):
+sre's ASCII class checks are cheaper than its Unicode ones.
+
+Select with SCRUB_REGEX_BACKEND:
+    auto — RE2 when installed, else re (default)
+    re   — always stdlib re
+    re2  — require RE2 (falls back to re with a warning if not installed)
+"""
+
+import logging
+import os
+import re
+import sys
+from functools import lru_cache
+from typing import Any, Optional
+
+try:
+    import re2
+except ImportError:  # Optional dependency
+    re2 = None
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("auto", "re", "re2")
+REGEX_BACKEND = os.getenv("SCRUB_REGEX_BACKEND", "auto").lower()
+# Shorter chunks stay on re: RE2's per-call overhead outweighs the scan there,
+# and backtracking on a short chunk is bounded by its length anyway
+LINEAR_MIN_CHARS = int(os.getenv("SCRUB_RE2_MIN_CHARS", "1024"))
+
+# Python's \s on ASCII text (str.isspace) — RE2's \s lacks \v and \x1c-\x1f
+_ASCII_SPACE = r"\t\n\v\f\r \x1c-\x1f"
+_INLINE_GLOBAL_FLAGS = re.compile(r"^\(\?[aiLmsux]+\)")
+
+
+def resolve_backend(name: Optional[str] = None) -> str:
+    """Resolve a backend name to the engine that will actually run ("re" or "re2").
+
+    Raises:
+        ValueError: If name isn't one of BACKENDS
+    """
+    name = (name or REGEX_BACKEND).lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown regex backend '{name}'. Available: {BACKENDS}")
+    if name == "re":
+        return "re"
+    if re2 is None:
+        if name == "re2":
+            logger.warning("SCRUB_REGEX_BACKEND=re2 but google-re2 is not installed")
+        return "re"
+    return "re2"
+
+
+def _translate(source: str) -> str:
+    """Rewrite \\s and \\S to Python's ASCII whitespace (str.isspace).
+
+    Bytes patterns in both re and RE2 leave out \\v and/or \\x1c-\\x1f.
+    """
+    out = []
+    in_class = False
+    i = 0
+    while i < len(source):
+        char = source[i]
+        if char == "\\" and i + 1 < len(source):
+            escape = source[i : i + 2]
+            if escape == r"\s":
+                out.append(_ASCII_SPACE if in_class else f"[{_ASCII_SPACE}]")
+            elif escape == r"\S" and not in_class:
+                out.append(f"[^{_ASCII_SPACE}]")
+            else:
+                out.append(escape)
+            i += 2
+            continue
+        if char == "[" and not in_class:
+            in_class = True
+            out.append(char)
+            # A leading ']' (after optional '^') is a literal, not the close
+            if source[i + 1 : i + 2] == "^":
+                out.append("^")
+                i += 1
+            if source[i + 1 : i + 2] == "]":
+                out.append("]")
+                i += 1
+        elif char == "]" and in_class:
+            in_class = False
+            out.append(char)
+        else:
+            out.append(char)
+        i += 1
+    return "".join(out)
+
+
+@lru_cache(maxsize=1)
+def _unicode_ranges() -> dict[str, str]:
+    """re's Unicode \\w, \\d and \\s as RE2 class ranges (no brackets).
+
+    Taken from re rather than RE2's \\p{...}: RE2's Unicode tables aren't
+    the version Python's are, and \\w isn't quite \\p{L}\\p{N}_.
+    """
+    chars = "".join(
+        chr(c) for c in range(sys.maxunicode + 1) if not 0xD800 <= c <= 0xDFFF
+    )
+    return {
+        escape: "".join(
+            f"\\x{{{ord(m.group()[0]):x}}}-\\x{{{ord(m.group()[-1]):x}}}"
+            for m in re.finditer(f"{escape}+", chars)
+        )
+        for escape in (r"\w", r"\d", r"\s")
+    }
+
+
+def _translate_unicode(source: str) -> Optional[str]:
+    """Rewrite re's Unicode \\w, \\d, \\s (and negations) for RE2.
+
+    Returns:
+        The RE2 source, or None if it needs \\b/\\B (RE2 has no Unicode
+        word boundary) or a negated class inside [...]
+    """
+    out = []
+    in_class = False
+    i = 0
+    while i < len(source):
+        char = source[i]
+        if char == "\\" and i + 1 < len(source):
+            escape = source[i : i + 2]
+            if escape in (r"\b", r"\B"):
+                return None
+            if escape in (r"\w", r"\d", r"\s"):
+                ranges = _unicode_ranges()[escape]
+                out.append(ranges if in_class else f"[{ranges}]")
+            elif escape in (r"\W", r"\D", r"\S"):
+                if in_class:
+                    return None
+                out.append(f"[^{_unicode_ranges()[escape.lower()]}]")
+            else:
+                out.append(escape)
+            i += 2
+            continue
+        if char == "[" and not in_class:
+            in_class = True
+            out.append(char)
+            # A leading ']' (after optional '^') is a literal, not the close
+            if source[i + 1 : i + 2] == "^":
+                out.append("^")
+                i += 1
+            if source[i + 1 : i + 2] == "]":
+                out.append("]")
+                i += 1
+        elif char == "]" and in_class:
+            in_class = False
+            out.append(char)
+        else:
+            out.append(char)
+        i += 1
+    return "".join(out)
+
+
+def _compile_re2(pattern: re.Pattern, source: str) -> Optional[Any]:
+    """Compile translated source for RE2 with pattern's global flags."""
+    flags = "".join(
+        letter
+        for letter, flag in (
+            ("i", re.IGNORECASE),
+            ("m", re.MULTILINE),
+            ("s", re.DOTALL),
+        )
+        if pattern.flags & flag
+    )
+    if flags:
+        source = f"(?{flags}){source}"
+    try:
+        return re2.compile(source.encode("utf-8"))
+    except re2.error:
+        logger.warning(f"RE2 can't compile pattern, using re: {pattern.pattern!r}")
+        return None
+
+
+def compile_linear(pattern: re.Pattern) -> Optional[Any]:
+    """Compile a re pattern for RE2, matching ASCII bytes.
+
+    Returns:
+        Compiled RE2 pattern, or None if RE2 isn't installed or can't
+        express the pattern (lookaround, backreferences, ...)
+    """
+    if re2 is None or pattern.flags & re.VERBOSE:
+        return None
+    return _compile_re2(
+        pattern, _translate(_INLINE_GLOBAL_FLAGS.sub("", pattern.pattern))
+    )
+
+
+def compile_unicode(pattern: re.Pattern) -> Optional[Any]:
+    """Compile a re pattern for RE2, matching UTF-8 bytes as re matches str.
+
+    Spans are byte offsets into the UTF-8 encoding.
+
+    Returns:
+        Compiled RE2 pattern, or None if RE2 isn't installed or can't
+        express the pattern that way: \\b, or IGNORECASE (re also folds
+        "i" with the dotted and dotless I)
+    """
+    if re2 is None or pattern.flags & (re.VERBOSE | re.IGNORECASE | re.ASCII):
+        return None
+    source = _INLINE_GLOBAL_FLAGS.sub("", pattern.pattern)
+    if "(?i" in source:  # Scoped IGNORECASE
+        return None
+    source = _translate_unicode(source)
+    return None if source is None else _compile_re2(pattern, source)
+
+
+def compile_ascii(pattern: re.Pattern) -> Optional[re.Pattern]:
+    """Compile a re pattern for ASCII bytes, keeping its str-mode spans.
+
+    Returns:
+        Compiled bytes pattern, or None if the pattern isn't ASCII or
+        can't be compiled as bytes
+    """
+    if not pattern.pattern.isascii():
+        return None
+    try:
+        return re.compile(
+            _translate(pattern.pattern).encode("ascii"), pattern.flags & ~re.UNICODE
+        )
+    except re.error:
+        return None
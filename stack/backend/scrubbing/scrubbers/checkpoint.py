@@ -0,0 +1,174 @@
+"""Checkpoints for file scrub jobs — resume a killed job where it stopped.
+
+A checkpoint is a small SQLite file under /data/scrub/ckpt (outside "out",
+so downloads never see it) holding:
+    job       — what the job was: input identity, patterns, token mode
+    progress  — input offset, output bytes (and compressor state for a
+                compressed output), line/item counts, scan stats
+    tokens    — the counter tokenizer's (prefix, key, id) rows, appended
+                incrementally from its journal
+
+The output file is flushed and fsynced before each save, so a saved
+offset never points past durable output. On resume the output is cut back
+to the saved length and scrubbing continues from the saved input offset.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+from pathlib import Path
+from time import monotonic
+from typing import BinaryIO, Optional
+
+from scrubbing.scrubbers.core import HashTokenizer, ScanStats, Tokenizer
+from utils.compression import CompressedWriter
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checkpoints (0 disables). Keep it well under the MCP
+# client's TOOL_TIMEOUT, or a job killed on timeout never saves progress.
+CHECKPOINT_SECS = float(os.getenv("SCRUB_CHECKPOINT_SECS", "10"))
+
+
+class ScrubCheckpoint:
+    """Checkpoint store for one job (one output path)."""
+
+    def __init__(self, path: Path, job: dict, interval: float = CHECKPOINT_SECS):
+        self.path = path
+        self.job = job
+        self.interval = interval
+        self._db: Optional[sqlite3.Connection] = None
+        self._last_save = monotonic()
+
+    def load(
+        self, tokenizer: Tokenizer | HashTokenizer, stats: ScanStats
+    ) -> Optional[dict]:
+        """Restore saved state into tokenizer and stats.
+
+        Returns:
+            Saved progress ({in_offset, out_offset, out_state,
+            lines_processed, items_scrubbed, summary}), or None if there is
+            no checkpoint or it belongs to a different job (it is then discarded)
+        """
+        if not self.path.exists():
+            return None
+        db = sqlite3.connect(self.path)
+        try:
+            row = db.execute("SELECT job, progress FROM state").fetchone()
+        except sqlite3.DatabaseError:
+            row = None
+        if row is None or row[1] is None or json.loads(row[0]) != self.job:
+            logger.info(f"Discarding stale scrub checkpoint {self.path.name}")
+            db.close()
+            self.remove()
+            return None
+
+        progress = json.loads(row[1])
+        if isinstance(tokenizer, Tokenizer):
+            tokenizer.restore(
+                db.execute("SELECT prefix, key, id FROM tokens ORDER BY prefix, id")
+            )
+        stats.__dict__.update(progress.pop("stats"))
+        self._db = db
+        logger.info(
+            f"Resuming scrub from checkpoint at byte {progress['in_offset']} "
+            f"({progress['lines_processed']} lines done)"
+        )
+        return progress
+
+    def due(self) -> bool:
+        return monotonic() - self._last_save >= self.interval
+
+    def save(
+        self,
+        in_offset: int,
+        outfile: BinaryIO | CompressedWriter,
+        totals: dict,
+        tokenizer: Tokenizer | HashTokenizer,
+        stats: ScanStats,
+    ) -> None:
+        """Persist progress up to in_offset; outfile is flushed first.
+
+        A CompressedWriter's state is saved with its offset, for resuming it.
+        """
+        outfile.flush()
+        os.fsync(outfile.fileno())
+        progress = {
+            "in_offset": in_offset,
+            "out_offset": outfile.tell(),
+            "out_state": (
+                outfile.state if isinstance(outfile, CompressedWriter) else None
+            ),
+            **totals,
+            "stats": vars(stats),
+        }
+
+        db = self._connect()
+        with db:
+            if isinstance(tokenizer, Tokenizer):
+                db.executemany(
+                    "INSERT OR REPLACE INTO tokens VALUES (?, ?, ?)",
+                    tokenizer.drain_journal(),
+                )
+            db.execute("UPDATE state SET progress = ?", (json.dumps(progress),))
+        self._last_save = monotonic()
+
+    def close(self) -> None:
+        """Close the database, keeping the checkpoint for a later resume."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def remove(self) -> None:
+        """Delete the checkpoint (job finished or stale)."""
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.path)
+            with self._db:
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS tokens (prefix TEXT, key, "
+                    "id INTEGER, PRIMARY KEY (prefix, key)) WITHOUT ROWID"
+                )
+                self._db.execute(
+                    "CREATE TABLE IF NOT EXISTS state (job TEXT, progress TEXT)"
+                )
+                if self._db.execute("SELECT 1 FROM state").fetchone() is None:
+                    self._db.execute(
+                        "INSERT INTO state VALUES (?, NULL)", (json.dumps(self.job),)
+                    )
+        return self._db
+
+
+def job_identity(
+    input_path: Path,
+    entries: tuple,
+    tokenizer: Tokenizer | HashTokenizer,
+    output_codec: Optional[str] = None,
+) -> dict:
+    """What must match for a checkpoint to be resumed.
+
+    The input's size and mtime, the patterns, the output compression (a
+    partial output can't be continued in another format) and the token
+    mode — for hash mode a fingerprint of the key, so a job started under a
+    random per-process key (no SCRUB_TOKEN_KEY) restarts instead of mixing
+    tokens.
+    """
+    stat = input_path.stat()
+    identity = {
+        "input": str(input_path),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "patterns": [[t, p.pattern, p.flags] for t, p in entries],
+        "output_codec": output_codec,
+        "token_mode": "counter",
+    }
+    if isinstance(tokenizer, HashTokenizer):
+        identity["token_mode"] = "hash"
+        identity["key"] = hashlib.blake2b(tokenizer.key, digest_size=8).hexdigest()
+    return identity
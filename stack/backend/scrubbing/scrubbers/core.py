@@ -1,32 +1,305 @@
 """Core scrubbing utilities — Tokenizer and pattern definitions."""
 
+import logging
+import os
 import re
+import secrets
+import sqlite3
+import tempfile
+from functools import lru_cache
+from hashlib import blake2b
+from time import perf_counter
+from typing import Callable, Iterable, Iterator, Optional
+
+from scrubbing.scrubbers.backends import (
+    LINEAR_MIN_CHARS,
+    compile_ascii,
+    compile_linear,
+    compile_unicode,
+    resolve_backend,
+)
+
+logger = logging.getLogger(__name__)
+
+# Per-pattern time budget per chunk (0 disables). Checked between matches, so
+# a single backtracking attempt can overshoot it — the RE2 backend bounds
+# that; with re, a pattern is windowed for the rest of a job once it overruns.
+PATTERN_BUDGET_MS = int(os.getenv("SCRUB_PATTERN_BUDGET_MS", "5000"))
+# On overrun: "window" rescans the rest of the chunk in bounded windows,
+# "fail" raises PatternBudgetExceeded (fail-closed), even if the scan finished
+BUDGET_ACTION = os.getenv("SCRUB_BUDGET_ACTION", "window").lower()
+WINDOW_OVERLAP = 4096
+WINDOW_CHARS = max(int(os.getenv("SCRUB_WINDOW_CHARS", "65536")), 2 * WINDOW_OVERLAP)
+# Tokenizer map size (MB, estimated) before file jobs spill it to disk (0 = never)
+TOKENIZER_SPILL_MB = int(os.getenv("SCRUB_TOKENIZER_SPILL_MB", "0"))
+# Secret for "hash" token mode — every process that must agree on tokens
+# needs the same value. Unset: a random per-process key (tokens still
+# consistent within one process, but not across nodes).
+TOKEN_KEY = os.getenv("SCRUB_TOKEN_KEY", "")
+# Hex chars of the keyed digest shown in hash-mode tokens ([IP_3f9a…])
+TOKEN_HASH_CHARS = min(max(int(os.getenv("SCRUB_TOKEN_HASH_CHARS", "12")), 8), 32)
+TOKEN_MODES = ("counter", "hash")
 
 
 class Tokenizer:
-    """Stateful tokenizer for consistent value→token replacement."""
+    """Stateful tokenizer for consistent value→token replacement.
 
-    def __init__(self):
-        self.maps: dict[str, dict[str, str]] = {}  # prefix → {value → token}
-        self.counters: dict[str, int] = {}
+    Stores a per-prefix integer id for each value and renders "[PREFIX_n]"
+    on output, instead of keeping a token string per value. Values longer
+    than HASH_KEY_MIN_CHARS are keyed by a 16-byte BLAKE2b digest. With
+    spill_mb set, the value→id maps move to an on-disk SQLite table once
+    their estimated size crosses it; numbering continues unchanged.
+
+    For checkpoints, start_journal() records each new (prefix, key, id) until
+    drained, and restore() reloads saved rows into a fresh tokenizer.
+    """
+
+    __slots__ = (
+        "_ids",
+        "_counters",
+        "_approx_bytes",
+        "_spill_bytes",
+        "_spill",
+        "_journal",
+    )
+
+    def __init__(self, spill_mb: float = 0):
+        self._ids: dict[str, dict[str | bytes, int]] = {}  # prefix → {key → id}
+        self._counters: dict[str, int] = {}
+        self._approx_bytes = 0
+        self._spill_bytes = int(spill_mb * 1024 * 1024)
+        self._spill: Optional[_SpillStore] = None
+        self._journal: Optional[list[tuple[str, str | bytes, int]]] = None
 
     def tokenize(self, value: str, prefix: str) -> str:
         """Get or create token for a value."""
-        if prefix not in self.maps:
-            self.maps[prefix] = {}
-            self.counters[prefix] = 0
+        return f"[{prefix}_{self.token_id(_token_key(value), prefix)}]"
+
+    def token_id(self, key: str | bytes, prefix: str) -> int:
+        """Get or create the id for a map key (see _token_key)."""
+        if self._spill is not None:
+            token_id = self._spill.get(prefix, key)
+            if token_id is None:
+                token_id = self._counters.get(prefix, 0) + 1
+                self._counters[prefix] = token_id
+                self._spill.add(prefix, key, token_id)
+                if self._journal is not None:
+                    self._journal.append((prefix, key, token_id))
+            return token_id
+
+        ids = self._ids.get(prefix)
+        if ids is None:
+            ids = self._ids[prefix] = {}
+            self._counters[prefix] = 0
 
-        if value in self.maps[prefix]:
-            return self.maps[prefix][value]
+        token_id = ids.get(key)
+        if token_id is None:
+            token_id = self._counters[prefix] + 1
+            self._counters[prefix] = token_id
+            ids[key] = token_id
+            if self._journal is not None:
+                self._journal.append((prefix, key, token_id))
+            if self._spill_bytes:
+                self._approx_bytes += _ENTRY_BYTES + len(key)
+                if self._approx_bytes > self._spill_bytes:
+                    self._spill_to_disk()
+        return token_id
 
-        self.counters[prefix] += 1
-        token = f"[{prefix}_{self.counters[prefix]}]"
-        self.maps[prefix][value] = token
-        return token
+    def start_journal(self) -> None:
+        """Record new entries from now on (see drain_journal)."""
+        if self._journal is None:
+            self._journal = []
+
+    def drain_journal(self) -> list[tuple[str, str | bytes, int]]:
+        """Entries (prefix, key, id) created since the last drain."""
+        journal, self._journal = self._journal or [], []
+        return journal
+
+    def restore(self, rows: Iterable[tuple[str, str | bytes, int]]) -> None:
+        """Load (prefix, key, id) rows saved from another tokenizer.
+
+        Rows must be in id order per prefix. Spills as tokenize() would.
+        """
+        rows = iter(rows)
+        if self._spill is None:
+            for prefix, key, token_id in self._advance_counters(rows):
+                self._ids.setdefault(prefix, {})[key] = token_id
+                if self._spill_bytes:
+                    self._approx_bytes += _ENTRY_BYTES + len(key)
+                    if self._approx_bytes > self._spill_bytes:
+                        self._spill_to_disk()
+                        break
+        if self._spill is not None:
+            self._spill.add_many(self._advance_counters(rows))
+
+    def _advance_counters(self, rows):
+        for row in rows:
+            prefix, _, token_id = row
+            if token_id > self._counters.get(prefix, 0):
+                self._counters[prefix] = token_id
+            yield row
+
+    def first_seen(self) -> dict[str, list[str | bytes]]:
+        """Map keys per prefix in id order (key i has id i + 1).
+
+        Only for tokenizers that never spilled.
+        """
+        return {prefix: list(ids) for prefix, ids in self._ids.items()}
 
     @property
     def total_tokens(self) -> int:
-        return sum(len(m) for m in self.maps.values())
+        return sum(self._counters.values())
+
+    @property
+    def spilled(self) -> bool:
+        return self._spill is not None
+
+    def close(self) -> None:
+        """Delete the on-disk spill store, if any. Don't tokenize afterwards."""
+        if self._spill is not None:
+            self._spill.close()
+
+    def _spill_to_disk(self) -> None:
+        self._spill = _SpillStore()
+        self._spill.add_many(
+            (prefix, key, token_id)
+            for prefix, ids in self._ids.items()
+            for key, token_id in ids.items()
+        )
+        logger.info(
+            f"Tokenizer spilled {self.total_tokens} entries to disk "
+            f"(~{self._approx_bytes // (1024 * 1024)} MB in memory)"
+        )
+        self._ids = {}
+
+
+# Values longer than this are keyed by digest — shorter ones are smaller as str
+HASH_KEY_MIN_CHARS = 24
+# Rough per-entry dict + object overhead, for the spill threshold estimate
+_ENTRY_BYTES = 120
+
+
+def _token_key(value: str) -> str | bytes:
+    """Tokenizer map key — the value itself, or its digest if long."""
+    if len(value) <= HASH_KEY_MIN_CHARS:
+        return value
+    return blake2b(value.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+
+
+class _SpillStore:
+    """On-disk (prefix, key) → id table backing a spilled Tokenizer."""
+
+    def __init__(self):
+        self._dir = tempfile.TemporaryDirectory(prefix="scrub-tokens-")
+        self._db = sqlite3.connect(
+            os.path.join(self._dir.name, "tokens.db"), isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=OFF")
+        self._db.execute("PRAGMA synchronous=OFF")
+        self._db.execute(
+            "CREATE TABLE tokens (prefix TEXT, key, id INTEGER, "
+            "PRIMARY KEY (prefix, key)) WITHOUT ROWID"
+        )
+
+    def get(self, prefix: str, key: str | bytes) -> Optional[int]:
+        row = self._db.execute(
+            "SELECT id FROM tokens WHERE prefix = ? AND key = ?", (prefix, key)
+        ).fetchone()
+        return row[0] if row else None
+
+    def add(self, prefix: str, key: str | bytes, token_id: int) -> None:
+        self._db.execute("INSERT INTO tokens VALUES (?, ?, ?)", (prefix, key, token_id))
+
+    def add_many(self, rows) -> None:
+        self._db.execute("BEGIN")
+        self._db.executemany("INSERT INTO tokens VALUES (?, ?, ?)", rows)
+        self._db.execute("COMMIT")
+
+    def close(self) -> None:
+        self._db.close()
+        self._dir.cleanup()
+
+
+def derive_token_key(secret: str = "") -> bytes:
+    """32-byte BLAKE2b key for hash token mode (random if secret is empty)."""
+    if not secret:
+        return secrets.token_bytes(32)
+    return blake2b(secret.encode("utf-8"), digest_size=32).digest()
+
+
+_PROCESS_TOKEN_KEY = derive_token_key(TOKEN_KEY)
+
+
+class HashTokenizer:
+    """Coordination-free tokenizer — tokens from a keyed hash of (prefix, value).
+
+    Any process holding the same key maps a value to the same token, so
+    chunks of a file can be scrubbed independently without sharing state.
+    The token shows the first `chars` hex digits of the digest; if two values
+    collide on those within this tokenizer, the later one gets the full
+    128-bit digest (and the collision is counted and logged).
+    """
+
+    __slots__ = ("_key", "_chars", "_seen", "collisions")
+
+    def __init__(self, key: Optional[bytes] = None, chars: int = TOKEN_HASH_CHARS):
+        self._key = key if key is not None else _PROCESS_TOKEN_KEY
+        self._chars = chars
+        self._seen: dict[str, dict[str, str | bytes]] = {}  # prefix → {hex → key}
+        self.collisions = 0
+
+    def tokenize(self, value: str, prefix: str) -> str:
+        """Get the deterministic token for a value."""
+        digest = blake2b(
+            prefix.encode("utf-8") + b"\0" + value.encode("utf-8", "surrogatepass"),
+            key=self._key,
+            digest_size=16,
+        ).hexdigest()
+        short = digest[: self._chars]
+
+        seen = self._seen.setdefault(prefix, {})
+        key = _token_key(value)
+        owner = seen.setdefault(short, key)
+        if owner == key:
+            return f"[{prefix}_{short}]"
+
+        self.collisions += 1
+        logger.warning(
+            f"Hash token collision on [{prefix}_{short}] — using full digest"
+        )
+        seen.setdefault(digest, key)
+        return f"[{prefix}_{digest}]"
+
+    @property
+    def key(self) -> bytes:
+        return self._key
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(len(m) for m in self._seen.values())
+
+    def close(self) -> None:
+        """No external resources — present for Tokenizer compatibility."""
+
+
+def make_tokenizer(
+    mode: str = "counter", spill_mb: float = 0
+) -> Tokenizer | HashTokenizer:
+    """Build a tokenizer for a token mode.
+
+    Args:
+        mode: "counter" ([IP_1], [IP_2] in encounter order) or "hash"
+            (keyed digest, identical across processes sharing SCRUB_TOKEN_KEY)
+        spill_mb: Spill threshold for counter mode (see Tokenizer)
+
+    Raises:
+        ValueError: If mode is unknown
+    """
+    if mode == "counter":
+        return Tokenizer(spill_mb=spill_mb)
+    if mode == "hash":
+        return HashTokenizer()
+    raise ValueError(f"Unknown token mode '{mode}'. Available: {TOKEN_MODES}")
 
 
 # Standard patterns (for prompts, not logs)
@@ -87,6 +360,10 @@ TOKEN_PREFIX: dict[str, str] = {
     "terminal_user": "USER",
 }
 
+# Item types whose matches may span lines. Other types are held to single
+# lines when a block of lines is scrubbed at once (see ScanPlan.scan).
+MULTILINE_TYPES = frozenset({"terminal_user"})
+
 # Which capture group contains the value to tokenize (default: 0 = full match)
 CAPTURE_GROUP: dict[str, int] = {
     "secret": 2,  # (keyword)(value) — want value
@@ -96,11 +373,537 @@ CAPTURE_GROUP: dict[str, int] = {
 }
 
 
+_DIGIT = re.compile(r"\d")
+_UPPER = re.compile(r"[A-Z]")
+_SECRET_KEYWORD = re.compile(r"(?i)secret|token|passw|pwd|apikey|api_key|auth")
+_USER_KEYWORD = re.compile(r"(?i)user|uid")
+_HTTP_METHODS = ("GET", "POST", "PUT", "DELETE", "PATCH")
+_TERMINAL_COMMANDS = ("whoami", "id", "logname")
+
+# Cheap necessary conditions per item type — if the check is False the
+# pattern cannot match, so its finditer is skipped. Every check must be
+# implied by the pattern (literals and character classes it requires); types
+# without a useful condition (api_key) always run.
+PREFILTER: dict[str, Callable[[str], bool]] = {
+    "email": lambda t: "@" in t and "." in t,
+    "phone": lambda t: _DIGIT.search(t) is not None,
+    "name": lambda t: _UPPER.search(t) is not None,
+    "secret": lambda t: _SECRET_KEYWORD.search(t) is not None,
+    "bearer": lambda t: "Bearer" in t,
+    "path": lambda t: "/" in t or "~" in t,
+    "resource_id": lambda t: "-" in t or ":" in t,
+    "ip": lambda t: "." in t and _DIGIT.search(t) is not None,
+    "private_ip": lambda t: "10." in t or "172." in t or "192.168." in t,
+    "internal_url": lambda t: "http" in t,
+    "timestamp": lambda t: ":" in t and _DIGIT.search(t) is not None,
+    "endpoint": lambda t: "/" in t and any(m in t for m in _HTTP_METHODS),
+    "user": lambda t: _USER_KEYWORD.search(t) is not None,
+    "terminal_user": lambda t: "\n" in t and any(c in t for c in _TERMINAL_COMMANDS),
+}
+
+
+def _builtin_prefilter(
+    item_type: str, pattern: re.Pattern
+) -> Optional[Callable[[str], bool]]:
+    """Prefilter for item_type, only if pattern is the built-in one it describes."""
+    # Equality, not identity: patterns unpickled in pool workers are copies
+    if pattern == STANDARD_PATTERNS.get(item_type) or pattern == LOG_PATTERNS.get(
+        item_type
+    ):
+        return PREFILTER.get(item_type)
+    return None
+
+
+class PatternBudgetExceeded(RuntimeError):
+    """A pattern overran its per-chunk time budget with SCRUB_BUDGET_ACTION=fail."""
+
+    def __init__(self, item_type: str, chars: int, elapsed_ms: float):
+        super().__init__(
+            f"Pattern '{item_type}' exceeded its {PATTERN_BUDGET_MS} ms budget "
+            f"on a {chars}-char chunk ({elapsed_ms:.0f} ms) — scrub aborted"
+        )
+        self.item_type = item_type
+        self.chars = chars
+        self.elapsed_ms = elapsed_ms
+
+    def __reduce__(self):
+        # Rebuild from the fields so the error survives a process pool
+        return type(self), (self.item_type, self.chars, self.elapsed_ms)
+
+
+class ScanStats:
+    """Per-call scan accounting, filled in by ScanPlan.scan.
+
+    Tracks prefilter skips, time and match counts per item type, and any
+    budget overruns ({item_type, chars, elapsed_ms, action}).
+    """
+
+    def __init__(self):
+        self.skipped: dict[str, int] = {}
+        self.seconds: dict[str, float] = {}
+        self.matches: dict[str, int] = {}
+        self.overruns: list[dict] = []
+
+    def to_dict(self) -> dict:
+        return {
+            "prefilter_skipped": self.skipped,
+            "pattern_ms": {t: round(s * 1000, 3) for t, s in self.seconds.items()},
+            "pattern_matches": self.matches,
+            "budget_overruns": self.overruns,
+        }
+
+    def merge(self, other: "ScanStats") -> None:
+        """Add another ScanStats' counts into this one."""
+        for item_type, count in other.skipped.items():
+            self.skipped[item_type] = self.skipped.get(item_type, 0) + count
+        for item_type, seconds in other.seconds.items():
+            self.seconds[item_type] = self.seconds.get(item_type, 0.0) + seconds
+        for item_type, count in other.matches.items():
+            self.matches[item_type] = self.matches.get(item_type, 0) + count
+        self.overruns.extend(other.overruns)
+
+
+def _windowed_finditer(
+    pattern: re.Pattern,
+    text: str,
+    pos: int,
+    window: int = WINDOW_CHARS,
+    endpos: Optional[int] = None,
+) -> Iterator[re.Match]:
+    """finditer over text[pos:endpos] in bounded windows, capping backtracking.
+
+    Windows overlap by WINDOW_OVERLAP so matches near a window edge are
+    rescanned with more context. A match touching a window's artificial end
+    may be truncated, so it is rescanned from its own start — unless it
+    already spans the whole window, in which case it is kept as-is.
+    """
+    length = len(text) if endpos is None else endpos
+    while pos < length:
+        window_end = pos + window
+        if window_end >= length:
+            # Final window runs to the real end of the text
+            yield from pattern.finditer(text, pos, length)
+            return
+        resume = window_end - WINDOW_OVERLAP
+        for match in pattern.finditer(text, pos, window_end):
+            start, end = match.span()
+            if end == window_end and start > pos:
+                resume = start
+                break
+            yield match
+            resume = max(resume, end)
+        pos = resume
+
+
+def _windowed_scan(
+    pattern: re.Pattern, text: str, pos: int, line_bound: bool
+) -> Iterator[re.Match]:
+    """_windowed_finditer from pos, held to single lines when line_bound."""
+
+    def finditer(subject: str, start: int = 0, endpos: Optional[int] = None):
+        return _windowed_finditer(pattern, subject, start, WINDOW_CHARS, endpos)
+
+    if line_bound:
+        return _line_bound_finditer(finditer, text, "\n", pos)
+    return finditer(text, pos)
+
+
+class _CharOffsets:
+    """Maps byte offsets in UTF-8 data to str offsets, for rising offsets."""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self._byte = 0
+        self._char = 0
+
+    def __call__(self, offset: int) -> int:
+        if offset < self._byte:  # Not rising: count from the start again
+            self._byte = self._char = 0
+        self._char += len(self.data[self._byte : offset].decode("utf-8"))
+        self._byte = offset
+        return self._char
+
+
+def _line_bound_finditer(
+    finditer: Callable, subject: str | bytes, newline: str | bytes, pos: int = 0
+) -> Iterator:
+    """finditer over a block of lines, matching as if each line were alone.
+
+    Runs one finditer over the whole block. A match that crosses a line
+    break (a trailing newline is fine — per-line text ends with one) is
+    discarded: the rest of its line is rescanned with endpos at the line's
+    end, and the block scan resumes on the next line.
+    """
+    length = len(subject)
+    while pos < length:
+        for match in finditer(subject, pos):
+            start, end = match.span()
+            if subject.find(newline, start, end - 1) == -1:
+                yield match
+                continue
+            line_end = subject.find(newline, start) + 1
+            yield from finditer(subject, start, line_end)
+            pos = line_end
+            break
+        else:
+            return
+
+
+class ScanPlan:
+    """Compiled scan plan for a fixed selection of item types.
+
+    Resolves each item type to its bound finditer, capture group, token prefix
+    and prefilter once, so scrubbing doesn't repeat dict lookups per match or
+    per call. Patterns whose prefilter rules them out are skipped per chunk.
+
+    A chunk may be a block of lines scrubbed with by_line=True: matches then
+    stay within lines (except MULTILINE_TYPES) and tokens are numbered line by
+    line, so the result equals scrubbing each line separately — but with one
+    finditer setup, sort and join per block instead of per line.
+
+    With the "re2" engine, chunks of at least LINEAR_MIN_CHARS are scanned
+    by RE2 (linear time, same spans): ASCII chunks as ASCII bytes, others as
+    UTF-8 bytes with Unicode classes, spans mapped back to str offsets.
+    Patterns RE2 can only run on ASCII (\\b, IGNORECASE) are scanned in
+    WINDOW_CHARS windows on non-ASCII chunks, which bounds backtracking
+    to a window at a time. Shorter chunks use re. re also scans ASCII
+    chunks as bytes, with an ASCII compile of the pattern (same spans,
+    cheaper class checks).
+
+    A merged alternation with named groups was measured slower than this on
+    log-heavy input: sre loses the per-pattern literal prefix and charset
+    fast paths once patterns are combined, and overlapping matches across
+    types (needed for longest-match-wins) force lookahead captures at every
+    candidate position.
+    """
+
+    def __init__(self, entries: tuple[tuple[str, re.Pattern], ...], engine: str = "re"):
+        self.entries = entries
+        self.engine = engine
+        self.item_types = tuple(item_type for item_type, _ in entries)
+        self.capture_groups = {
+            item_type: CAPTURE_GROUP.get(item_type, 0) for item_type in self.item_types
+        }
+        self.prefixes = {
+            item_type: TOKEN_PREFIX.get(item_type, "TOKEN")
+            for item_type in self.item_types
+        }
+        self._scanners = tuple(
+            (
+                item_type,
+                pattern,
+                _linear_finditer(pattern) if engine == "re2" else None,
+                _unicode_finditer(pattern) if engine == "re2" else None,
+                _ascii_finditer(pattern),
+                self.capture_groups[item_type],
+                _builtin_prefilter(item_type, pattern),
+                item_type not in MULTILINE_TYPES,
+            )
+            for item_type, pattern in entries
+        )
+        self._has_linear = any(scanner[2] for scanner in self._scanners)
+
+    def scan(
+        self, text: str, stats: Optional[ScanStats] = None, by_line: bool = False
+    ) -> list[tuple[int, int, str, str]]:
+        """Find all candidate matches as (start, end, value, item_type).
+
+        Each pattern gets PATTERN_BUDGET_MS per chunk; see _overrun for what
+        happens when it runs out.
+
+        Args:
+            text: Text to scan
+            stats: Optional accounting for prefilter skips, per-type time and
+                matches, and budget overruns
+            by_line: text is a block of lines — hold matches of all but
+                MULTILINE_TYPES to single lines (see _line_bound_finditer)
+
+        Raises:
+            PatternBudgetExceeded: Budget overrun with SCRUB_BUDGET_ACTION=fail
+        """
+        matches: list[tuple[int, int, str, str]] = []
+        append = matches.append
+        budget = PATTERN_BUDGET_MS / 1000 if PATTERN_BUDGET_MS > 0 else None
+        # ASCII text: byte offsets equal str offsets, so bytes spans carry over
+        data = text.encode("ascii") if text.isascii() else None
+        long_enough = self._has_linear and len(text) >= LINEAR_MIN_CHARS
+        use_linear = long_enough and data is not None
+        utf8 = None
+        if long_enough and data is None:
+            try:
+                utf8 = text.encode("utf-8")
+            except UnicodeEncodeError:  # Lone surrogates — windows only
+                pass
+        overran = set()
+        if stats is not None:
+            overran = {overrun["item_type"] for overrun in stats.overruns}
+        for (
+            item_type,
+            pattern,
+            linear,
+            unicode,
+            ascii_finditer,
+            group_idx,
+            prefilter,
+            line_bound,
+        ) in self._scanners:
+            if prefilter is not None and not prefilter(text):
+                if stats is not None:
+                    stats.skipped[item_type] = stats.skipped.get(item_type, 0) + 1
+                continue
+
+            # How subject encodes text (None: subject is text)
+            encoding = "ascii"
+            line_bound = line_bound and by_line
+            if use_linear and linear is not None:
+                finditer = linear
+            elif item_type in overran:
+                # Overran earlier in this job: window from the start
+                finditer = None
+            elif data is not None and ascii_finditer is not None:
+                finditer = ascii_finditer
+            elif long_enough and data is None:
+                # Non-ASCII: RE2 on UTF-8 if it can, else windows — never
+                # an unbounded re scan
+                finditer = unicode if utf8 is not None else None
+                encoding = "utf-8"
+            else:
+                finditer = pattern.finditer
+                encoding = None
+            if finditer is None:
+                encoding = None
+                source = _windowed_scan(pattern, text, 0, line_bound)
+            else:
+                subject = {"ascii": data, "utf-8": utf8, None: text}[encoding]
+                if line_bound:
+                    newline = "\n" if encoding is None else b"\n"
+                    source = _line_bound_finditer(finditer, subject, newline)
+                else:
+                    source = finditer(subject)
+            offsets = _CharOffsets(utf8) if encoding == "utf-8" else None
+            started = perf_counter()
+            found = len(matches)
+            resume_at = None
+            for match in source:
+                value = match.group(group_idx)
+                if value:  # Guard against None from alternations
+                    # Get span of the specific capture group
+                    start, end = match.span(group_idx)
+                    if encoding is not None:
+                        value = value.decode(encoding)
+                    if offsets is not None:
+                        start, end = offsets(start), offsets(end)
+                    append((start, end, value, item_type))
+                if budget is not None and perf_counter() - started > budget:
+                    resume_at = match.end()
+                    if offsets is not None:
+                        resume_at = offsets(resume_at)
+                    break
+
+            elapsed = perf_counter() - started
+            if resume_at is not None:
+                self._overrun(item_type, text, elapsed, stats)
+                for match in _windowed_scan(pattern, text, resume_at, line_bound):
+                    value = match.group(group_idx)
+                    if value:
+                        start, end = match.span(group_idx)
+                        append((start, end, value, item_type))
+                elapsed = perf_counter() - started
+            elif budget is not None and elapsed > budget:
+                # Finished, but one long attempt blew the budget between matches
+                self._overrun(item_type, text, elapsed, stats, completed=True)
+
+            if stats is not None:
+                stats.seconds[item_type] = stats.seconds.get(item_type, 0.0) + elapsed
+                stats.matches[item_type] = (
+                    stats.matches.get(item_type, 0) + len(matches) - found
+                )
+        return matches
+
+    def _overrun(
+        self,
+        item_type: str,
+        text: str,
+        elapsed: float,
+        stats: Optional[ScanStats],
+        completed: bool = False,
+    ) -> None:
+        """Handle a pattern that ran out of budget on a chunk.
+
+        "fail" raises, whether or not the scan got to the end of the chunk.
+        "window" returns so the caller rescans the rest of the chunk in
+        WINDOW_CHARS windows — unless it's completed. Either way, the
+        pattern's later chunks in the same job (same stats) are windowed
+        from the start.
+        """
+        if BUDGET_ACTION == "fail":
+            action = "fail"
+        else:
+            action = "completed" if completed else "window"
+        self._record_overrun(item_type, text, elapsed, action, stats)
+        if action == "fail":
+            raise PatternBudgetExceeded(item_type, len(text), elapsed * 1000)
+
+    @staticmethod
+    def _record_overrun(
+        item_type: str,
+        text: str,
+        elapsed: float,
+        action: str,
+        stats: Optional[ScanStats],
+    ) -> None:
+        elapsed_ms = round(elapsed * 1000, 1)
+        logger.warning(
+            f"Scrub pattern '{item_type}' overran budget: {elapsed_ms} ms "
+            f"on {len(text)} chars (action={action})"
+        )
+        if stats is not None:
+            stats.overruns.append(
+                {
+                    "item_type": item_type,
+                    "chars": len(text),
+                    "elapsed_ms": elapsed_ms,
+                    "action": action,
+                }
+            )
+
+    def scrub(
+        self,
+        text: str,
+        tokenizer: Tokenizer | HashTokenizer,
+        stats: Optional[ScanStats] = None,
+        by_line: bool = False,
+    ) -> tuple[str, list[dict], dict[str, int]]:
+        """Scrub text with this plan — see scrub_text for semantics.
+
+        stats, if given, collects scan accounting (see ScanStats). With
+        by_line, text is a block of "\n"-terminated lines scrubbed as if
+        line by line (see the class docstring).
+        """
+        # Collect matches with their spans — (start, end, value, item_type)
+        matches = self.scan(text, stats, by_line)
+        prefixes = self.prefixes
+
+        # Sort by span length descending (longest match wins for overlaps)
+        matches.sort(key=lambda x: x[1] - x[0], reverse=True)
+
+        # Select non-overlapping matches (longest first). A byte per character
+        # marks claimed positions, so each overlap check only touches the
+        # candidate's own span instead of every selected span.
+        claimed = bytearray(len(text))
+        selected: list[tuple[int, int, str, str]] = []
+        for match in matches:
+            start, end = match[0], match[1]
+            if claimed.find(1, start, end) == -1:
+                claimed[start:end] = b"\x01" * (end - start)
+                selected.append(match)
+
+        # Order by start position for the single-pass output builder
+        selected.sort(key=lambda x: x[0])
+
+        # Tokenize from end to start so token numbering matches the historical
+        # right-to-left replacement order (per line, for blocks of lines)
+        if by_line:
+            order = _line_reversed_order(text, selected)
+        else:
+            order = range(len(selected) - 1, -1, -1)
+        replacements = []
+        summary: dict[str, int] = {}
+        tokens: list[str] = [""] * len(selected)
+
+        for index in order:
+            _, _, value, item_type = selected[index]
+            prefix = prefixes[item_type]
+            replacement = tokenizer.tokenize(value, prefix)
+            tokens[index] = replacement
+
+            replacements.append(
+                {
+                    "replacement": replacement,
+                    "item_type": item_type,
+                }
+            )
+            summary[item_type] = summary.get(item_type, 0) + 1
+
+        # Assemble output in one pass (left to right)
+        parts: list[str] = []
+        pos = 0
+        for (start, end, _, _), replacement in zip(selected, tokens):
+            parts.append(text[pos:start])
+            parts.append(replacement)
+            pos = end
+        parts.append(text[pos:])
+
+        return "".join(parts), replacements, summary
+
+
+def _line_reversed_order(
+    text: str, selected: list[tuple[int, int, str, str]]
+) -> list[int]:
+    """Indices of start-ordered selected matches, lines in order, each reversed."""
+    order: list[int] = []
+    line: list[int] = []
+    line_end = -1
+    for index, match in enumerate(selected):
+        if match[0] > line_end:
+            order.extend(reversed(line))
+            line = []
+            line_end = text.find("\n", match[0])
+            if line_end == -1:
+                line_end = len(text)
+        line.append(index)
+    order.extend(reversed(line))
+    return order
+
+
+@lru_cache(maxsize=None)
+def _linear_finditer(pattern: re.Pattern) -> Optional[Callable]:
+    compiled = compile_linear(pattern)
+    return compiled.finditer if compiled is not None else None
+
+
+@lru_cache(maxsize=None)
+def _unicode_finditer(pattern: re.Pattern) -> Optional[Callable]:
+    compiled = compile_unicode(pattern)
+    return compiled.finditer if compiled is not None else None
+
+
+@lru_cache(maxsize=None)
+def _ascii_finditer(pattern: re.Pattern) -> Optional[Callable]:
+    compiled = compile_ascii(pattern)
+    return compiled.finditer if compiled is not None else None
+
+
+@lru_cache(maxsize=128)
+def _compile_scan_plan(
+    entries: tuple[tuple[str, re.Pattern], ...], engine: str
+) -> ScanPlan:
+    return ScanPlan(entries, engine)
+
+
+def get_scan_plan(
+    item_types: list[str],
+    patterns: dict[str, re.Pattern],
+    backend: Optional[str] = None,
+) -> ScanPlan:
+    """Get the cached scan plan for item_types against a pattern set.
+
+    Unknown item types are dropped and duplicates collapsed (first wins).
+    backend overrides SCRUB_REGEX_BACKEND ("auto", "re" or "re2").
+    """
+    entries = tuple(
+        (item_type, patterns[item_type])
+        for item_type in dict.fromkeys(item_types)
+        if patterns.get(item_type)
+    )
+    return _compile_scan_plan(entries, resolve_backend(backend))
+
+
 def scrub_text(
     text: str,
     item_types: list[str],
     patterns: dict[str, re.Pattern],
-    tokenizer: Tokenizer,
+    tokenizer: Tokenizer | HashTokenizer,
 ) -> tuple[str, list[dict], dict[str, int]]:
     """Core scrub function — extract matches and tokenize using span positions.
 
@@ -116,53 +919,4 @@ def scrub_text(
     Returns:
         (scrubbed_text, list of {replacement, item_type}, summary counts by type)
     """
-    # Collect matches with their spans
-    matches: list[tuple[int, int, str, str]] = []  # (start, end, value, item_type)
-    for item_type in item_types:
-        pattern = patterns.get(item_type)
-        if not pattern:
-            continue
-        for match in pattern.finditer(text):
-            group_idx = CAPTURE_GROUP.get(item_type, 0)
-            value = match.group(group_idx)
-            if value:  # Guard against None from alternations
-                # Get span of the specific capture group
-                start, end = match.span(group_idx)
-                matches.append((start, end, value, item_type))
-
-    # Sort by span length descending (longest match wins for overlaps)
-    matches.sort(key=lambda x: x[1] - x[0], reverse=True)
-
-    # Select non-overlapping matches (longest first)
-    selected: list[tuple[int, int, str, str]] = []
-    for start, end, value, item_type in matches:
-        # Check if this span overlaps with any already-selected span
-        overlaps = any(
-            not (end <= sel_start or start >= sel_end)
-            for sel_start, sel_end, _, _ in selected
-        )
-        if not overlaps:
-            selected.append((start, end, value, item_type))
-
-    # Sort selected by start position descending (replace from end to preserve positions)
-    selected.sort(key=lambda x: x[0], reverse=True)
-
-    # Replace using spans (end-to-start preserves positions)
-    result = text
-    replacements = []
-    summary: dict[str, int] = {}
-
-    for start, end, value, item_type in selected:
-        prefix = TOKEN_PREFIX.get(item_type, "TOKEN")
-        replacement = tokenizer.tokenize(value, prefix)
-        result = result[:start] + replacement + result[end:]
-
-        replacements.append(
-            {
-                "replacement": replacement,
-                "item_type": item_type,
-            }
-        )
-        summary[item_type] = summary.get(item_type, 0) + 1
-
-    return result, replacements, summary
+    return get_scan_plan(item_types, patterns).scrub(text, tokenizer)
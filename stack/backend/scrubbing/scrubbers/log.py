@@ -1,36 +1,107 @@
 """Log file scrubbing — handles file I/O with path validation."""
 
+import mmap
+import multiprocessing
+import os
+import re
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import ExitStack, contextmanager
+from pathlib import Path
+from typing import BinaryIO, Callable, Iterable, Iterator, Optional
+
+from scrubbing.scrubbers.checkpoint import (
+    CHECKPOINT_SECS,
+    ScrubCheckpoint,
+    job_identity,
+)
 from scrubbing.scrubbers.core import (
-    LOG_PATTERNS,
-    STANDARD_PATTERNS,
+    TOKENIZER_SPILL_MB,
+    HashTokenizer,
+    ScanPlan,
+    ScanStats,
     Tokenizer,
-    scrub_text,
+    _compile_scan_plan,
+    _token_key,
+    make_tokenizer,
 )
+from scrubbing.scrubbers.profiles import get_profile
+from utils.compression import CompressedWriter, file_codec, open_reader
 from utils.paths import scrub_sandbox
 
-# Merge pattern sets for comprehensive log scrubbing
-MERGED_PATTERNS = {**STANDARD_PATTERNS, **LOG_PATTERNS}
+# Worker processes for large files (0 = one per CPU; 1 disables the pool)
+SCRUB_WORKERS = int(os.getenv("SCRUB_WORKERS", "0")) or os.cpu_count() or 1
+# Files smaller than this are scrubbed in-process — pool dispatch isn't free
+PARALLEL_MIN_BYTES = int(float(os.getenv("SCRUB_PARALLEL_MIN_MB", "8")) * 1024 * 1024)
+# Target byte range per pool task (ends are moved forward to a line boundary)
+CHUNK_BYTES = int(float(os.getenv("SCRUB_CHUNK_MB", "4")) * 1024 * 1024)
+
+# Input scrubbed per scan (bytes, extended to the end of the line) — one
+# finditer/sort/join per block instead of per line
+BLOCK_BYTES = int(float(os.getenv("SCRUB_BLOCK_KB", "1024")) * 1024)
+# Output buffer — blocks are written whole, this batches the small ones
+WRITE_BUFFER_BYTES = 4 * 1024 * 1024
+# Output compression: "auto" (same as the input), "none", "gzip" or "zstd"
+OUTPUT_COMPRESSION = os.getenv("SCRUB_OUTPUT_COMPRESSION", "auto")
+
+# Chunk-local tokens are wrapped in a private-use character absent from the
+# chunk, so renumbering can't touch text that merely looks like a token
+_MARKER_CANDIDATES = range(0xE000, 0xF900)
+
+_pool: Optional[ProcessPoolExecutor] = None
 
 
 def scrub_log_file(
     input_path: str,
     output_path: str,
-    item_types: list[str],
+    item_types: Optional[list[str]] = None,
+    profile: str = "all",
+    token_mode: str = "counter",
+    progress: Optional[Callable[[int, int, int], object]] = None,
+    output_codec: str = OUTPUT_COMPRESSION,
 ) -> dict:
     """Scrub a log file.
 
     Path validation happens HERE — MCP doesn't trust the caller.
 
+    Lines are scrubbed in blocks of about SCRUB_BLOCK_KB, with the same output
+    and counts as scrubbing each line alone — except that multi-line types
+    (terminal_user: "whoami\\nalice") can match; a pair split across two
+    blocks is missed.
+
+    Files of at least SCRUB_PARALLEL_MIN_MB are split at line boundaries and
+    scrubbed across SCRUB_WORKERS processes; output, counts and token
+    numbering are identical to the sequential run.
+
+    Progress is checkpointed every SCRUB_CHECKPOINT_SECS (see checkpoint.py);
+    rerunning a killed job with the same paths resumes from the last
+    checkpoint as long as the input and patterns are unchanged.
+
+    gzip and zstd inputs (detected by magic bytes) are decompressed as they
+    are read — the decompressed file never touches disk. They are scrubbed
+    sequentially: the pool needs random access to line-aligned ranges.
+
     Args:
         input_path: Filename under /data/scrub/in
         output_path: Filename under /data/scrub/out
-        item_types: Types to scrub (e.g., ["ip", "user", "endpoint"])
+        item_types: Optional subset of the profile's types (e.g., ["ip", "user"])
+        profile: Scrub profile name (default "all" — log + standard patterns)
+        token_mode: "counter" ([IP_1]…) or "hash" (keyed digest, see HashTokenizer)
+        progress: Called as progress(bytes_done, bytes_total, lines_processed)
+            after each block (sequential) or chunk (pool) is written; bytes
+            are of the input file as stored (compressed, if it is)
+        output_codec: "auto" (compress like the input), "none", "gzip" or "zstd"
 
     Returns:
-        Summary dict with lines_processed, items_scrubbed
+        Summary dict with lines_processed, items_scrubbed, summary, plus scan
+        stats: prefilter_skipped (blocks on which each item type's regex was
+        skipped), pattern_ms, pattern_matches and budget_overruns
 
     Raises:
-        ValueError: If paths escape sandbox
+        ValueError: If paths escape sandbox, profile/token_mode/output_codec is
+            unknown, or the input is compressed with an unavailable codec
+        PatternBudgetExceeded: If a pattern overruns with SCRUB_BUDGET_ACTION=fail
         FileNotFoundError: If input file doesn't exist
     """
     # Validate paths — MCP is the authority
@@ -42,28 +113,453 @@ def scrub_log_file(
 
     safe_out.parent.mkdir(parents=True, exist_ok=True)
 
-    tokenizer = Tokenizer()  # Shared across all lines for consistency
-    lines_processed = 0
-    items_scrubbed = 0
-    total_summary: dict[str, int] = {}
-
-    with (
-        open(safe_in, encoding="utf-8", errors="replace") as infile,
-        open(safe_out, "w", encoding="utf-8") as outfile,
-    ):
-        for line in infile:
-            lines_processed += 1
-            # Use merged patterns to catch emails, API keys, etc. in logs
-            scrubbed_line, replacements, summary = scrub_text(
-                line, item_types, MERGED_PATTERNS, tokenizer
+    plan = get_profile(profile).plan_for(item_types)
+
+    # Shared across all lines for consistency
+    tokenizer = make_tokenizer(token_mode, spill_mb=TOKENIZER_SPILL_MB)
+    stats = ScanStats()
+    in_codec = file_codec(safe_in)
+    out_codec = _output_codec(output_codec, in_codec)
+    workers = SCRUB_WORKERS
+    if in_codec is not None or safe_in.stat().st_size < PARALLEL_MIN_BYTES:
+        workers = 1
+
+    checkpoint = None
+    if CHECKPOINT_SECS > 0:
+        checkpoint = ScrubCheckpoint(
+            scrub_sandbox.resolve(f"{output_path}.ckpt", "ckpt"),
+            job_identity(safe_in, plan.entries, tokenizer, out_codec),
+        )
+
+    try:
+        totals = _scrub_file(
+            safe_in,
+            safe_out,
+            plan,
+            tokenizer,
+            stats,
+            workers,
+            CHUNK_BYTES,
+            checkpoint,
+            progress,
+            in_codec,
+            out_codec,
+        )
+        if checkpoint is not None:
+            checkpoint.remove()  # Done — a rerun starts over
+    finally:
+        if checkpoint is not None:
+            checkpoint.close()
+        tokenizer.close()  # Removes the spill file, if any
+
+    return {**totals, **stats.to_dict()}
+
+
+def _scrub_file(
+    safe_in: Path,
+    safe_out: Path,
+    plan: ScanPlan,
+    tokenizer: Tokenizer | HashTokenizer,
+    stats: ScanStats,
+    workers: int,
+    chunk_bytes: int,
+    checkpoint: Optional[ScrubCheckpoint] = None,
+    progress: Optional[Callable[[int, int, int], object]] = None,
+    in_codec: Optional[str] = None,
+    out_codec: Optional[str] = None,
+) -> dict:
+    """Scrub safe_in into safe_out, resuming from checkpoint if it has progress.
+
+    Offsets (checkpoint, blocks) are in the decompressed input; a compressed
+    input is resumed by decompressing up to the saved offset again.
+
+    Returns:
+        {lines_processed, items_scrubbed, summary}
+    """
+    saved = checkpoint.load(tokenizer, stats) if checkpoint is not None else None
+    if checkpoint is not None and isinstance(tokenizer, Tokenizer):
+        tokenizer.start_journal()
+
+    in_offset = 0
+    out_offset = out_state = None
+    totals = {"lines_processed": 0, "items_scrubbed": 0, "summary": {}}
+    if saved is not None:
+        in_offset = saved["in_offset"]
+        out_offset = saved["out_offset"]
+        out_state = saved.get("out_state")
+        totals = {key: saved[key] for key in totals}
+
+    with ExitStack() as stack:
+        outfile = stack.enter_context(
+            _open_output(safe_out, out_offset, out_codec, out_state)
+        )
+        if in_codec is None:
+            buf = stack.enter_context(_map_file(safe_in))
+            blocks = _mapped_blocks(buf, in_offset, len(buf))
+            size = len(buf)
+            position = None
+        else:
+            raw = stack.enter_context(open(safe_in, "rb"))
+            reader = stack.enter_context(open_reader(raw, in_codec))
+            blocks = _stream_blocks(reader, in_offset, BLOCK_BYTES)
+            size = os.fstat(raw.fileno()).st_size
+            position = raw.tell
+
+        def written(offset: int) -> None:
+            """Input up to offset is in outfile (and totals)."""
+            if checkpoint is not None and checkpoint.due():
+                checkpoint.save(offset, outfile, totals, tokenizer, stats)
+            if progress is not None:
+                done = offset if position is None else position()
+                progress(done, size, totals["lines_processed"])
+
+        if workers > 1:
+            _scrub_parallel(
+                str(safe_in),
+                buf,
+                in_offset,
+                outfile,
+                plan,
+                tokenizer,
+                stats,
+                totals,
+                written,
+                workers,
+                chunk_bytes,
+            )
+            return totals
+
+        for block_end, text, lines, items, summary in _scrub_blocks(
+            blocks, plan, tokenizer, stats
+        ):
+            outfile.write(text.encode("utf-8"))
+            _add_totals(totals, lines, items, summary)
+            written(block_end)
+    return totals
+
+
+def _output_codec(output_codec: str, in_codec: Optional[str]) -> Optional[str]:
+    if output_codec == "auto":
+        return in_codec
+    if output_codec == "none":
+        return None
+    if output_codec in ("gzip", "zstd"):
+        return output_codec
+    raise ValueError(
+        f"Unknown output_codec '{output_codec}'. Use auto, none, gzip or zstd"
+    )
+
+
+def _open_output(
+    path: Path,
+    resume_at: Optional[int],
+    codec: Optional[str] = None,
+    state: Optional[dict] = None,
+) -> BinaryIO | CompressedWriter:
+    """Open the output for writing — cut back to resume_at when resuming.
+
+    A compressed output is cut at a checkpoint's flush and continued from
+    the writer state saved with it, so the result is still one stream.
+    """
+    if resume_at is None:
+        outfile = open(path, "wb", buffering=WRITE_BUFFER_BYTES)
+    else:
+        if not path.exists() or path.stat().st_size < resume_at:
+            raise RuntimeError(
+                f"Output {path.name} is shorter than its checkpoint — "
+                "remove the output to start over"
             )
-            items_scrubbed += len(replacements)
-            for item_type, count in summary.items():
-                total_summary[item_type] = total_summary.get(item_type, 0) + count
-            outfile.write(scrubbed_line)
+        if codec is not None and state is None:
+            raise RuntimeError(
+                f"Checkpoint for {path.name} has no compressor state — "
+                "remove the output to start over"
+            )
+        outfile = open(path, "r+b", buffering=WRITE_BUFFER_BYTES)
+        outfile.truncate(resume_at)
+        outfile.seek(resume_at)
+    if codec is None:
+        return outfile
+    try:
+        return CompressedWriter(outfile, codec, resume=state)
+    except Exception:
+        outfile.close()
+        raise
+
+
+def _add_totals(totals: dict, lines: int, items: int, summary: dict) -> None:
+    totals["lines_processed"] += lines
+    totals["items_scrubbed"] += items
+    total_summary = totals["summary"]
+    for item_type, count in summary.items():
+        total_summary[item_type] = total_summary.get(item_type, 0) + count
+
+
+def _scrub_blocks(
+    blocks: Iterable[tuple[int, bytes]],
+    plan: ScanPlan,
+    tokenizer: Tokenizer | HashTokenizer,
+    stats: ScanStats,
+) -> Iterator[tuple[int, str, int, int, dict[str, int]]]:
+    """Scrub line-aligned (block end offset, data) blocks one by one.
+
+    Yields:
+        (block end offset, scrubbed text, lines, items scrubbed, summary)
+    """
+    for block_end, data in blocks:
+        block = _decode_block(data)
+        lines = block.count("\n") + (not block.endswith("\n"))
+        scrubbed, replacements, summary = plan.scrub(
+            block, tokenizer, stats, by_line=True
+        )
+        yield block_end, scrubbed, lines, len(replacements), summary
+
+
+def _mapped_blocks(
+    buf: mmap.mmap | bytes, start: int, end: int
+) -> Iterator[tuple[int, bytes]]:
+    for block_start, block_end in _line_ranges(buf, start, end, BLOCK_BYTES):
+        yield block_end, buf[block_start:block_end]
+
+
+def _stream_blocks(
+    reader: BinaryIO, start: int, size: int
+) -> Iterator[tuple[int, bytes]]:
+    """Blocks of a decompressing reader, cut exactly as _line_ranges cuts.
+
+    The first start bytes are read and dropped (resuming a checkpoint).
+    A long line is buffered without rescanning or copying what was read.
+    """
+    skip = start
+    while skip > 0:
+        skipped = len(reader.read(min(skip, size)))
+        if not skipped:
+            raise RuntimeError("Input is shorter than its checkpoint")
+        skip -= skipped
+
+    offset = start
+    pending = bytearray()
+    searched = 0  # pending[size - 1 : searched] has no newline
+    while True:
+        data = reader.read(size)
+        pending += data
+        while len(pending) >= size or (not data and pending):
+            cut = pending.find(b"\n", max(size - 1, searched))
+            if cut == -1:
+                if data:
+                    searched = len(pending)
+                    break  # Line continues past what has been read
+                cut = len(pending)
+            else:
+                cut += 1
+            offset += cut
+            yield offset, bytes(pending[:cut])
+            del pending[:cut]
+            searched = 0
+        if not data:
+            return
+
+
+def _line_ranges(
+    buf: mmap.mmap | bytes, start: int, end: int, size: int
+) -> Iterator[tuple[int, int]]:
+    """Split buf[start:end] into ranges of about size bytes, each cut after a newline."""
+    while start < end:
+        cut = buf.find(b"\n", min(start + size, end) - 1, end)
+        cut = end if cut == -1 else cut + 1
+        yield start, cut
+        start = cut
+
+
+def _decode_block(data: bytes) -> str:
+    """Decode a line-aligned block exactly as text-mode open() would.
+
+    UTF-8 with errors="replace", and universal newlines: \r\n and a lone \r
+    read as \n. ASCII blocks without \r (most logs) take a plain copy.
+    """
+    if data.isascii() and b"\r" not in data:
+        return data.decode("ascii")
+    text = data.decode("utf-8", errors="replace")
+    if "\r" in text:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+    return text
+
+
+@contextmanager
+def _map_file(path: Path | str) -> Iterator[mmap.mmap | bytes]:
+    """Read-only mmap of a file (b"" for an empty one, which can't be mapped)."""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            yield b""
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+            yield buf
+
+
+def _scrub_parallel(
+    path: str,
+    buf: mmap.mmap | bytes,
+    start: int,
+    outfile: BinaryIO,
+    plan: ScanPlan,
+    tokenizer: Tokenizer | HashTokenizer,
+    stats: ScanStats,
+    totals: dict,
+    written: Callable[[int], None],
+    workers: int,
+    chunk_bytes: int,
+) -> None:
+    """Scrub line-aligned byte ranges in the pool, writing results in order.
+
+    Counter mode: each chunk is tokenized with its own numbering, wrapped in
+    a marker. Chunks are merged in file order, so each chunk's first-seen
+    values get global ids exactly where the sequential run would assign
+    them, and the markers are rewritten to "[PREFIX_n]". Hash mode needs no
+    merge; the key is passed explicitly because an unset SCRUB_TOKEN_KEY is
+    random per process.
+    """
+    hash_key = tokenizer.key if isinstance(tokenizer, HashTokenizer) else None
+    pool = _get_pool(workers)
+    pending: deque[tuple[int, Future]] = deque()
+    ranges = _line_ranges(buf, start, len(buf), chunk_bytes)
+
+    def submit_next() -> bool:
+        byte_range = next(ranges, None)
+        if byte_range is None:
+            return False
+        future = pool.submit(
+            _scrub_range, path, *byte_range, plan.entries, plan.engine, hash_key
+        )
+        pending.append((byte_range[1], future))
+        return True
+
+    try:
+        # Keep a bounded window in flight so finished chunks don't pile up
+        for _ in range(2 * workers):
+            if not submit_next():
+                break
+        while pending:
+            chunk_end, future = pending.popleft()
+            chunk = future.result()
+            submit_next()
+
+            text = chunk["text"]
+            if chunk["marker"] is not None:
+                text = _renumber(text, chunk["marker"], chunk["keys"], tokenizer)
+            outfile.write(text.encode("utf-8"))
+            _add_totals(totals, chunk["lines"], chunk["items"], chunk["summary"])
+            stats.merge(chunk["stats"])
+            written(chunk_end)
+    except BrokenProcessPool:
+        _reset_pool()
+        raise
+    finally:
+        for _, future in pending:
+            future.cancel()
+
+
+def _scrub_range(
+    path: str,
+    start: int,
+    end: int,
+    entries: tuple,
+    engine: str,
+    hash_key: Optional[bytes],
+) -> dict:
+    """Pool task — scrub one byte range in blocks, as the sequential loop does.
+
+    Ranges start and end on a newline, so they split into the same blocks
+    and lines as the sequential run.
+    """
+    plan = _compile_scan_plan(entries, engine)
+    stats = ScanStats()
+    totals = {"lines_processed": 0, "items_scrubbed": 0, "summary": {}}
+    out: list[str] = []
+    with _map_file(path) as buf:
+        marker = None
+        if hash_key is not None:
+            tokenizer = HashTokenizer(key=hash_key)
+        else:
+            marker = _pick_marker(buf, start, end)
+            tokenizer = _ChunkTokenizer(marker)
+        for _, text, lines, items, summary in _scrub_blocks(
+            _mapped_blocks(buf, start, end), plan, tokenizer, stats
+        ):
+            out.append(text)
+            _add_totals(totals, lines, items, summary)
 
     return {
-        "lines_processed": lines_processed,
-        "items_scrubbed": items_scrubbed,
-        "summary": total_summary,
+        "text": "".join(out),
+        "marker": marker,
+        "keys": tokenizer.first_seen() if marker is not None else None,
+        "lines": totals["lines_processed"],
+        "items": totals["items_scrubbed"],
+        "summary": totals["summary"],
+        "stats": stats,
     }
+
+
+class _ChunkTokenizer(Tokenizer):
+    """Chunk-local numbering, rendered as "<marker>PREFIX_n<marker>"."""
+
+    __slots__ = ("_marker",)
+
+    def __init__(self, marker: str):
+        super().__init__()
+        self._marker = marker
+
+    def tokenize(self, value: str, prefix: str) -> str:
+        token_id = self.token_id(_token_key(value), prefix)
+        return f"{self._marker}{prefix}_{token_id}{self._marker}"
+
+
+def _pick_marker(buf: mmap.mmap | bytes, start: int, end: int) -> str:
+    """First private-use character that doesn't occur in buf[start:end].
+
+    Decoding can't introduce one: invalid bytes become U+FFFD.
+    """
+    for code in _MARKER_CANDIDATES:
+        marker = chr(code)
+        if buf.find(marker.encode("utf-8"), start, end) == -1:
+            return marker
+    raise ValueError("No free marker character for chunk")
+
+
+def _renumber(
+    text: str,
+    marker: str,
+    keys: dict[str, list],
+    tokenizer: Tokenizer,
+) -> str:
+    """Rewrite a chunk's local tokens to global ids, assigning new ones in order."""
+    # Local id i (1-based) → global id, resolved in first-seen order
+    global_ids = {
+        prefix: [0] + [tokenizer.token_id(key, prefix) for key in prefix_keys]
+        for prefix, prefix_keys in keys.items()
+    }
+    escaped = re.escape(marker)
+    token = re.compile(f"{escaped}([^{escaped}]*)_(\\d+){escaped}")
+    return token.sub(
+        lambda m: f"[{m[1]}_{global_ids[m[1]][int(m[2])]}]",
+        text,
+    )
+
+
+def _get_pool(workers: int) -> ProcessPoolExecutor:
+    """Shared worker pool, started on first use.
+
+    Spawned rather than forked — the MCP server runs tools on threads, and
+    forking a threaded process can deadlock the child.
+    """
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+        )
+    return _pool
+
+
+def _reset_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
@@ -0,0 +1,107 @@
+"""Scrub profiles — named, precompiled pattern selections.
+
+Routes and MCP tools refer to a profile by name instead of shipping the
+full item_types list on every call. Each profile compiles its scan plan
+(finditer, capture group and token prefix per item type) once at
+registration.
+"""
+
+import hashlib
+import re
+from typing import Optional
+
+from scrubbing.scrubbers.core import (
+    LOG_PATTERNS,
+    STANDARD_PATTERNS,
+    ScanPlan,
+    HashTokenizer,
+    ScanStats,
+    Tokenizer,
+    get_scan_plan,
+)
+
+# Union of both pattern sets (standard first, matching the historical merge)
+ALL_PATTERNS: dict[str, re.Pattern] = {**STANDARD_PATTERNS, **LOG_PATTERNS}
+
+
+class ScrubProfile:
+    """A named set of item types with its compiled scan plan."""
+
+    def __init__(
+        self,
+        name: str,
+        item_types: list[str],
+        patterns: Optional[dict[str, re.Pattern]] = None,
+    ):
+        self.name = name
+        self.patterns = patterns if patterns is not None else ALL_PATTERNS
+
+        unknown = [t for t in item_types if t not in self.patterns]
+        if unknown:
+            raise ValueError(f"Unknown item types for profile '{name}': {unknown}")
+
+        self.plan = get_scan_plan(item_types, self.patterns)
+        self.item_types = self.plan.item_types
+        # Changes whenever the profile's patterns do (output cache keys)
+        self.fingerprint = hashlib.blake2b(
+            repr([(t, p.pattern, p.flags) for t, p in self.plan.entries]).encode(),
+            digest_size=8,
+        ).hexdigest()
+
+    def plan_for(self, item_types: Optional[list[str]] = None) -> ScanPlan:
+        """Scan plan for this profile, optionally narrowed to item_types.
+
+        Item types outside the profile are ignored.
+        """
+        if item_types is None:
+            return self.plan
+        allowed = [t for t in item_types if t in self.plan.prefixes]
+        return get_scan_plan(allowed, self.patterns)
+
+    def scrub(
+        self,
+        text: str,
+        tokenizer: Tokenizer | HashTokenizer,
+        item_types: Optional[list[str]] = None,
+        stats: Optional[ScanStats] = None,
+    ) -> tuple[str, list[dict], dict[str, int]]:
+        """Scrub text with this profile — see scrub_text for return shape.
+
+        stats, if given, collects scan accounting (see ScanStats).
+        """
+        return self.plan_for(item_types).scrub(text, tokenizer, stats)
+
+
+PROFILES: dict[str, ScrubProfile] = {}
+
+
+def register_profile(
+    name: str,
+    item_types: list[str],
+    patterns: Optional[dict[str, re.Pattern]] = None,
+) -> ScrubProfile:
+    """Register (or replace) a named profile and return it."""
+    profile = ScrubProfile(name, item_types, patterns)
+    PROFILES[name] = profile
+    return profile
+
+
+def get_profile(name: str) -> ScrubProfile:
+    """Look up a profile by name.
+
+    Raises:
+        ValueError: If no profile is registered under name
+    """
+    profile = PROFILES.get(name)
+    if profile is None:
+        raise ValueError(
+            f"Unknown scrub profile '{name}'. Available: {sorted(PROFILES)}"
+        )
+    return profile
+
+
+# Built-in profiles
+register_profile("standard", list(STANDARD_PATTERNS), STANDARD_PATTERNS)
+register_profile("log", list(LOG_PATTERNS), LOG_PATTERNS)
+# Log types first, then standard — the order the routes historically sent
+register_profile("all", list(LOG_PATTERNS) + list(STANDARD_PATTERNS))
@@ -1,81 +1,332 @@
-"""FastMCP server exposing scrubbing tools via stdio transport."""
+"""FastMCP server exposing scrubbing tools via stdio transport.
 
-from fastmcp import FastMCP
+Run by the backend as a subprocess, or on its own as a network service that
+backends reach over MCP streamable HTTP (SCRUB_MCP_ENDPOINTS):
 
-from scrubbing.scrubbers.core import (
-    LOG_PATTERNS,
-    STANDARD_PATTERNS,
-    Tokenizer,
-    scrub_text,
-)
+    PYTHONPATH=stack/backend python scrubbing/server.py --transport http --port 8765
+
+File scrubs read and write /data/scrub, so a networked server needs the
+backend's data volume mounted.
+"""
+
+import argparse
+import asyncio
+import fcntl
+import json
+import os
+import threading
+from time import monotonic
+from typing import Iterator, Optional
+
+from fastmcp import Context, FastMCP
+
+from scrubbing.scrubbers.core import ScanStats, make_tokenizer
 from scrubbing.scrubbers.log import scrub_log_file
+from scrubbing.scrubbers.profiles import get_profile
+from utils import transfer
+from utils.paths import scrub_sandbox
 
+# Tools return their result once, as JSON text (output_schema=None drops the
+# structuredContent copy); big results go by reference, see utils/transfer.py
 mcp = FastMCP("neuralizer-scrub")
 
+# Seconds between progress notifications for file scrubs (when the caller
+# sends a progressToken). Also keeps the client's read timeout from firing.
+PROGRESS_SECS = float(os.getenv("SCRUB_PROGRESS_SECS", "1"))
+# scrub_batch text per worker-thread run — the granularity of cancellation
+BATCH_CHUNK_BYTES = 256 * 1024
+
+# Large results go by reference only over stdio — an HTTP body has no line
+# limit, and a remote client can't read this node's transfer files
+_by_reference = True
+
+
+class ScrubCancelled(Exception):
+    """The client cancelled the call; the scrub stops at the next block."""
+
+
+def _scrub_exclusive(output_path: str, *args) -> dict:
+    """scrub_log_file under an exclusive flock on ckpt/<output>.lock.
+
+    One writer per output file: a retry of a cancelled call waits here until
+    the old attempt has stopped writing, whichever thread, subprocess or
+    scrub server (on the shared /data volume) the retry landed on.
+    """
+    lock_path = scrub_sandbox.resolve(f"{output_path}.lock", "ckpt")
+    lock_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(lock_path, "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)  # Released when the file is closed
+        return scrub_log_file(*args)
+
 
-@mcp.tool()
-def scrub_prompt(text: str, item_types: list[str]) -> dict:
+@mcp.tool(output_schema=None)
+def scrub_prompt(
+    text: str = "",
+    item_types: Optional[list[str]] = None,
+    profile: str = "standard",
+    token_mode: str = "counter",
+    text_ref: Optional[str] = None,
+    replacements_format: str = "rows",
+) -> dict:
     """Scrub a prompt using standard patterns.
 
     Args:
         text: Prompt text
-        item_types: From Neuralizer detection (e.g., ["email", "phone", "name"])
+        item_types: Optional subset of the profile's types (e.g., ["email", "phone"])
+        profile: Scrub profile name (default "standard")
+        token_mode: "counter" ([EMAIL_1]…) or "hash" (keyed digest)
+        text_ref: Transfer file holding the text, instead of text
+        replacements_format: "rows" or "columns"
 
     Returns:
-        {sanitized_text, replacements, summary}
+        {sanitized_text, replacements, summary, <scan stats>}, or
+        {result_ref} naming a transfer file holding it
     """
-    sanitized, replacements, summary = scrub_text(
-        text, item_types, STANDARD_PATTERNS, Tokenizer()
+    return _scrub_text(
+        text, text_ref, item_types, profile, token_mode, replacements_format
     )
-    return {
-        "sanitized_text": sanitized,
-        "replacements": replacements,
-        "summary": summary,
-    }
 
 
-@mcp.tool()
-def scrub_log_as_prompt(text: str, item_types: list[str]) -> dict:
+@mcp.tool(output_schema=None)
+def scrub_log_as_prompt(
+    text: str = "",
+    item_types: Optional[list[str]] = None,
+    profile: str = "all",
+    token_mode: str = "counter",
+    text_ref: Optional[str] = None,
+    replacements_format: str = "rows",
+) -> dict:
     """Scrub log data that arrived as a prompt.
 
-    Uses merged pattern set (LOG_PATTERNS + STANDARD_PATTERNS) to catch
+    Defaults to the "all" profile (LOG_PATTERNS + STANDARD_PATTERNS) to catch
     emails, API keys, and other sensitive data commonly found in logs.
 
     Args:
         text: Log text pasted into prompt
-        item_types: From Neuralizer detection (e.g., ["ip", "endpoint", "user", "email", "api_key"])
+        item_types: Optional subset of the profile's types (e.g., ["ip", "email"])
+        profile: Scrub profile name (default "all")
+        token_mode: "counter" ([IP_1]…) or "hash" (keyed digest)
+        text_ref: Transfer file holding the text, instead of text
+        replacements_format: "rows" or "columns"
+
+    Returns:
+        {sanitized_text, replacements, summary, <scan stats>}, or
+        {result_ref} naming a transfer file holding it
+    """
+    return _scrub_text(
+        text, text_ref, item_types, profile, token_mode, replacements_format
+    )
+
+
+@mcp.tool(output_schema=None)
+async def scrub_batch(
+    texts: Optional[list[str]] = None,
+    item_types: Optional[list[str]] = None,
+    profile: str = "standard",
+    token_mode: str = "counter",
+    shared_tokenizer: bool = True,
+    texts_ref: Optional[str] = None,
+    replacements_format: str = "rows",
+) -> dict:
+    """Scrub many texts in one call (e.g. every message of a conversation).
+
+    Args:
+        texts: Texts to scrub, in order
+        item_types: Optional subset of the profile's types
+        profile: Scrub profile name (default "standard"; "all" for logs)
+        token_mode: "counter" ([EMAIL_1]…) or "hash" (keyed digest)
+        shared_tokenizer: One tokenizer for the batch, so a value gets the
+            same token in every text; False numbers each text from 1
+        texts_ref: Transfer file holding the texts as a JSON array, instead
+            of texts
+        replacements_format: "rows" or "columns"
 
     Returns:
-        {sanitized_text, replacements, summary}
+        {results: [{sanitized_text, replacements, summary, <scan stats>}]}
+        in the order of texts, or {result_ref} naming a transfer file
+        holding it
     """
-    # Merge pattern sets for comprehensive log scrubbing
-    merged_patterns = {**STANDARD_PATTERNS, **LOG_PATTERNS}
-    sanitized, replacements, summary = scrub_text(
-        text, item_types, merged_patterns, Tokenizer()
+    _check_format(replacements_format)
+    if texts_ref is not None:
+        texts = json.loads(transfer.read(texts_ref))
+    texts = texts or []
+    scrub_profile = get_profile(profile)
+    tokenizer = make_tokenizer(token_mode) if shared_tokenizer else None
+
+    def scrub_chunk(chunk: list[str]) -> list[dict]:
+        return [
+            _scrub_one(
+                text,
+                scrub_profile,
+                tokenizer or make_tokenizer(token_mode),
+                item_types,
+                replacements_format,
+            )
+            for text in chunk
+        ]
+
+    # A thread per chunk keeps the event loop free to take a cancellation,
+    # which stops the batch here, between chunks
+    results = []
+    for chunk in _chunks(texts, BATCH_CHUNK_BYTES):
+        results += await asyncio.to_thread(scrub_chunk, chunk)
+    return _reply({"results": results})
+
+
+def _reply(result: dict) -> dict:
+    return transfer.inline_or_ref(result) if _by_reference else result
+
+
+def _chunks(texts: list[str], size: int) -> Iterator[list[str]]:
+    """texts in runs of about size characters (at least one text each)."""
+    chunk, length = [], 0
+    for text in texts:
+        if chunk and length + len(text) > size:
+            yield chunk
+            chunk, length = [], 0
+        chunk.append(text)
+        length += len(text)
+    if chunk:
+        yield chunk
+
+
+def _check_format(replacements_format: str) -> None:
+    if replacements_format not in ("rows", "columns"):
+        raise ValueError(
+            f"Unknown replacements_format '{replacements_format}'. Use rows or columns"
+        )
+
+
+def _scrub_one(
+    text: str,
+    scrub_profile,
+    tokenizer,
+    item_types: Optional[list[str]],
+    replacements_format: str,
+) -> dict:
+    stats = ScanStats()
+    sanitized, replacements, summary = scrub_profile.scrub(
+        text, tokenizer, item_types, stats
     )
+    if replacements_format == "columns":
+        replacements = transfer.encode_replacements(replacements)
     return {
         "sanitized_text": sanitized,
         "replacements": replacements,
         "summary": summary,
+        **stats.to_dict(),
     }
 
 
-@mcp.tool()
-def scrub_log_as_file(input_path: str, output_path: str, item_types: list[str]) -> dict:
+def _scrub_text(
+    text: str,
+    text_ref: Optional[str],
+    item_types: Optional[list[str]],
+    profile: str,
+    token_mode: str,
+    replacements_format: str,
+) -> dict:
+    _check_format(replacements_format)
+    if text_ref is not None:
+        text = transfer.read(text_ref)
+    return _reply(
+        _scrub_one(
+            text,
+            get_profile(profile),
+            make_tokenizer(token_mode),
+            item_types,
+            replacements_format,
+        )
+    )
+
+
+@mcp.tool(output_schema=None)
+async def scrub_log_as_file(
+    input_path: str,
+    output_path: str,
+    item_types: Optional[list[str]] = None,
+    profile: str = "all",
+    token_mode: str = "counter",
+    output_codec: str = "auto",
+    ctx: Optional[Context] = None,
+) -> dict:
     """Scrub a log file.
 
     Path validation happens HERE — MCP doesn't trust the caller.
 
+    gzip/zstd inputs are decompressed as they are read.
+
+    Runs in a thread so progress notifications (bytes done/total, with
+    {"lines_processed": n} as the message) go out every SCRUB_PROGRESS_SECS.
+    A cancelled call (the client timed out) stops the thread after the
+    current block, leaving the checkpoint for the retry to resume from.
+
     Args:
         input_path: Filename under /data/scrub/in
         output_path: Filename under /data/scrub/out
-        item_types: Types to scrub (e.g., ["ip", "user", "endpoint"])
+        item_types: Optional subset of the profile's types (e.g., ["ip", "user"])
+        profile: Scrub profile name (default "all")
+        token_mode: "counter" ([IP_1]…) or "hash" (keyed digest)
+        output_codec: "auto" (compress like the input), "none", "gzip" or "zstd"
 
     Returns:
-        {lines_processed, items_scrubbed}
+        {lines_processed, items_scrubbed, summary, <scan stats>}
     """
-    return scrub_log_file(input_path, output_path, item_types)
+    loop = asyncio.get_running_loop()
+    last_sent = monotonic()
+    cancelled = threading.Event()
+
+    def progress(bytes_done: int, bytes_total: int, lines: int) -> None:
+        nonlocal last_sent
+        if cancelled.is_set():
+            raise ScrubCancelled(output_path)
+        if ctx is None or monotonic() - last_sent < PROGRESS_SECS:
+            return
+        last_sent = monotonic()
+        message = json.dumps({"lines_processed": lines})
+        asyncio.run_coroutine_threadsafe(
+            ctx.report_progress(bytes_done, bytes_total, message), loop
+        )
+
+    try:
+        return await asyncio.to_thread(
+            _scrub_exclusive,
+            output_path,
+            input_path,
+            output_path,
+            item_types,
+            profile,
+            token_mode,
+            progress,
+            output_codec,
+        )
+    except asyncio.CancelledError:
+        cancelled.set()
+        raise
 
 
 if __name__ == "__main__":
-    mcp.run(transport="stdio")
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--transport",
+        choices=["stdio", "http"],
+        default=os.getenv("SCRUB_MCP_TRANSPORT", "stdio"),
+    )
+    parser.add_argument("--host", default=os.getenv("SCRUB_MCP_HOST", "0.0.0.0"))
+    parser.add_argument(
+        "--port", type=int, default=int(os.getenv("SCRUB_MCP_PORT", "8765"))
+    )
+    args = parser.parse_args()
+    if args.transport == "http":
+        _by_reference = False
+        mcp.run(
+            transport="http",
+            host=args.host,
+            port=args.port,
+            show_banner=False,
+            # No websockets here — and the backend's websockets/ package
+            # (on PYTHONPATH) would shadow the library uvicorn looks for
+            uvicorn_config={"ws": "none"},
+        )
+    else:
+        mcp.run(transport="stdio")
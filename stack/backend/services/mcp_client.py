@@ -1,24 +1,343 @@
-"""Async MCP client for calling scrubbing tools via subprocess."""
+"""Async MCP client for calling scrubbing tools via subprocess.
+
+get_mcp_client() returns an MCPPool: SCRUB_MCP_PROCESSES subprocesses for
+prompt scrubs and SCRUB_MCP_FILE_PROCESSES for file scrubs (0 = file scrubs
+share the prompt processes). Each call goes to the process with the fewest
+calls in flight; a process that keeps dying is restarted with backoff.
+
+Prompt text and results above SCRUB_MCP_INLINE_KB go through sandbox files
+rather than the pipe, and replacements come back as columns (see
+utils/transfer.py).
+
+A subprocess is recycled after SCRUB_MCP_MAX_REQUESTS calls or once its RSS
+passes SCRUB_MCP_MAX_RSS_MB: a started replacement takes its place, and it
+is stopped when its calls in flight are done.
+
+With SCRUB_MCP_ENDPOINTS set, the pool is made of networked scrub servers
+(scrubbing/server.py --transport http) instead, pinged every
+SCRUB_MCP_HEALTH_SECS and skipped while down.
+"""
 
 import asyncio
 import json
+import logging
 import os
 import sys
+from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Any, Optional
+from time import monotonic
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional, Sequence
+
+import httpx
+
+from utils import transfer
+
+logger = logging.getLogger(__name__)
 
 MCP_SERVER_PATH = Path(__file__).parent.parent / "scrubbing" / "server.py"
 BACKEND_ROOT = Path(__file__).parent.parent  # stack/backend
 TOOL_TIMEOUT = 30  # seconds
+# scrub_log_as_file calls per job — a retry after a timeout resumes from the
+# job's last checkpoint (SCRUB_CHECKPOINT_SECS) instead of starting over
+SCRUB_FILE_ATTEMPTS = int(os.getenv("SCRUB_FILE_ATTEMPTS", "3"))
+# Subprocesses for prompt scrubs, and for file scrubs (default: one per job
+# worker, as each keeps one busy)
+MCP_PROCESSES = int(os.getenv("SCRUB_MCP_PROCESSES", "1"))
+MCP_FILE_PROCESSES = int(
+    os.getenv("SCRUB_MCP_FILE_PROCESSES", os.getenv("SCRUB_JOB_WORKERS", "2"))
+)
+# Restart delay after a subprocess fails, doubled per consecutive failure
+RESTART_BACKOFF = 0.5  # seconds
+RESTART_BACKOFF_MAX = 30  # seconds
+# Keep a started spare process to replace one that dies
+MCP_STANDBY = os.getenv("SCRUB_MCP_STANDBY", "true").lower() == "true"
+# Tools sent to the file sub-pool
+FILE_TOOLS = {"scrub_log_as_file"}
+# Transfer files older than this are swept at pool start (results of calls
+# that timed out before they were read)
+TRANSFER_MAX_AGE = 3600  # seconds
+# Networked scrub servers used instead of subprocesses: MCP endpoint URLs
+# (e.g. http://scrub-1:8765/mcp), comma-separated, for prompt scrubs and
+# optionally for file scrubs
+MCP_ENDPOINTS = [
+    url.strip()
+    for url in os.getenv("SCRUB_MCP_ENDPOINTS", "").split(",")
+    if url.strip()
+]
+MCP_FILE_ENDPOINTS = [
+    url.strip()
+    for url in os.getenv("SCRUB_MCP_FILE_ENDPOINTS", "").split(",")
+    if url.strip()
+]
+# Recycle a subprocess after this many calls, or once its RSS passes this
+# many MB — caches and allocator fragmentation only grow (0 = no limit)
+MAX_REQUESTS = int(os.getenv("SCRUB_MCP_MAX_REQUESTS", "10000"))
+MAX_RSS_MB = float(os.getenv("SCRUB_MCP_MAX_RSS_MB", "512"))
+# RSS is read from /proc after a call, at most this often per process
+RSS_SAMPLE_SECS = 1
+# Longest wait for a recycled subprocess's calls to finish before it's stopped
+DRAIN_SECS = 600
+# Seconds between pings of networked scrub servers
+HEALTH_SECS = float(os.getenv("SCRUB_MCP_HEALTH_SECS", "5"))
+CONNECT_TIMEOUT = 5  # seconds
+
+
+class MCPToolTimeout(RuntimeError):
+    """A tool call exceeded TOOL_TIMEOUT; the request was cancelled."""
+
+
+class MCPProcessExited(RuntimeError):
+    """The subprocess exited (or was killed), or a networked server's session
+    was lost, with the request in flight."""
+
+
+class MCPUnavailable(RuntimeError):
+    """No subprocess can take the call — all are waiting out a restart
+    backoff (or, networked, are down)."""
+
+
+# Put in a pending call's inbox when the reader stops
+_EXITED = object()
+
+
+class _PendingCall:
+    """An in-flight request: the reader task fills inbox, call_tool drains it."""
+
+    def __init__(self, on_progress: Optional[Callable[[dict], Awaitable[None]]]):
+        self.on_progress = on_progress
+        self.inbox: asyncio.Queue = asyncio.Queue()
+
+
+def _rss_bytes(pid: int) -> Optional[int]:
+    """Resident set size of a process (None without /proc, or if it's gone)."""
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            for line in status:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024  # kB
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _route(message: dict, pending: dict[int, _PendingCall]) -> None:
+    """Put a response (by id) or progress notification (by progressToken)
+    in the inbox of its call; anything else (log messages etc.) is dropped."""
+    if "method" not in message:  # Response
+        call = pending.pop(message.get("id"), None)
+    elif message["method"] == "notifications/progress":
+        call = pending.get(message.get("params", {}).get("progressToken"))
+    else:
+        return
+    if call is not None:
+        call.inbox.put_nowait(message)
+
+
+class ScrubTools(ABC):
+    """The scrubbing tools, on top of call_tool (MCPClient or MCPPool)."""
+
+    # Send large text through transfer files — only the stdio pipe needs it
+    by_reference = True
+
+    @abstractmethod
+    async def call_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any],
+        on_progress: Optional[Callable[[dict], Awaitable[None]]] = None,
+    ) -> Any:
+        """Call an MCP tool and return its result."""
+        raise NotImplementedError
+
+    def _file_client(self, previous: Optional["MCPClient"]) -> "ScrubTools":
+        """Where the next scrub_log_as_file attempt goes."""
+        return self
+
+    async def scrub_prompt(
+        self,
+        text: str,
+        item_types: Optional[list[str]] = None,
+        profile: Optional[str] = None,
+        token_mode: Optional[str] = None,
+    ) -> dict:
+        """Convenience method for scrub_prompt tool."""
+        return await self._scrub_text(
+            "scrub_prompt", text, item_types, profile, token_mode
+        )
+
+    async def scrub_log_as_prompt(
+        self,
+        text: str,
+        item_types: Optional[list[str]] = None,
+        profile: Optional[str] = None,
+        token_mode: Optional[str] = None,
+    ) -> dict:
+        """Convenience method for scrub_log_as_prompt tool."""
+        return await self._scrub_text(
+            "scrub_log_as_prompt", text, item_types, profile, token_mode
+        )
+
+    async def scrub_batch(
+        self,
+        texts: list[str],
+        item_types: Optional[list[str]] = None,
+        profile: Optional[str] = None,
+        token_mode: Optional[str] = None,
+        shared_tokenizer: bool = True,
+    ) -> list[dict]:
+        """Convenience method for scrub_batch tool — one round trip for all texts.
+
+        With shared_tokenizer, a value gets the same token in every text.
+
+        Returns:
+            One result per text, as scrub_prompt returns it
+        """
+        arguments = _scrub_arguments({}, item_types, profile, token_mode)
+        arguments["shared_tokenizer"] = shared_tokenizer
+        result = await self._call_text_tool(
+            "scrub_batch", arguments, "texts", texts, json.dumps(texts), ".json"
+        )
+        for item in result["results"]:
+            item["replacements"] = transfer.Replacements(item["replacements"])
+        return result["results"]
+
+    async def scrub_log_batch(
+        self,
+        texts: list[str],
+        item_types: Optional[list[str]] = None,
+        profile: Optional[str] = None,
+        token_mode: Optional[str] = None,
+        shared_tokenizer: bool = True,
+    ) -> list[dict]:
+        """scrub_batch for log text: the "all" profile unless told otherwise."""
+        return await self.scrub_batch(
+            texts, item_types, profile or "all", token_mode, shared_tokenizer
+        )
+
+    async def _scrub_text(
+        self,
+        name: str,
+        text: str,
+        item_types: Optional[list[str]],
+        profile: Optional[str],
+        token_mode: Optional[str],
+    ) -> dict:
+        """Call a single-text tool.
+
+        result["replacements"] is a transfer.Replacements (a read-only list
+        of {replacement, item_type}).
+        """
+        arguments = _scrub_arguments({}, item_types, profile, token_mode)
+        result = await self._call_text_tool(name, arguments, "text", text, text)
+        result["replacements"] = transfer.Replacements(result["replacements"])
+        return result
+
+    async def _call_text_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any],
+        key: str,
+        value: Any,
+        encoded: str,
+        suffix: str = ".txt",
+    ) -> dict:
+        """Call a tool with arguments[key] = value, or {key}_ref naming a
+        transfer file holding encoded when that's over INLINE_BYTES (and the
+        transport is by_reference). Replacements are asked for as columns.
+        """
+        arguments["replacements_format"] = "columns"
+        ref = None
+        if self.by_reference and len(encoded.encode("utf-8")) > transfer.INLINE_BYTES:
+            ref = await asyncio.to_thread(transfer.put, encoded, suffix)
+            arguments[f"{key}_ref"] = ref
+        else:
+            arguments[key] = value
+        try:
+            return await self.call_tool(name, arguments)
+        finally:
+            if ref is not None:
+                await asyncio.to_thread(transfer.discard, ref)
+
+    async def scrub_log_as_file(
+        self,
+        input_path: str,
+        output_path: str,
+        item_types: Optional[list[str]] = None,
+        profile: Optional[str] = None,
+        token_mode: Optional[str] = None,
+        on_progress: Optional[Callable[[dict], Awaitable[None]]] = None,
+        output_codec: Optional[str] = None,
+    ) -> dict:
+        """Convenience method for scrub_log_as_file tool.
 
+        Retried on timeout: the cancelled job left a checkpoint, so each attempt
+        continues where the last one stopped. An attempt waits for the one
+        before it to stop writing, on whatever process or server it runs
+        (the output is locked across processes — see scrubbing/server.py).
+        on_progress gets MCP progress
+        params: {progress: bytes done, total: bytes, message: JSON with
+        lines_processed}.
+        """
+        arguments = _scrub_arguments(
+            {"input_path": input_path, "output_path": output_path},
+            item_types,
+            profile,
+            token_mode,
+        )
+        if output_codec is not None:
+            arguments["output_codec"] = output_codec
+        client = None
+        for attempt in range(1, SCRUB_FILE_ATTEMPTS + 1):
+            client = self._file_client(client)
+            try:
+                return await client.call_tool(
+                    "scrub_log_as_file", arguments, on_progress
+                )
+            except MCPToolTimeout:
+                if attempt == SCRUB_FILE_ATTEMPTS:
+                    raise
+                logger.warning(
+                    f"scrub_log_as_file {input_path} timed out "
+                    f"(attempt {attempt}/{SCRUB_FILE_ATTEMPTS}), resuming"
+                )
+
+
+class MCPClient(ScrubTools):
+    """Async stdio-based MCP client for scrubbing tools.
 
-class MCPClient:
-    """Async stdio-based MCP client for scrubbing tools."""
+    Requests are multiplexed on the one stdio pipe: call_tool writes its
+    request under a short write lock and waits on its own inbox, while a
+    reader task routes each response (by JSON-RPC id) and progress
+    notification (by progressToken, which is the request id) to the inbox
+    of its call. A quick prompt scrub therefore doesn't wait behind a long
+    file scrub, and a timeout cancels only the request that timed out.
+    """
 
     def __init__(self):
         self._process: Optional[asyncio.subprocess.Process] = None
         self._request_id = 0
-        self._lock = asyncio.Lock()
+        self._write_lock = asyncio.Lock()
+        self._start_lock = asyncio.Lock()
+        # Calls in flight on the current process, by request id
+        self._pending: dict[int, _PendingCall] = {}
+        self._reader: Optional[asyncio.Task] = None
+        # When the current process last sent anything
+        self._last_heard = 0.0
+        # Health: calls in flight (including those waiting for a start),
+        # starts so far, consecutive failures and when a restart is allowed
+        self.outstanding = 0
+        # Cancellation notifications being sent for abandoned calls
+        self._background: set[asyncio.Task] = set()
+        self.starts = 0
+        self.failures = 0
+        self._retry_at = 0.0
+        # Replaced by a pool's standby — never started again
+        self.retired = False
+        self.label = "MCP subprocess"
+        # Calls answered by the current process and its last RSS sample
+        self.served = 0
+        self.rss: Optional[int] = None
+        self._rss_at = 0.0
 
     async def start(self):
         """Start the MCP server subprocess and initialize."""
@@ -36,169 +355,832 @@ class MCPClient:
             stdout=asyncio.subprocess.PIPE,
             stderr=asyncio.subprocess.DEVNULL,  # Drop stderr to avoid buffer deadlock
             env=env,
+            limit=transfer.LINE_LIMIT,  # Larger messages go by reference
         )
+        # Calls still waiting on an old process fail now, not at their timeout
+        await self._stop_reader()
+        self._pending = {}
+        self._last_heard = monotonic()
+        self.starts += 1
+        self.served = 0
+        self.rss = None
+        self._ensure_reader()
 
         # MCP protocol requires initialization handshake
         await self._initialize()
 
     async def _initialize(self):
         """Send MCP initialize handshake."""
-        self._request_id += 1
-        init_request = {
-            "jsonrpc": "2.0",
-            "id": self._request_id,
-            "method": "initialize",
-            "params": {
+        response = await self._request(
+            "initialize",
+            {
                 "protocolVersion": "2024-11-05",
                 "capabilities": {},
                 "clientInfo": {"name": "neuralizer", "version": "1.0.0"},
             },
-        }
-        request_bytes = (json.dumps(init_request) + "\n").encode()
-        self._process.stdin.write(request_bytes)
-        await self._process.stdin.drain()
-
-        # Read initialize response
-        response_line = await asyncio.wait_for(
-            self._process.stdout.readline(),
             timeout=10,
         )
-        response = json.loads(response_line.decode())
         if "error" in response:
             raise RuntimeError(f"MCP initialize failed: {response['error']}")
 
         # Send initialized notification (no response expected)
-        self._request_id += 1
-        initialized = {
-            "jsonrpc": "2.0",
-            "method": "notifications/initialized",
-        }
-        self._process.stdin.write((json.dumps(initialized) + "\n").encode())
-        await self._process.stdin.drain()
+        await self._send({"jsonrpc": "2.0", "method": "notifications/initialized"})
 
     async def stop(self):
         """Stop the MCP server subprocess."""
-        if self._process:
-            self._process.terminate()
+        process, self._process = self._process, None  # Not a crash to the reader
+        if process:
+            process.terminate()
             try:
-                await asyncio.wait_for(self._process.wait(), timeout=5)
+                await asyncio.wait_for(process.wait(), timeout=5)
             except asyncio.TimeoutError:
-                self._process.kill()
-            self._process = None
+                process.kill()
+        await self._stop_reader()
 
-    async def call_tool(self, name: str, arguments: dict[str, Any]) -> Any:
-        """Call an MCP tool and return the result."""
-        async with self._lock:
+    @property
+    def running(self) -> bool:
+        return self._process is not None and self._process.returncode is None
+
+    @property
+    def starting(self) -> bool:
+        return self._start_lock.locked()
+
+    @property
+    def available(self) -> bool:
+        """Running, or free to (re)start — not waiting out a backoff."""
+        if self.retired:
+            return False
+        return self.running or monotonic() >= self._retry_at
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "outstanding": self.outstanding,
+            "restarts": max(self.starts - 1, 0),
+            "failures": self.failures,
+            "retry_in": round(max(self._retry_at - monotonic(), 0), 1),
+            "served": self.served,
+            "rss_mb": round(self.rss / 2**20, 1) if self.rss is not None else None,
+        }
+
+    def _sample_rss(self):
+        process = self._process
+        if process is None or monotonic() - self._rss_at < RSS_SAMPLE_SECS:
+            return
+        self._rss_at = monotonic()
+        self.rss = _rss_bytes(process.pid)
+
+    def _failed(self):
+        """Count a crash or failed start and push back the next start."""
+        self.failures += 1
+        delay = min(RESTART_BACKOFF * 2 ** (self.failures - 1), RESTART_BACKOFF_MAX)
+        self._retry_at = monotonic() + delay
+        logger.warning(
+            f"{self.label} failed ({self.failures} in a row), "
+            f"restart allowed in {delay:.1f}s"
+        )
+
+    async def _stop_reader(self):
+        if self._reader is not None:
+            self._reader.cancel()
+            await asyncio.gather(self._reader, return_exceptions=True)
+            self._reader = None
+
+    async def _send(self, message: dict):
+        """Write one JSON-RPC message; the lock keeps lines from interleaving."""
+        data = (json.dumps(message) + "\n").encode()
+        async with self._write_lock:
+            # The process may have exited while we waited for the lock
+            process = self._process
+            if process is None or process.returncode is not None:
+                raise MCPProcessExited(
+                    f"{self.label} exited before {message.get('method')} was sent"
+                )
+            process.stdin.write(data)
+            await process.stdin.drain()
+
+    def _ensure_reader(self):
+        if self._reader is None or self._reader.done():
+            self._reader = asyncio.create_task(
+                self._read_loop(self._process, self._pending)
+            )
+
+    async def _read_loop(
+        self, process: asyncio.subprocess.Process, pending: dict[int, _PendingCall]
+    ):
+        """Route the subprocess's messages to pending calls until it exits.
+
+        Bound to one process and its pending calls, so a reader outliving a
+        restart can't touch the new process's requests.
+        """
+        try:
+            while True:
+                line = await process.stdout.readline()
+                if not line:
+                    if process is self._process:  # Not stopped or killed by us
+                        self._failed()
+                    break
+                if process is self._process:
+                    self._last_heard = monotonic()
+                try:
+                    message = json.loads(line.decode())
+                except ValueError:
+                    logger.warning(f"MCP subprocess wrote non-JSON: {line[:200]!r}")
+                    continue
+                _route(message, pending)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("MCP reader failed; dropping the subprocess")
+            if process is self._process:
+                self._failed()
+            if process.returncode is None:
+                process.kill()
+        finally:
+            for call in pending.values():
+                call.inbox.put_nowait(_EXITED)
+            pending.clear()
+            if process is self._process:
+                self._process = None
+
+    async def _ensure_process(self):
+        """Start the subprocess if it isn't running (once, for all callers)."""
+        async with self._start_lock:
             # Auto-restart if process died
-            if not self._process or self._process.returncode is not None:
+            if not self.running:
                 self._process = None
-                await self.start()
-
-            self._request_id += 1
-            request = {
-                "jsonrpc": "2.0",
-                "id": self._request_id,
-                "method": "tools/call",
-                "params": {"name": name, "arguments": arguments},
-            }
+                if self.retired:
+                    raise MCPUnavailable("MCP subprocess was replaced by the standby")
+                wait = self._retry_at - monotonic()
+                if wait > 0:
+                    raise MCPUnavailable(f"MCP subprocess restarting in {wait:.1f}s")
+                failures = self.failures
+                try:
+                    await self.start()
+                except Exception:
+                    await self._kill()
+                    if self.failures == failures:  # Not counted by the reader
+                        self._failed()
+                    raise
 
-            # Send request (restart on closed pipe)
-            request_bytes = (json.dumps(request) + "\n").encode()
+    async def _request(
+        self,
+        method: str,
+        params: dict,
+        timeout: Optional[float] = None,
+        on_progress: Optional[Callable[[dict], Awaitable[None]]] = None,
+    ) -> dict:
+        """Send a request and wait for its response message.
+
+        timeout (default TOOL_TIMEOUT) bounds the silence between messages
+        for this request, so with progress notifications it's not a limit on
+        the whole call.
+        """
+        timeout = TOOL_TIMEOUT if timeout is None else timeout
+        self._request_id += 1
+        request_id = self._request_id
+        request = {"jsonrpc": "2.0", "id": request_id, "method": method}
+        if on_progress is not None:
+            params = {**params, "_meta": {"progressToken": request_id}}
+        request["params"] = params
+
+        call = _PendingCall(on_progress)
+        self._pending[request_id] = call
+        try:
+            self._ensure_reader()
             try:
-                self._process.stdin.write(request_bytes)
-                await self._process.stdin.drain()
+                await self._send(request)
             except (RuntimeError, BrokenPipeError, ConnectionResetError):
                 # Pipe closed - restart and retry once
-                self._process = None
-                await self.start()
-                self._process.stdin.write(request_bytes)
-                await self._process.stdin.drain()
+                self._pending.pop(request_id, None)
+                if method == "initialize":
+                    raise
+                await self._kill()
+                await self._ensure_process()
+                self._pending[request_id] = call
+                self._ensure_reader()
+                await self._send(request)
+        except BaseException:
+            # Never sent, so there's nothing to cancel on the server
+            self._pending.pop(request_id, None)
+            raise
 
-            # Read response with timeout
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(call.inbox.get(), timeout)
+                except asyncio.TimeoutError:
+                    await self._timed_out(request_id, timeout)
+                    raise MCPToolTimeout(f"MCP {method} timed out after {timeout}s")
+                if message is _EXITED:
+                    raise MCPProcessExited(
+                        f"{self.label} exited during {method} (request {request_id})"
+                    )
+                if "method" not in message:
+                    return message
+                if call.on_progress is not None:
+                    await call.on_progress(message.get("params", {}))
+        except BaseException:
+            # Caller cancelled (client gone, shutdown) or on_progress raised
+            self._abandon(request_id)
+            raise
+
+    async def _timed_out(self, request_id: int, timeout: float):
+        """Give up on one request.
+
+        If the subprocess has sent nothing at all for the whole timeout it's
+        wedged (e.g. a pattern holding the GIL) and is killed — every call
+        in flight is stuck behind it anyway. Otherwise only this request is
+        dropped and the server is asked to cancel it; a late response for
+        it is ignored by the reader.
+        """
+        if self._pending.pop(request_id, None) is None:
+            return
+        if monotonic() - self._last_heard >= timeout:
+            await self._kill()
+            self._failed()
+            return
+        await self._cancel_remote(request_id, "timeout")
+
+    def _abandon(self, request_id: int):
+        """Drop a request nobody waits for and have the server cancel it.
+
+        Sync, as the caller may be unwinding a cancellation; the notification
+        goes out from a task of its own.
+        """
+        if self._pending.pop(request_id, None) is None:
+            return  # Answered, timed out or failed already
+        task = asyncio.ensure_future(self._cancel_remote(request_id, "abandoned"))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _cancel_remote(self, request_id: int, reason: str):
+        """Send notifications/cancelled; the server stops the tool between
+        chunks of work (see scrubbing/server.py)."""
+        if not self.running:
+            return
+        try:
+            await self._send(
+                {
+                    "jsonrpc": "2.0",
+                    "method": "notifications/cancelled",
+                    "params": {"requestId": request_id, "reason": reason},
+                }
+            )
+        except (RuntimeError, BrokenPipeError, ConnectionResetError):
+            pass
+
+    async def _kill(self):
+        """Kill the subprocess; its reader fails the calls still in flight."""
+        process = self._process
+        self._process = None
+        if process is not None and process.returncode is None:
+            process.kill()
+            await process.wait()
+
+    async def call_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any],
+        on_progress: Optional[Callable[[dict], Awaitable[None]]] = None,
+    ) -> Any:
+        """Call an MCP tool and return the result.
+
+        With on_progress, the call asks for progress notifications and awaits
+        on_progress(params) for each. TOOL_TIMEOUT then bounds the silence
+        between messages, not the whole call.
+
+        Raises:
+            MCPToolTimeout: No response (or progress) within TOOL_TIMEOUT
+            MCPProcessExited: The subprocess died with the call in flight
+        """
+        self.outstanding += 1
+        try:
+            await self._ensure_process()
+            response = await self._request(
+                "tools/call",
+                {"name": name, "arguments": arguments},
+                on_progress=on_progress,
+            )
+        except MCPToolTimeout:
+            raise MCPToolTimeout(
+                f"MCP tool '{name}' timed out after {TOOL_TIMEOUT}s"
+            ) from None
+        finally:
+            self.outstanding -= 1
+        self.failures = 0  # Answered — healthy again
+        self.served += 1
+        self._sample_rss()
+
+        if "error" in response:
+            raise RuntimeError(response["error"]["message"])
+
+        # MCP wraps tool results in content array
+        result = response.get("result", {})
+        content = result.get("content", [])
+        if result.get("isError"):
+            # Tool raised (e.g. unknown profile) — text is the error message
+            message = content[0].get("text", "") if content else ""
+            raise RuntimeError(f"MCP tool '{name}' failed: {message}")
+        if content and content[0].get("type") == "text":
+            # Parse the JSON text content
+            parsed = json.loads(content[0]["text"])
+            if isinstance(parsed, dict) and "result_ref" in parsed:
+                # Too big for the pipe — the server left it in a file
+                stored = await asyncio.to_thread(transfer.take, parsed["result_ref"])
+                parsed = json.loads(stored)
+            if isinstance(parsed, dict):
+                # Subprocess stderr is dropped, so surface slow patterns here
+                for overrun in parsed.get("budget_overruns", []):
+                    logger.warning(
+                        f"MCP tool '{name}': scrub pattern overran budget {overrun}"
+                    )
+            return parsed
+        return result
+
+
+def _scrub_arguments(
+    arguments: dict[str, Any],
+    item_types: Optional[list[str]],
+    profile: Optional[str],
+    token_mode: Optional[str] = None,
+) -> dict[str, Any]:
+    """Add optional scrub arguments — omitted keys use the tool defaults."""
+    if item_types is not None:
+        arguments["item_types"] = item_types
+    if profile is not None:
+        arguments["profile"] = profile
+    if token_mode is not None:
+        arguments["token_mode"] = token_mode
+    return arguments
+
+
+class RemoteMCPClient(MCPClient):
+    """MCP client for a scrub server running as a network service
+    (scrubbing/server.py --transport http), over MCP streamable HTTP.
+
+    Calls are multiplexed on one session as in MCPClient: each request is a
+    POST whose response streams back its progress notifications and result
+    (server-sent events), routed to the call's inbox by a task per request.
+    The httpx client keeps connections to the server open between calls.
+
+    Text always goes inline — an HTTP body has no line limit, and transfer
+    files are on this node's disk. File scrub paths still name files under
+    /data/scrub, which the servers must share with the backend.
+
+    After a failure the server is down until a health check (check(), run
+    by the pool) gets an answer, not merely until its backoff is over.
+    """
+
+    by_reference = False
+
+    def __init__(self, url: str, http: Optional[httpx.AsyncClient] = None):
+        super().__init__()
+        self.url = url
+        self.label = f"MCP server {url}"
+        self._http = http
+        self._own_http = http is None
+        self._session_id: Optional[str] = None
+        self._connected = False
+        # Response streams being read
+        self._streams: set[asyncio.Task] = set()
+        self.ping_ms: Optional[float] = None
+
+    async def start(self):
+        """Open a session: initialize handshake."""
+        if self._connected:
+            return
+        if self._http is None:
+            self._http = httpx.AsyncClient(
+                timeout=httpx.Timeout(CONNECT_TIMEOUT, read=None)  # Streams idle
+            )
+        await self._kill()  # What is left of a previous session
+        self._last_heard = monotonic()
+        self.starts += 1
+        await self._initialize()
+        self._connected = True
+
+    async def stop(self):
+        """Close the session and, if it's ours, the httpx client."""
+        session_id = self._session_id
+        await self._kill()
+        if self._http is None:
+            return
+        if session_id is not None:
             try:
-                response_line = await asyncio.wait_for(
-                    self._process.stdout.readline(),
-                    timeout=TOOL_TIMEOUT,
+                await self._http.delete(
+                    self.url, headers={"mcp-session-id": session_id}
                 )
-            except asyncio.TimeoutError:
-                # Kill subprocess to prevent late response corruption on next call
-                self._process.kill()
-                await self._process.wait()
-                self._process = None
-                raise RuntimeError(f"MCP tool '{name}' timed out after {TOOL_TIMEOUT}s")
+            except httpx.HTTPError:
+                pass
+        if self._own_http:
+            await self._http.aclose()
+            self._http = None
+
+    @property
+    def running(self) -> bool:
+        return self._connected
+
+    @property
+    def available(self) -> bool:
+        """Connected, or not known to be down."""
+        return not self.retired and (self._connected or self.failures == 0)
 
-            response = json.loads(response_line.decode())
+    def status(self) -> dict:
+        return {"endpoint": self.url, **super().status(), "ping_ms": self.ping_ms}
 
-            # Validate response ID matches request ID
-            if response.get("id") != self._request_id:
-                raise RuntimeError(
-                    f"Response ID mismatch: expected {self._request_id}, "
-                    f"got {response.get('id')}"
+    async def check(self) -> bool:
+        """Ping the server, opening a session first if need be.
+
+        Returns:
+            Whether it answered (False while waiting out a backoff)
+        """
+        if monotonic() < self._retry_at:
+            return False
+        try:
+            await self._ensure_process()
+            started = monotonic()
+            await self._request("ping", {})
+        except (RuntimeError, ConnectionError) as e:
+            logger.warning(f"{self.label} failed its health check: {e}")
+            self.ping_ms = None
+            return False
+        self.ping_ms = round((monotonic() - started) * 1000, 1)
+        self.failures = 0
+        return True
+
+    def _ensure_reader(self):
+        pass  # Each request's response is read by its own task
+
+    def _headers(self) -> dict:
+        headers = {"accept": "application/json, text/event-stream"}
+        if self._session_id is not None:
+            headers["mcp-session-id"] = self._session_id
+        return headers
+
+    async def _send(self, message: dict):
+        """POST one JSON-RPC message. A notification is sent once the server
+        accepts it; a request's response is read by a task of its own."""
+        if "id" not in message:
+            try:
+                response = await self._http.post(
+                    self.url, json=message, headers=self._headers()
                 )
+                response.raise_for_status()
+            except httpx.HTTPError as e:
+                raise ConnectionResetError(f"{self.label}: {e}") from e
+            return
+        task = asyncio.create_task(self._post(message, self._pending, self.starts))
+        self._streams.add(task)
+        task.add_done_callback(self._streams.discard)
 
-            if "error" in response:
-                raise RuntimeError(response["error"]["message"])
+    async def _post(
+        self, request: dict, pending: dict[int, _PendingCall], session: int
+    ):
+        """Send a request and route the messages of its response stream.
 
-            # MCP wraps tool results in content array
-            result = response.get("result", {})
-            content = result.get("content", [])
-            if content and content[0].get("type") == "text":
-                # Parse the JSON text content
-                return json.loads(content[0]["text"])
-            return result
+        Bound to one session (by start count) and its pending calls, as
+        MCPClient._read_loop is to one process.
+        """
+        try:
+            async with self._http.stream(
+                "POST", self.url, json=request, headers=self._headers()
+            ) as response:
+                response.raise_for_status()
+                if request["method"] == "initialize":
+                    self._session_id = response.headers.get("mcp-session-id")
+                async for message in _response_messages(response):
+                    if session == self.starts:
+                        self._last_heard = monotonic()
+                    _route(message, pending)
+        except asyncio.CancelledError:
+            raise
+        except (httpx.HTTPError, ValueError, RuntimeError) as e:
+            # Refused, dropped, or the session is unknown (404: the server
+            # restarted) — gone for every call on it
+            logger.warning(f"{self.label}: {request['method']} failed: {e}")
+            if session == self.starts and self._connected:
+                self._failed()
+                await self._kill()
+        finally:
+            # Stream over without the response
+            call = pending.pop(request["id"], None)
+            if call is not None:
+                call.inbox.put_nowait(_EXITED)
 
-    async def scrub_prompt(self, text: str, item_types: list[str]) -> dict:
-        """Convenience method for scrub_prompt tool."""
-        return await self.call_tool(
-            "scrub_prompt",
-            {
-                "text": text,
-                "item_types": item_types,
-            },
-        )
+    async def _kill(self):
+        """Drop the session; the calls still in flight fail."""
+        self._connected = False
+        self._session_id = None
+        current = asyncio.current_task()
+        for task in self._streams:
+            if task is not current:
+                task.cancel()
+        pending, self._pending = self._pending, {}
+        for call in pending.values():
+            call.inbox.put_nowait(_EXITED)
+        pending.clear()
 
-    async def scrub_log_as_prompt(self, text: str, item_types: list[str]) -> dict:
-        """Convenience method for scrub_log_as_prompt tool."""
-        return await self.call_tool(
-            "scrub_log_as_prompt",
-            {
-                "text": text,
-                "item_types": item_types,
-            },
-        )
 
-    async def scrub_log_as_file(
+async def _response_messages(response: httpx.Response) -> AsyncIterator[dict]:
+    """JSON-RPC messages of a streamable HTTP response: a JSON body, or
+    server-sent events carrying one message each."""
+    if response.headers.get("content-type", "").startswith("application/json"):
+        yield json.loads(await response.aread())
+        return
+    data: list[str] = []
+    async for line in response.aiter_lines():
+        if line.startswith("data:"):
+            data.append(line[5:].removeprefix(" "))
+        elif not line and data:
+            yield json.loads("\n".join(data))
+            data = []
+    if data:
+        yield json.loads("\n".join(data))
+
+
+class MCPPool(ScrubTools):
+    """MCP subprocesses behind one call_tool, in "prompt" and "file" sub-pools.
+
+    File scrubs are CPU-heavy and long; a sub-pool of their own keeps them
+    from adding latency to prompt scrubs. With file_size=0 they share the
+    prompt processes.
+
+    With standby, one extra process is kept started and initialized. A
+    process that died (crashed, or killed as wedged) is replaced by it on
+    the next call, instead of that call paying for interpreter start,
+    imports and the handshake; a new standby starts in the background.
+
+    A process past max_requests calls or max_rss_mb of RSS is recycled the
+    same way, before anything goes wrong: the standby (or a process started
+    for it) takes its place, and it's stopped once its calls in flight are
+    done.
+
+    With endpoints, the sub-pools are networked scrub servers instead
+    (RemoteMCPClient, one per URL; no standby). Each is pinged every
+    HEALTH_SECS, and calls go only to those that answer.
+    """
+
+    def __init__(
         self,
-        input_path: str,
-        output_path: str,
-        item_types: list[str],
-    ) -> dict:
-        """Convenience method for scrub_log_as_file tool."""
-        return await self.call_tool(
-            "scrub_log_as_file",
-            {
-                "input_path": input_path,
-                "output_path": output_path,
-                "item_types": item_types,
-            },
+        size: int = MCP_PROCESSES,
+        file_size: int = MCP_FILE_PROCESSES,
+        client_factory: Callable[[], MCPClient] = MCPClient,
+        standby: bool = MCP_STANDBY,
+        endpoints: Sequence[str] = MCP_ENDPOINTS,
+        file_endpoints: Sequence[str] = MCP_FILE_ENDPOINTS,
+        max_requests: int = MAX_REQUESTS,
+        max_rss_mb: float = MAX_RSS_MB,
+    ):
+        self.remote = bool(endpoints)
+        self.by_reference = not self.remote
+        self._client_factory = client_factory
+        if self.remote:
+            self._pools: dict[str, list[MCPClient]] = {
+                "prompt": [RemoteMCPClient(url) for url in endpoints]
+            }
+            if file_endpoints:
+                self._pools["file"] = [RemoteMCPClient(url) for url in file_endpoints]
+            standby = False
+            max_requests = max_rss_mb = 0  # Servers manage their own processes
+        else:
+            if size < 1:
+                raise ValueError("An MCP pool needs at least one prompt process")
+            self._pools = {"prompt": [client_factory() for _ in range(size)]}
+            if file_size > 0:
+                self._pools["file"] = [client_factory() for _ in range(file_size)]
+        self._health_task: Optional[asyncio.Task] = None
+        self._turn = 0
+        self.standby = standby
+        self._standby: Optional[MCPClient] = None
+        self._standby_task: Optional[asyncio.Task] = None
+        self.swaps = 0
+        self.max_requests = max_requests
+        self.max_rss = int(max_rss_mb * 2**20)
+        self.recycles = {"requests": 0, "rss": 0}
+        # Clients being recycled, and those replaced but still finishing calls
+        self._recycling: set[MCPClient] = set()
+        self._draining: set[MCPClient] = set()
+        # Recycles, and replaced clients being stopped
+        self._background: set[asyncio.Task] = set()
+
+    async def start(self):
+        """Start the prompt processes (file processes start on first use).
+
+        Also deletes transfer files left by a previous run's timed-out calls.
+        Networked servers are checked instead; one that is down doesn't fail
+        the start, it's routed around until it answers.
+        """
+        if self.remote:
+            await self._check_all()
+            self._health_task = asyncio.create_task(self._health_loop())
+            return
+        await asyncio.to_thread(transfer.sweep, TRANSFER_MAX_AGE)
+        await asyncio.gather(*(client.start() for client in self._pools["prompt"]))
+        self._refill_standby()
+
+    async def stop(self):
+        tasks = [self._standby_task, self._health_task, *self._background]
+        for task in tasks:
+            if task is not None:
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+        clients = [client for pool in self._pools.values() for client in pool]
+        clients += self._draining
+        self._draining = set()
+        if self._standby is not None:
+            clients.append(self._standby)
+            self._standby = None
+        await asyncio.gather(*(client.stop() for client in clients))
+
+    async def _check_all(self):
+        clients = [client for pool in self._pools.values() for client in pool]
+        await asyncio.gather(*(client.check() for client in clients))
+
+    async def _health_loop(self):
+        while True:
+            await asyncio.sleep(HEALTH_SECS)
+            try:
+                await self._check_all()
+            except Exception:
+                logger.exception("MCP health check failed")
+
+    def _refill_standby(self):
+        if not self.standby or self._standby is not None:
+            return
+        if self._standby_task is None or self._standby_task.done():
+            self._standby_task = asyncio.create_task(self._start_standby())
+
+    async def _start_standby(self):
+        self._standby = await self._start_client()
+
+    async def _start_client(self) -> MCPClient:
+        """Start a new process, retrying with backoff until one is up."""
+        delay = RESTART_BACKOFF
+        while True:
+            client = self._client_factory()
+            try:
+                await client.start()
+            except Exception as e:
+                await client.stop()
+                logger.warning(f"MCP process failed to start ({e}), retry in {delay}s")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, RESTART_BACKOFF_MAX)
+                continue
+            return client
+
+    def _spawn(self, coro: Awaitable):
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    def _replace_dead(self, pool: list[MCPClient]):
+        """Swap the standby in for a process of pool that died."""
+        for index, client in enumerate(pool):
+            if self._standby is None:
+                return
+            if client.starts and not client.running and not client.starting:
+                pool[index], self._standby = self._standby, None
+                client.retired = True
+                self.swaps += 1
+                logger.warning("MCP subprocess died; standby took its place")
+                self._spawn(client.stop())  # Its reader, if any
+                self._refill_standby()
+
+    def _worn(self, client: MCPClient) -> Optional[str]:
+        """Why client is due for recycling ("requests" or "rss"), if it is."""
+        if self.max_requests and client.served >= self.max_requests:
+            return "requests"
+        if self.max_rss and client.rss is not None and client.rss >= self.max_rss:
+            return "rss"
+        return None
+
+    def _recycle_worn(self, pool: list[MCPClient]):
+        for client in pool:
+            reason = self._worn(client)
+            if reason is not None and client not in self._recycling:
+                self._recycling.add(client)
+                self._spawn(self._recycle(pool, client, reason))
+
+    async def _recycle(self, pool: list[MCPClient], client: MCPClient, reason: str):
+        """Put a started process in client's place, then stop client once
+        its calls in flight are done (or after DRAIN_SECS)."""
+        try:
+            if self._standby is not None:
+                replacement, self._standby = self._standby, None
+                self._refill_standby()
+            else:
+                replacement = await self._start_client()
+            if client not in pool:  # Died and replaced meanwhile
+                if self.standby and self._standby is None:
+                    self._standby = replacement
+                else:
+                    await replacement.stop()
+                return
+            pool[pool.index(client)] = replacement
+            client.retired = True
+            self._draining.add(client)
+            self.recycles[reason] += 1
+            logger.info(
+                f"MCP subprocess recycled ({reason}): {client.served} calls, "
+                f"RSS {client.status()['rss_mb']} MB"
+            )
+            deadline = monotonic() + DRAIN_SECS
+            while client.outstanding and monotonic() < deadline:
+                await asyncio.sleep(0.05)
+            await client.stop()
+            self._draining.discard(client)
+        finally:
+            self._recycling.discard(client)
+
+    def _pool_for(self, name: str) -> list[MCPClient]:
+        if name in FILE_TOOLS and "file" in self._pools:
+            return self._pools["file"]
+        return self._pools["prompt"]
+
+    def _pick(self, pool: list[MCPClient]) -> MCPClient:
+        """Least calls in flight first; ties go round-robin.
+
+        Raises:
+            MCPUnavailable: Every process is waiting out a restart backoff
+                (or every server is down)
+        """
+        self._replace_dead(pool)
+        self._recycle_worn(pool)
+        candidates = [client for client in pool if client.available]
+        if not candidates:
+            state = "servers are down" if self.remote else "subprocesses are restarting"
+            raise MCPUnavailable(f"All {len(pool)} MCP {state}, try again shortly")
+        self._turn += 1
+        return min(
+            candidates,
+            key=lambda c: (c.outstanding, (pool.index(c) - self._turn) % len(pool)),
         )
 
+    async def call_tool(
+        self,
+        name: str,
+        arguments: dict[str, Any],
+        on_progress: Optional[Callable[[dict], Awaitable[None]]] = None,
+    ) -> Any:
+        """Call a tool on the least busy process of its sub-pool."""
+        client = self._pick(self._pool_for(name))
+        return await client.call_tool(name, arguments, on_progress)
+
+    def _file_client(self, previous: Optional[MCPClient]) -> MCPClient:
+        # A retry stays on its process while it's usable, else goes to
+        # another — either way it waits on the output's lock for the
+        # cancelled attempt to stop writing
+        pool = self._pool_for("scrub_log_as_file")
+        if previous is not None and previous in pool and previous.available:
+            return previous
+        return self._pick(pool)
+
+    def metrics(self) -> dict:
+        """Per sub-pool: size, running, outstanding, restarts, processes
+        (with calls served and RSS; endpoint and ping_ms when networked).
+        Also standby state, and recycling limits and counts."""
+        metrics = {"transport": "http" if self.remote else "stdio"}
+        for kind, pool in self._pools.items():
+            statuses = [client.status() for client in pool]
+            metrics[kind] = {
+                "size": len(pool),
+                "running": sum(status["running"] for status in statuses),
+                "outstanding": sum(status["outstanding"] for status in statuses),
+                "restarts": sum(status["restarts"] for status in statuses),
+                "processes": statuses,
+            }
+        if "file" not in metrics:
+            metrics["file"] = {"size": 0, "shared_with": "prompt"}
+        metrics["standby"] = {
+            "enabled": self.standby,
+            "ready": self._standby is not None,
+            "swaps": self.swaps,
+        }
+        metrics["recycle"] = {
+            "max_requests": self.max_requests or None,
+            "max_rss_mb": round(self.max_rss / 2**20) or None,
+            "recycles": dict(self.recycles),
+            "draining": len(self._draining),
+        }
+        return metrics
+
 
 # Singleton instance
-_client: Optional[MCPClient] = None
+_client: Optional[MCPPool] = None
 
 
-async def get_mcp_client() -> MCPClient:
-    """Get or create the singleton MCP client."""
+async def get_mcp_client() -> MCPPool:
+    """Get or create the singleton MCP pool."""
     global _client
     if _client is None:
-        _client = MCPClient()
+        _client = MCPPool()
         await _client.start()
     return _client
 
 
 async def shutdown_mcp_client():
-    """Shutdown the singleton MCP client."""
+    """Shutdown the singleton MCP pool."""
     global _client
     if _client is not None:
         await _client.stop()
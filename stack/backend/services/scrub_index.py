@@ -0,0 +1,213 @@
+"""Scrub job index and sandbox lifecycle — nothing under /data/scrub is kept forever.
+
+Each job record (scrub_job:{job_id}, written by ScrubJobQueue) names the
+job's files and their sizes. Alongside it Redis keeps:
+    scrub_jobs:lru      sorted set of job ids by last use (update or download)
+    scrub_jobs:active   set of job ids in ACTIVE_STATES, resumed on startup
+    scrub_jobs:bytes    total size of the files of indexed jobs
+    scrub_jobs:metrics  reaper counters (see storage_metrics)
+
+ScrubReaper deletes jobs unused for JOB_TTL, then the least recently used
+finished jobs until the total is under SCRUB_STORAGE_QUOTA_MB. Each step is
+a sorted-set or single-key operation — the directories are never listed, so
+the cost doesn't grow with the number of past jobs.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional
+
+from redis.asyncio import Redis
+
+from services import scrub_store
+from utils.paths import scrub_sandbox
+
+logger = logging.getLogger(__name__)
+
+# Jobs (record and files) unused this long are deleted
+JOB_TTL = int(os.getenv("SCRUB_JOB_TTL_SECS", "86400"))
+# Total size of job files before LRU eviction (0 = no quota)
+STORAGE_QUOTA = int(float(os.getenv("SCRUB_STORAGE_QUOTA_MB", "0")) * 1024 * 1024)
+# Seconds between reaper passes
+REAPER_SECS = float(os.getenv("SCRUB_REAPER_SECS", "60"))
+# Expired job ids fetched per sorted-set query
+REAP_BATCH = 100
+
+LRU_KEY = "scrub_jobs:lru"
+ACTIVE_KEY = "scrub_jobs:active"
+BYTES_KEY = "scrub_jobs:bytes"
+METRICS_KEY = "scrub_jobs:metrics"
+
+# Job states a download has to wait for (anything else is final)
+ACTIVE_STATES = {"queued", "detecting", "scrubbing"}
+# Record fields holding file sizes, counted in BYTES_KEY
+SIZE_FIELDS = ("input_bytes", "output_bytes")
+
+
+def job_key(job_id: str) -> str:
+    return f"scrub_job:{job_id}"
+
+
+async def touch(redis: Redis, job_id: str, now: Optional[float] = None):
+    """Mark a job used now — it moves to the back of the eviction order."""
+    await redis.zadd(LRU_KEY, {job_id: time.time() if now is None else now})
+
+
+async def storage_metrics(redis: Redis) -> dict:
+    """Indexed jobs and bytes, limits, and reaper counters.
+
+    Counters: evicted_ttl, evicted_quota, bytes_freed, last_reap_at (epoch
+    secs) and last_reap_ms; cache_hits and cache_misses (uploads finished
+    from the content store vs. detected/scrubbed, see scrub_store.py).
+    """
+    counters = await redis.hgetall(METRICS_KEY)
+    metrics = {
+        "jobs": await redis.zcard(LRU_KEY),
+        "bytes": int(await redis.get(BYTES_KEY) or 0),
+        "quota_bytes": STORAGE_QUOTA or None,
+        "ttl_secs": JOB_TTL,
+        "evicted_ttl": 0,
+        "evicted_quota": 0,
+        "bytes_freed": 0,
+        "cache_hits": 0,
+        "cache_misses": 0,
+        **{name: json.loads(value) for name, value in counters.items()},
+    }
+    lookups = metrics["cache_hits"] + metrics["cache_misses"]
+    metrics["cache_hit_rate"] = (
+        round(metrics["cache_hits"] / lookups, 3) if lookups else None
+    )
+    return metrics
+
+
+def _remove_files(record: dict) -> None:
+    """Delete a job's input, output, checkpoint and lock, whichever exist.
+
+    Outputs in the content store are released by the caller instead.
+    """
+    output = record.get("output_filename")
+    for name, subdir in (
+        (record.get("input_filename"), "in"),
+        (output, "out"),
+        (output and f"{output}.ckpt", "ckpt"),
+        (output and f"{output}.lock", "ckpt"),
+    ):
+        if not name:
+            continue
+        try:
+            scrub_sandbox.resolve(name, subdir).unlink(missing_ok=True)
+        except ValueError:
+            logger.warning(f"Skipping {subdir}/{name}: outside the sandbox")
+
+
+class ScrubReaper:
+    """Background task enforcing the TTL and the storage quota."""
+
+    def __init__(
+        self,
+        redis: Redis,
+        ttl: int = JOB_TTL,
+        quota: int = STORAGE_QUOTA,
+        interval: float = REAPER_SECS,
+    ):
+        self.redis = redis
+        self.ttl = ttl
+        self.quota = quota
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        self._task = asyncio.create_task(self._loop())
+        logger.info(
+            f"Scrub reaper started (TTL {self.ttl}s, quota "
+            f"{self.quota // (1024 * 1024) if self.quota else 'none'} MB)"
+        )
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _loop(self):
+        while True:
+            try:
+                await self.run_once()
+            except Exception:
+                logger.exception("Scrub reaper pass failed")
+            await asyncio.sleep(self.interval)
+
+    async def run_once(self, now: Optional[float] = None) -> int:
+        """One pass: TTL first, then the quota.
+
+        Returns:
+            Number of jobs deleted
+        """
+        now = time.time() if now is None else now
+        started = time.monotonic()
+        reaped = 0
+
+        # 1. TTL — any state: a job silent for a whole TTL is dead
+        while True:
+            expired = await self.redis.zrangebyscore(
+                LRU_KEY, "-inf", now - self.ttl, start=0, num=REAP_BATCH
+            )
+            for job_id in expired:
+                reaped += await self.reap(job_id, "ttl")
+            if len(expired) < REAP_BATCH:
+                break
+
+        # 2. Quota — least recently used first, running jobs are kept
+        skipped = 0
+        while self.quota and await self._total() > self.quota:
+            oldest = await self.redis.zrange(LRU_KEY, skipped, skipped)
+            if not oldest:
+                break
+            record = await self._record(oldest[0])
+            if record is not None and record.get("status") in ACTIVE_STATES:
+                skipped += 1
+                continue
+            reaped += await self.reap(oldest[0], "quota")
+
+        await self.redis.hset(
+            METRICS_KEY,
+            mapping={
+                "last_reap_at": now,
+                "last_reap_ms": round((time.monotonic() - started) * 1000, 1),
+            },
+        )
+        if reaped:
+            logger.info(f"Scrub reaper deleted {reaped} jobs")
+        return reaped
+
+    async def reap(self, job_id: str, reason: str) -> bool:
+        """Delete a job's files and record; reason is "ttl" or "quota".
+
+        Returns:
+            False if another reaper got to it first
+        """
+        if not await self.redis.zrem(LRU_KEY, job_id):
+            return False
+        record = await self._record(job_id) or {}
+        await asyncio.to_thread(_remove_files, record)
+        freed = sum(int(record.get(field) or 0) for field in SIZE_FIELDS)
+        if record.get("output_blob"):  # Shared output: gone with its last job
+            freed += await scrub_store.release(self.redis, record["output_blob"])
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(job_key(job_id))
+            pipe.srem(ACTIVE_KEY, job_id)
+            pipe.decrby(BYTES_KEY, freed)
+            pipe.hincrby(METRICS_KEY, f"evicted_{reason}", 1)
+            pipe.hincrby(METRICS_KEY, "bytes_freed", freed)
+            await pipe.execute()
+        return True
+
+    async def _record(self, job_id: str) -> Optional[dict]:
+        stored = await self.redis.get(job_key(job_id))
+        return json.loads(stored) if stored else None
+
+    async def _total(self) -> int:
+        return int(await self.redis.get(BYTES_KEY) or 0)
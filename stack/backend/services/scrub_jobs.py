@@ -0,0 +1,482 @@
+"""Background scrub jobs — file uploads are scrubbed off the request path.
+
+The upload route validates and saves the file, enqueues a ScrubJob and
+returns. Job workers run detection and scrub_log_as_file, each on its own
+MCP subprocess so a long file never holds the prompt path's pipe. Job state
+is kept in Redis under scrub_job:{job_id} (see get_job_status) and progress
+is published on prompt_intercept as "file_progress" events. Job files are
+indexed for deletion by TTL and quota (see scrub_index.py); content seen
+before is finished from the content store (see scrub_store.py). Jobs a
+stop or crash left unfinished are queued again on the next start.
+"""
+
+import asyncio
+import io
+import json
+import logging
+import os
+import time
+from typing import Any, Optional
+
+from pydantic import BaseModel, ConfigDict
+from redis.asyncio import Redis
+
+from services import scrub_store
+from services.mcp_client import ScrubTools, get_mcp_client
+from services.scrub_index import (
+    ACTIVE_KEY,
+    ACTIVE_STATES,
+    BYTES_KEY,
+    METRICS_KEY,
+    SIZE_FIELDS,
+    job_key,
+    touch,
+)
+from utils.compression import available_codecs, file_codec, open_reader
+from utils.paths import scrub_sandbox
+
+logger = logging.getLogger(__name__)
+
+# Concurrent jobs — each has its own MCP subprocess (and scrub process pool)
+JOB_WORKERS = int(os.getenv("SCRUB_JOB_WORKERS", "2"))
+# Uploads past this many waiting jobs are rejected with 503
+JOB_QUEUE_MAX = int(os.getenv("SCRUB_JOB_QUEUE_MAX", "100"))
+# "counter" ([IP_1]…) or "hash" (keyed digest, stable across workers/jobs)
+FILE_TOKEN_MODE = os.getenv("SCRUB_FILE_TOKEN_MODE", "counter")
+# Scrubbed output: "auto" (compressed like the upload), "none", "gzip", "zstd"
+FILE_OUTPUT_COMPRESSION = os.getenv("SCRUB_OUTPUT_COMPRESSION", "auto")
+# Characters from the start of the file shown to the Neuralizer detector
+DETECT_SAMPLE_CHARS = 4096
+
+
+class ScrubJob(BaseModel):
+    """One uploaded file waiting to be scrubbed."""
+
+    job_id: str
+    filename: str  # Sanitized upload name, for panel events
+    input_filename: str  # Under /data/scrub/in
+    output_filename: str  # Under /data/scrub/out
+    output_codec: Optional[str] = None  # Compression of the output, if any
+    content_hash: Optional[str] = None  # SHA-256 of the (decompressed) upload
+
+    model_config = ConfigDict(frozen=True)
+
+
+async def publish_file_event(
+    redis,
+    filename: str,
+    status: str,
+    event_type: str = "file_event",
+    content: str = "",
+    **extra,
+):
+    """Publish file event to panel.
+
+    Required fields: {prompt, sanitized, status}
+    Extra metadata included for future use.
+    """
+    payload = {
+        # Required by frontend
+        "prompt": f"[File Upload: {filename}]",
+        "sanitized": content,
+        "status": status,
+        # Extra metadata
+        "type": event_type,
+        "filename": filename,
+        **extra,
+    }
+    await redis.publish("prompt_intercept", json.dumps(payload))
+
+
+async def get_job_status(redis: Redis, job_id: str) -> Optional[dict]:
+    """Stored job state, or None if unknown (or deleted by the reaper)."""
+    state = await redis.get(job_key(job_id))
+    return json.loads(state) if state else None
+
+
+def _profile_for(category: str) -> str:
+    """Log files: "all" (log + standard, catches emails/API keys in logs)."""
+    return "all" if category == "log_file" else "standard"
+
+
+def output_codec_for(input_codec: Optional[str]) -> Optional[str]:
+    """Output compression for an upload compressed with input_codec (or not)."""
+    if FILE_OUTPUT_COMPRESSION == "auto":
+        return input_codec
+    if FILE_OUTPUT_COMPRESSION in available_codecs():
+        return FILE_OUTPUT_COMPRESSION
+    return None
+
+
+def _read_sample(path) -> str:
+    """First DETECT_SAMPLE_CHARS of the file as text, decompressed if need be."""
+    codec = file_codec(path)
+    with open(path, "rb") as raw:
+        reader = open_reader(raw, codec) if codec else raw
+        with io.TextIOWrapper(reader, encoding="utf-8", errors="replace") as text:
+            return text.read(DETECT_SAMPLE_CHARS)
+
+
+class ScrubJobQueue:
+    """In-process job queue drained by JOB_WORKERS worker tasks.
+
+    Workers scrub through client — by default the MCPPool from
+    get_mcp_client, whose file sub-pool (SCRUB_MCP_FILE_PROCESSES) is
+    sized to keep up with them. The queue doesn't stop the client.
+    """
+
+    def __init__(
+        self,
+        redis: Redis,
+        neuralizer,
+        workers: int = JOB_WORKERS,
+        client: Optional[ScrubTools] = None,
+    ):
+        self.redis = redis
+        self.neuralizer = neuralizer
+        self.workers = workers
+        self.client = client
+        self._queue: asyncio.Queue[ScrubJob] = asyncio.Queue(JOB_QUEUE_MAX)
+        self._tasks: list[asyncio.Task] = []
+
+    async def start(self):
+        """Start the worker tasks, after queueing unfinished jobs again."""
+        await self._resume()
+        for _ in range(self.workers):
+            self._tasks.append(asyncio.create_task(self._worker()))
+        logger.info(f"Scrub job queue started ({self.workers} workers)")
+
+    async def stop(self):
+        """Cancel workers (their running MCP calls are cancelled with them).
+
+        Running and waiting jobs stay active, for the next start() to resume.
+        """
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def submit(self, job: ScrubJob) -> dict:
+        """Queue a job and record it as "queued".
+
+        An upload whose content was seen before (same content_hash) is
+        finished here instead — "clean" from the stored detection, or "done"
+        with the stored output — and never queued.
+
+        Raises:
+            asyncio.QueueFull: If JOB_QUEUE_MAX jobs are already waiting
+        """
+        if self._queue.full():
+            raise asyncio.QueueFull
+        in_path = scrub_sandbox.resolve(job.input_filename, "in")
+        input_bytes = (await asyncio.to_thread(in_path.stat)).st_size
+
+        detection = None
+        if job.content_hash is not None:
+            detection = await scrub_store.get_detection(self.redis, job.content_hash)
+        if detection is not None:
+            await self._save(job, status="detecting", input_bytes=input_bytes)
+            if await self._finish_cached(job, in_path, detection):
+                return await get_job_status(self.redis, job.job_id)
+
+        # Saved before a worker can see the job — _save isn't atomic
+        record = await self._save(
+            job,
+            status="queued",
+            queued_at=time.time(),
+            queue_position=self._queue.qsize() + 1,
+            input_bytes=input_bytes,
+        )
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:  # Filled by a concurrent submit meanwhile
+            await self._save(job, status="error", error="Queue full", input_bytes=0)
+            raise
+        return record
+
+    async def _resume(self):
+        """Submit again the jobs a previous run left queued or running.
+
+        A scrub resubmitted this way continues from its checkpoint.
+        """
+        records = []
+        for job_id in await self.redis.smembers(ACTIVE_KEY):
+            record = await get_job_status(self.redis, job_id)
+            if record is None or record.get("status") not in ACTIVE_STATES:
+                await self.redis.srem(ACTIVE_KEY, job_id)
+                continue
+            records.append(record)
+
+        records.sort(key=lambda record: record.get("queued_at", 0))
+        for record in records:
+            job = ScrubJob.model_validate(record)
+            try:
+                await self.submit(job)
+            except asyncio.QueueFull:
+                await self._fail(job, "Queue full", input_bytes=0)
+            except FileNotFoundError:
+                await self._fail(job, "Upload lost before it was scrubbed")
+        if records:
+            logger.info(f"Resumed {len(records)} unfinished scrub jobs")
+
+    async def join(self):
+        """Wait until every queued job has finished."""
+        await self._queue.join()
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            except asyncio.CancelledError:
+                raise  # Left active — resumed by the next start()
+            except Exception as e:
+                logger.exception(f"Scrub job {job.job_id} failed")
+                await self._fail(job, f"Unexpected error: {e!s}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: ScrubJob):
+        """Detect, then scrub — the part of an upload that used to block it."""
+        in_path = scrub_sandbox.resolve(job.input_filename, "in")
+
+        # 1. Neuralizer detection (peek at sample to determine category)
+        await self._save(job, status="detecting")
+        detection = None
+        if job.content_hash is not None:
+            # Stored by a job for the same content that ran while this one waited
+            detection = await scrub_store.get_detection(self.redis, job.content_hash)
+        if detection is not None and await self._finish_cached(job, in_path, detection):
+            return
+        if detection is None:
+            sample = await asyncio.to_thread(_read_sample, in_path)
+            detection = await self.neuralizer.detect(sample)
+        category = detection.get("category", "")
+
+        # Fail-closed: detection errors block the upload
+        if category == "error":
+            await asyncio.to_thread(in_path.unlink, missing_ok=True)
+            error_msg = detection.get("summary", "Detection failed")
+            await self._fail(
+                job,
+                f"Detection failed: {error_msg}. Upload blocked for safety.",
+                input_bytes=0,
+            )
+            return
+        if job.content_hash is not None:
+            await scrub_store.save_detection(
+                self.redis,
+                job.content_hash,
+                {
+                    "category": category,
+                    "needs_sanitization": detection.get("needs_sanitization", False),
+                },
+            )
+
+        await self._count_cache(hit=False)
+        if not detection.get("needs_sanitization", False):
+            await self._finish_clean(job, in_path, category)
+            return
+
+        # 2. Scrub file via MCP
+        await self._save(job, status="scrubbing", category=category)
+        client = self.client or await get_mcp_client()
+        summary = await client.scrub_log_as_file(
+            job.input_filename,
+            job.output_filename,
+            profile=_profile_for(category),
+            token_mode=FILE_TOKEN_MODE,
+            on_progress=self._progress_handler(job, category),
+            output_codec=job.output_codec or "none",
+        )
+
+        # The input is done with once the output is complete
+        out_path = scrub_sandbox.resolve(job.output_filename, "out")
+        output_bytes = (await asyncio.to_thread(out_path.stat)).st_size
+        await asyncio.to_thread(in_path.unlink, missing_ok=True)
+
+        # Into the content store, for the next upload of the same content
+        key = self._cache_key(job, category)
+        if key is None:
+            await self._finish_scrubbed(
+                job, category, summary, output_bytes=output_bytes
+            )
+            return
+        _, added = await scrub_store.adopt(
+            self.redis,
+            key,
+            out_path,
+            {
+                "bytes": output_bytes,
+                "category": category,
+                "lines_processed": summary.get("lines_processed", 0),
+                "items_scrubbed": summary.get("items_scrubbed", 0),
+                "summary": summary.get("summary", {}),
+            },
+        )
+        if added:
+            await self.redis.incrby(BYTES_KEY, added)
+        await self._finish_scrubbed(job, category, summary, output_blob=key)
+
+    async def _finish_cached(self, job: ScrubJob, in_path, detection: dict) -> bool:
+        """Finish a job from a stored detection (and output, if it needs one).
+
+        Returns:
+            False if the output isn't stored — the job still has to scrub
+        """
+        category = detection.get("category", "")
+        if not detection.get("needs_sanitization", False):
+            await self._count_cache(hit=True)
+            await self._finish_clean(job, in_path, category)
+            return True
+
+        key = self._cache_key(job, category)
+        meta = await scrub_store.acquire(self.redis, key) if key else None
+        if meta is None:
+            return False
+        await self._count_cache(hit=True)
+        await asyncio.to_thread(in_path.unlink, missing_ok=True)
+        summary = {
+            "lines_processed": meta["lines_processed"],
+            "items_scrubbed": meta["items_scrubbed"],
+            "summary": meta["summary"],
+            "cached": True,
+        }
+        await self._finish_scrubbed(job, category, summary, output_blob=key)
+        return True
+
+    async def _finish_clean(self, job: ScrubJob, in_path, category: str):
+        await asyncio.to_thread(in_path.unlink, missing_ok=True)
+        await publish_file_event(
+            self.redis, job.filename, "🛡️ Clean — no sensitive content detected"
+        )
+        await self._save(job, status="clean", category=category, input_bytes=0)
+
+    async def _finish_scrubbed(
+        self, job: ScrubJob, category: str, summary: dict, **state: Any
+    ):
+        """Publish the result to the panel and mark the job done."""
+        items_scrubbed = summary.get("items_scrubbed", 0)
+        lines_processed = summary.get("lines_processed", 0)
+        type_summary = summary.get("summary", {})
+        breakdown = (
+            ", ".join(f"{k}: {v}" for k, v in type_summary.items())
+            if type_summary
+            else ""
+        )
+        download_url = f"/api/v1/files/download/{job.job_id}"
+        status_msg = f"🛡️ {category.replace('_', ' ').title()} — {items_scrubbed} items scrubbed in {lines_processed} lines"
+        if breakdown:
+            status_msg += f" ({breakdown})"
+        status_msg += f"\nDownload: {download_url}"
+        await publish_file_event(
+            self.redis,
+            job.filename,
+            status_msg,
+            event_type="file_scrubbed",
+            job_id=job.job_id,
+            category=category,
+            summary=summary,
+            download_url=download_url,
+        )
+        await self._save(
+            job,
+            status="done",
+            category=category,
+            lines_processed=lines_processed,
+            items_scrubbed=items_scrubbed,
+            summary=type_summary,
+            download_url=download_url,
+            cached=summary.get("cached", False),
+            input_bytes=0,
+            **state,
+        )
+
+    def _cache_key(self, job: ScrubJob, category: str) -> Optional[str]:
+        if job.content_hash is None:
+            return None
+        return scrub_store.cache_key(
+            job.content_hash, _profile_for(category), FILE_TOKEN_MODE, job.output_codec
+        )
+
+    async def _count_cache(self, hit: bool):
+        await self.redis.hincrby(
+            METRICS_KEY, "cache_hits" if hit else "cache_misses", 1
+        )
+
+    def _progress_handler(self, job: ScrubJob, category: str):
+        """on_progress for one scrub — turns byte counts into rate and ETA."""
+        started = time.monotonic()
+
+        async def on_progress(params: dict):
+            bytes_done = int(params.get("progress", 0))
+            bytes_total = int(params.get("total") or 0)
+            lines = json.loads(params.get("message") or "{}").get("lines_processed", 0)
+            elapsed = max(time.monotonic() - started, 1e-6)
+            byte_rate = bytes_done / elapsed
+            eta = (bytes_total - bytes_done) / byte_rate if byte_rate else None
+            progress = {
+                "lines_processed": lines,
+                "bytes_done": bytes_done,
+                "bytes_total": bytes_total,
+                "percent": (
+                    round(100 * bytes_done / bytes_total, 1) if bytes_total else None
+                ),
+                "lines_per_sec": round(lines / elapsed),
+                "eta_secs": round(eta, 1) if eta is not None else None,
+            }
+            await self._save(job, status="scrubbing", category=category, **progress)
+
+            status_msg = (
+                f"⏳ Scrubbing — {lines:,} lines "
+                f"({progress['lines_per_sec']:,} lines/s"
+            )
+            if progress["eta_secs"] is not None:
+                status_msg += f", ETA {progress['eta_secs']:.0f}s"
+            status_msg += ")"
+            await publish_file_event(
+                self.redis,
+                job.filename,
+                status_msg,
+                event_type="file_progress",
+                job_id=job.job_id,
+                **progress,
+            )
+
+        return on_progress
+
+    async def _fail(self, job: ScrubJob, error: str, **state: Any):
+        await publish_file_event(self.redis, job.filename, f"Error: {error}")
+        await self._save(job, status="error", error=error, **state)
+
+    async def _save(self, job: ScrubJob, **state: Any) -> dict:
+        """Merge state into the stored job record and mark the job used.
+
+        input_bytes/output_bytes changes are added to the indexed total.
+        """
+        key = job_key(job.job_id)
+        stored = await self.redis.get(key)
+        record = (
+            json.loads(stored)
+            if stored
+            # Files indexed for downloads and the reaper — no directory
+            # scans — and the whole job, for resuming it after a restart
+            else job.model_dump()
+        )
+        delta = sum(
+            state[field] - record.get(field, 0)
+            for field in SIZE_FIELDS
+            if field in state
+        )
+        record.update(state, updated_at=time.time())
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(key, json.dumps(record))
+            if record["status"] in ACTIVE_STATES:
+                pipe.sadd(ACTIVE_KEY, job.job_id)
+            else:
+                pipe.srem(ACTIVE_KEY, job.job_id)
+            if delta:
+                pipe.incrby(BYTES_KEY, delta)
+            await pipe.execute()
+        await touch(self.redis, job.job_id, record["updated_at"])
+        return record
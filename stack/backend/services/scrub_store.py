@@ -0,0 +1,198 @@
+"""Content-addressed store for scrubbed outputs — identical uploads are scrubbed once.
+
+Uploads are hashed (SHA-256 of the decompressed content) as they stream in.
+A scrubbed output is kept once under /data/scrub/cas, named by its cache
+key: content hash + profile patterns + token mode (and key) + output codec.
+Jobs reference the blob instead of owning a file under out/.
+
+Redis keys:
+    scrub_detect:{content_hash}  detection result, so repeats skip the LLM
+    scrub_blob:{cache_key}       blob hash: bytes, category, counts, summary
+                                 and refs (number of job records using it)
+    scrub_blob_lock:{cache_key}  held while the blob's file and its refs
+                                 change together (adopt, release)
+
+Blobs are deleted when their last job is reaped (see scrub_index.py).
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import uuid
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Optional
+
+from redis.asyncio import Redis
+from redis.exceptions import WatchError
+
+from scrubbing.scrubbers.profiles import get_profile
+from utils.paths import scrub_sandbox
+
+# Detection results are kept as long as jobs are
+DETECT_TTL = int(os.getenv("SCRUB_JOB_TTL_SECS", "86400"))
+# A blob lock left by a crashed holder expires after this
+LOCK_TTL_MS = 30_000
+
+
+def _detect_key(content_hash: str) -> str:
+    return f"scrub_detect:{content_hash}"
+
+
+def _blob_key(cache_key: str) -> str:
+    return f"scrub_blob:{cache_key}"
+
+
+def _lock_key(cache_key: str) -> str:
+    return f"scrub_blob_lock:{cache_key}"
+
+
+@asynccontextmanager
+async def _blob_lock(redis: Redis, cache_key: str):
+    """Hold a blob's lock — adopt and the last release both change the file
+    and the refs, and mustn't interleave (the release would unlink the file
+    just adopted)."""
+    key, token = _lock_key(cache_key), uuid.uuid4().hex
+    while not await redis.set(key, token, nx=True, px=LOCK_TTL_MS):
+        await asyncio.sleep(0.01)
+    try:
+        yield
+    finally:
+        # Only our own lock — it may have expired and been taken since
+        async with redis.pipeline(transaction=True) as pipe:
+            try:
+                await pipe.watch(key)
+                if await pipe.get(key) == token:
+                    pipe.multi()
+                    pipe.delete(key)
+                    await pipe.execute()
+            except WatchError:
+                pass
+
+
+def blob_path(cache_key: str) -> Path:
+    """Where a blob lives: cas/<first two hex chars>/<cache key>."""
+    return scrub_sandbox.resolve(f"{cache_key[:2]}/{cache_key}", "cas")
+
+
+def cache_key(
+    content_hash: str, profile: str, token_mode: str, output_codec: Optional[str]
+) -> Optional[str]:
+    """Key of the scrubbed output for this content and these settings.
+
+    None when the output can't be reused: hash tokens under a random
+    per-process key (no SCRUB_TOKEN_KEY) differ on every run.
+    """
+    parts = [content_hash, profile, get_profile(profile).fingerprint, token_mode]
+    if token_mode == "hash":
+        token_key = os.getenv("SCRUB_TOKEN_KEY", "")
+        if not token_key:
+            return None
+        parts.append(hashlib.blake2b(token_key.encode(), digest_size=8).hexdigest())
+    parts.append(output_codec or "none")
+    return hashlib.sha256(":".join(parts).encode()).hexdigest()
+
+
+async def get_detection(redis: Redis, content_hash: str) -> Optional[dict]:
+    stored = await redis.get(_detect_key(content_hash))
+    return json.loads(stored) if stored else None
+
+
+async def save_detection(redis: Redis, content_hash: str, detection: dict):
+    """Remember a detection (not errors — those are retried)."""
+    await redis.set(_detect_key(content_hash), json.dumps(detection), ex=DETECT_TTL)
+
+
+async def acquire(redis: Redis, cache_key: str) -> Optional[dict]:
+    """Take a reference to a stored output.
+
+    Returns:
+        The blob's metadata (bytes, category, lines_processed,
+        items_scrubbed, summary), or None if it isn't stored
+    """
+    key = _blob_key(cache_key)
+    async with redis.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                await pipe.watch(key)
+                meta = await pipe.hgetall(key)
+                if not meta:
+                    return None
+                pipe.multi()
+                pipe.hincrby(key, "refs", 1)
+                await pipe.execute()
+                return _meta(meta)
+            except WatchError:
+                continue
+
+
+async def adopt(
+    redis: Redis, cache_key: str, output: Path, result: dict
+) -> tuple[dict, int]:
+    """Move a finished output into the store and take a reference to it.
+
+    Outputs with the same key are byte-identical, so when concurrent jobs
+    finish the same content the blob already stored is kept and the new
+    output dropped — replacing it would change the mtime the download
+    ETag is built from.
+
+    Args:
+        result: bytes, category, lines_processed, items_scrubbed, summary
+
+    Returns:
+        (blob metadata, bytes added to the store — 0 if it was already there)
+    """
+    path = blob_path(cache_key)
+    key = _blob_key(cache_key)
+    fields = {**result, "summary": json.dumps(result.get("summary", {}))}
+    async with _blob_lock(redis, cache_key):
+        if await asyncio.to_thread(path.exists):
+            await asyncio.to_thread(output.unlink, missing_ok=True)
+        else:
+            await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+            await asyncio.to_thread(output.replace, path)
+        async with redis.pipeline(transaction=True) as pipe:
+            pipe.hset(key, mapping=fields)
+            pipe.hincrby(key, "refs", 1)
+            _, refs = await pipe.execute()
+    return _meta(fields), int(result["bytes"]) if refs == 1 else 0
+
+
+async def release(redis: Redis, cache_key: str) -> int:
+    """Drop a reference; the last one deletes the blob.
+
+    Returns:
+        Bytes freed (the blob's size if it was deleted, else 0)
+    """
+    key = _blob_key(cache_key)
+    # WATCH for acquire, which takes references without the lock
+    async with _blob_lock(redis, cache_key), redis.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                await pipe.watch(key)
+                refs = int(await pipe.hget(key, "refs") or 0)
+                size = int(await pipe.hget(key, "bytes") or 0)
+                pipe.multi()
+                if refs > 1:
+                    pipe.hincrby(key, "refs", -1)
+                else:
+                    pipe.delete(key)
+                await pipe.execute()
+                break
+            except WatchError:
+                continue
+        if refs > 1:
+            return 0
+        await asyncio.to_thread(blob_path(cache_key).unlink, missing_ok=True)
+    return size
+
+
+def _meta(fields: dict) -> dict:
+    return {
+        "bytes": int(fields.get("bytes", 0)),
+        "category": fields.get("category", ""),
+        "lines_processed": int(fields.get("lines_processed", 0)),
+        "items_scrubbed": int(fields.get("items_scrubbed", 0)),
+        "summary": json.loads(fields.get("summary") or "{}"),
+    }
@@ -0,0 +1,122 @@
+"""gzip/zstd helpers — incremental inflate and flushable compressed output."""
+
+import gzip
+import io
+import os
+import zlib
+
+import pytest
+
+from utils.compression import (
+    CompressedWriter,
+    Inflater,
+    available_codecs,
+    iter_decompressed,
+    sniff_codec,
+    strip_suffix,
+)
+
+CODECS = [
+    "gzip",
+    pytest.param(
+        "zstd",
+        marks=pytest.mark.skipif(
+            "zstd" not in available_codecs(), reason="zstandard not installed"
+        ),
+    ),
+]
+
+DATA = os.urandom(20_000).hex().encode() + b"a" * 3_000_000
+
+
+class Buffer(io.BytesIO):
+    """BytesIO that stays readable after the writer closes it."""
+
+    def close(self):
+        pass
+
+
+def compress(data: bytes, codec: str, flush_every: int = 0) -> bytes:
+    raw = Buffer()
+    with CompressedWriter(raw, codec) as writer:
+        step = flush_every or len(data)
+        for start in range(0, len(data), step):
+            writer.write(data[start : start + step])
+            writer.flush()
+    return raw.getvalue()
+
+
+class TestInflater:
+    @pytest.mark.parametrize("codec", CODECS)
+    def test_round_trip_bounded(self, codec):
+        """Chunked input decompresses exactly, in pieces of bounded size.
+
+        Concatenated members/frames are followed.
+        """
+        half = len(DATA) // 2
+        packed = compress(DATA[:half], codec) + compress(DATA[half:], codec)
+        assert sniff_codec(packed) == codec
+        inflater = Inflater(codec, max_piece=64 * 1024)
+        pieces = [
+            piece
+            for start in range(0, len(packed), 333)
+            for piece in inflater.feed(packed[start : start + 333])
+        ]
+        inflater.finish()
+        assert b"".join(pieces) == DATA
+        assert max(map(len, pieces)) <= 2 * 1024 * 1024
+
+    @pytest.mark.parametrize("codec", CODECS)
+    def test_truncated(self, codec):
+        """finish() rejects a stream that stops mid-member."""
+        inflater = Inflater(codec)
+        list(inflater.feed(compress(DATA, codec)[:-10]))
+        with pytest.raises(ValueError, match="Truncated"):
+            inflater.finish()
+
+    def test_corrupt(self):
+        with pytest.raises(ValueError, match="Corrupt gzip"):
+            list(Inflater("gzip").feed(b"\x1f\x8b" + b"\x00" * 100))
+
+
+class TestCompressedWriter:
+    @pytest.mark.parametrize("codec", CODECS)
+    def test_resume_at_flush(self, codec):
+        """Output cut back to a flush point continues as one stream."""
+        raw = Buffer()
+        writer = CompressedWriter(raw, codec)
+        writer.write(b"first\n")
+        writer.flush()
+        cut, state = writer.tell(), writer.state
+        writer.write(b"lost\n")
+
+        raw.truncate(cut)
+        raw.seek(cut)
+        with CompressedWriter(raw, codec, resume=state) as writer:
+            writer.write(b"second\n")
+        raw.seek(0)
+        assert b"".join(iter_decompressed(raw, codec, 4)) == b"first\nsecond\n"
+
+    @pytest.mark.parametrize("codec", CODECS)
+    def test_empty_is_valid(self, codec):
+        """Closing with nothing written still leaves a decodable stream."""
+        raw = Buffer()
+        CompressedWriter(raw, codec).close()
+        assert sniff_codec(raw.getvalue()) == codec
+        raw.seek(0)
+        assert b"".join(iter_decompressed(raw, codec, 4)) == b""
+
+    def test_gzip_single_member(self):
+        """Flushes don't end the gzip member — one decompressor reads it all."""
+        inflate = zlib.decompressobj(wbits=31)
+        assert inflate.decompress(compress(DATA, "gzip", 100_000)) == DATA
+        assert inflate.eof and not inflate.unused_data
+
+    def test_gzip_readable_by_stdlib(self):
+        assert gzip.decompress(compress(DATA, "gzip", 1_000_000)) == DATA
+
+
+def test_strip_suffix():
+    assert strip_suffix("app.log.gz", "gzip") == "app.log"
+    assert strip_suffix("app.log", "gzip") == "app.log"
+    assert strip_suffix("app.log.gz", None) == "app.log.gz"
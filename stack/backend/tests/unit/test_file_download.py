@@ -0,0 +1,152 @@
+"""Scrubbed-file downloads — job index lookup, ranges, validators, encoding."""
+
+import gzip
+import json
+
+import pytest
+
+from routes import files
+from utils.paths import PathSandbox
+
+LOG = b"2024-01-01 10.0.0.1 GET /health 200\n"
+
+
+@pytest.fixture
+def scrubbed(tmp_path, monkeypatch, redis_client):
+    """Store out/<job>_<name> with a done job record pointing at it."""
+    from services import scrub_store
+
+    monkeypatch.setattr(files, "scrub_sandbox", PathSandbox(tmp_path))
+    monkeypatch.setattr(scrub_store, "scrub_sandbox", PathSandbox(tmp_path))
+    (tmp_path / "out").mkdir()
+
+    async def store(job_id: str, name: str, content: bytes):
+        (tmp_path / "out" / f"{job_id}_{name}").write_bytes(content)
+        record = {
+            "job_id": job_id,
+            "status": "done",
+            "output_filename": f"{job_id}_{name}",
+        }
+        await redis_client.set(f"scrub_job:{job_id}", json.dumps(record))
+
+    return store
+
+
+class TestDownload:
+    @pytest.mark.asyncio
+    async def test_served_from_job_record(self, app, scrubbed):
+        """The job record locates the file; the name drops the job prefix."""
+        await scrubbed("j1", "app.log", LOG * 100)
+        response = await app.get("/api/v1/files/download/j1")
+        assert response.status_code == 200
+        assert response.content == LOG * 100
+        assert response.headers["accept-ranges"] == "bytes"
+        assert 'filename="scrubbed_app.log"' in response.headers["content-disposition"]
+
+    @pytest.mark.asyncio
+    async def test_range(self, app, scrubbed):
+        """A resumed download gets just the missing bytes."""
+        await scrubbed("j1", "app.log", LOG * 100)
+        response = await app.get(
+            "/api/v1/files/download/j1", headers={"range": "bytes=100-199"}
+        )
+        assert response.status_code == 206
+        assert response.content == (LOG * 100)[100:200]
+        assert response.headers["content-range"] == f"bytes 100-199/{len(LOG) * 100}"
+
+    @pytest.mark.asyncio
+    async def test_if_none_match(self, app, scrubbed):
+        """A repeated download with the ETag is a 304 with no body."""
+        await scrubbed("j1", "app.log", LOG)
+        etag = (await app.get("/api/v1/files/download/j1")).headers["etag"]
+        response = await app.get(
+            "/api/v1/files/download/j1", headers={"if-none-match": f"W/{etag}"}
+        )
+        assert response.status_code == 304
+        assert response.content == b""
+
+    @pytest.mark.asyncio
+    async def test_served_from_content_store(self, app, scrubbed, redis_client):
+        """A job sharing a stored output serves the blob under its own name."""
+        from services import scrub_store
+
+        key = "ab" * 32
+        blob = scrub_store.blob_path(key)
+        blob.parent.mkdir(parents=True)
+        blob.write_bytes(LOG)
+        record = {
+            "job_id": "j4",
+            "status": "done",
+            "output_filename": "j4_other.log",
+            "output_blob": key,
+        }
+        await redis_client.set("scrub_job:j4", json.dumps(record))
+        response = await app.get("/api/v1/files/download/j4")
+        assert response.content == LOG
+        assert (
+            'filename="scrubbed_other.log"' in response.headers["content-disposition"]
+        )
+
+    @pytest.mark.asyncio
+    async def test_unknown_job(self, app, scrubbed, tmp_path):
+        """Without a job record there is nothing to serve, whatever is on disk."""
+        (tmp_path / "out" / "j3_app.log").write_bytes(LOG)
+        response = await app.get("/api/v1/files/download/j3")
+        assert response.status_code == 404
+
+
+class TestCompressedDownload:
+    @pytest.mark.asyncio
+    async def test_sent_encoded_when_accepted(self, app, scrubbed):
+        """gzip-accepting clients get the stored bytes with Content-Encoding."""
+        await scrubbed("j9", "app.log.gz", gzip.compress(LOG * 100))
+        response = await app.get(
+            "/api/v1/files/download/j9", headers={"accept-encoding": "gzip, br"}
+        )
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.content == LOG * 100  # Decoded by the client
+        assert 'filename="scrubbed_app.log"' in response.headers["content-disposition"]
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("accept", ["identity", "gzip;q=0"])
+    async def test_decompressed_otherwise(self, app, scrubbed, accept):
+        """Other clients get the file decompressed on the fly."""
+        await scrubbed("j9", "app.log.gz", gzip.compress(LOG * 100))
+        response = await app.get(
+            "/api/v1/files/download/j9", headers={"accept-encoding": accept}
+        )
+        assert "content-encoding" not in response.headers
+        assert response.headers["accept-ranges"] == "none"
+        assert response.content == LOG * 100
+
+    @pytest.mark.asyncio
+    async def test_etag_per_representation(self, app, scrubbed):
+        """Encoded and decoded responses of one file have different ETags."""
+        await scrubbed("j9", "app.log.gz", gzip.compress(LOG))
+        url = "/api/v1/files/download/j9"
+        encoded = await app.get(url, headers={"accept-encoding": "gzip"})
+        plain = await app.get(url, headers={"accept-encoding": "identity"})
+        assert encoded.headers["etag"] != plain.headers["etag"]
+
+    @pytest.mark.asyncio
+    async def test_checkpointed_job_decodes_in_full(
+        self, app, scrubbed, tmp_path, monkeypatch, redis_client
+    ):
+        """A gzip output flushed at many checkpoints decodes to the whole file."""
+        from scrubbing.scrubbers import log
+
+        monkeypatch.setattr(log, "scrub_sandbox", PathSandbox(tmp_path))
+        monkeypatch.setattr(log, "BLOCK_BYTES", 4096)
+        monkeypatch.setattr(log.ScrubCheckpoint, "due", lambda self: True)
+        (tmp_path / "in").mkdir()
+        (tmp_path / "in" / "j8.txt").write_bytes(LOG * 2000)
+        log.scrub_log_file("j8.txt", "plain.log")
+        log.scrub_log_file("j8.txt", "j8_app.log.gz", output_codec="gzip")
+        record = {"job_id": "j8", "status": "done", "output_filename": "j8_app.log.gz"}
+        await redis_client.set("scrub_job:j8", json.dumps(record))
+
+        response = await app.get(
+            "/api/v1/files/download/j8", headers={"accept-encoding": "gzip"}
+        )
+        assert response.headers["content-encoding"] == "gzip"
+        assert response.content == (tmp_path / "out" / "plain.log").read_bytes()
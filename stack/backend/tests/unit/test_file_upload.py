@@ -0,0 +1,156 @@
+"""Streaming upload ingestion — limits and checks applied as bytes arrive."""
+
+import gzip
+import hashlib
+
+import httpx
+import pytest
+
+from routes import files
+from utils.paths import PathSandbox
+
+LOG = b"2024-01-01 10.0.0.1 GET /health 200\n"
+
+
+@pytest.fixture
+def upload(app, tmp_path, monkeypatch):
+    """POST a file to /api/v1/files, body sent in chunk_size pieces."""
+    from unittest.mock import AsyncMock
+
+    from main import app as _app
+
+    monkeypatch.setattr(files, "scrub_sandbox", PathSandbox(tmp_path))
+    queue = AsyncMock()
+    queue.submit.return_value = {"status": "queued"}
+    monkeypatch.setattr(_app.state, "scrub_jobs", queue, raising=False)
+    monkeypatch.setattr(_app.state, "scrubbing_enabled", True, raising=False)
+    sent = []
+
+    async def post(content: bytes, filename="app.log", chunk_size=512):
+        form = httpx.Request("POST", "http://test", files={"file": (filename, content)})
+        body = form.read()
+
+        async def stream():
+            for start in range(0, len(body), chunk_size):
+                sent.append(start)
+                yield body[start : start + chunk_size]
+
+        headers = {"content-type": form.headers["content-type"]}
+        return await app.post("/api/v1/files", content=stream(), headers=headers)
+
+    post.sent = sent
+    return post
+
+
+class TestStreamingUpload:
+    @pytest.mark.asyncio
+    async def test_chunked_upload_saved_intact(self, upload, tmp_path):
+        """A body split into small chunks lands on disk byte for byte."""
+        content = LOG * 500
+        response = await upload(content, chunk_size=97)
+        assert response.status_code == 200
+        (saved,) = (tmp_path / "in").glob("*.txt")
+        assert saved.read_bytes() == content
+        assert not list((tmp_path / "in").glob("*.part"))
+
+    @pytest.mark.asyncio
+    async def test_oversized_rejected_before_body_read(self, upload, monkeypatch):
+        """The limit stops the upload once exceeded, not after the whole body."""
+        monkeypatch.setattr(files, "SCRUB_FILE_LIMIT", 4096)
+        response = await upload(LOG * 2000)
+        assert response.status_code == 413
+        assert len(upload.sent) < 20  # Of ~140 chunks
+
+    @pytest.mark.asyncio
+    async def test_binary_rejected_from_first_chunk(self, upload, tmp_path):
+        """MIME is sniffed from the head; nothing is left in the sandbox."""
+        png = b"\x89PNG\r\n\x1a\n" + b"\x00" * 20000
+        response = await upload(png, filename="shot.png")
+        assert response.status_code == 415
+        assert len(upload.sent) < 10
+        assert not list((tmp_path / "in").iterdir())
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("split", [1, 2, 3])
+    async def test_invalid_utf8_rejected(self, upload, split):
+        """UTF-8 is checked incrementally, across chunk boundaries."""
+        content = LOG * 100 + "café ✓\n".encode()[:-split] + b"\xff" + LOG
+        response = await upload(content, chunk_size=64)
+        assert response.status_code == 415
+        assert "valid text" in response.json()["detail"]
+
+    @pytest.mark.asyncio
+    async def test_multibyte_split_across_chunks(self, upload):
+        """Valid UTF-8 split mid-character between chunks is accepted."""
+        content = ("ünïcødé ✓ " * 400).encode()
+        assert (await upload(content, chunk_size=61)).status_code == 200
+
+    @pytest.mark.asyncio
+    async def test_invalid_filename(self, upload):
+        """Dotfile names are rejected as before."""
+        assert (await upload(LOG, filename=".env")).status_code == 400
+
+    @pytest.mark.asyncio
+    async def test_not_multipart(self, app):
+        """A non-form body is a 400, not a 500."""
+        response = await app.post("/api/v1/files", content=b"plain body")
+        assert response.status_code == 400
+
+
+class TestCompressedUpload:
+    @pytest.mark.asyncio
+    async def test_gzip_saved_compressed(self, upload, tmp_path):
+        """A .gz upload is checked decompressed and kept compressed on disk."""
+        from main import app as _app
+
+        content = gzip.compress(LOG * 500)
+        response = await upload(content, filename="app.log.gz", chunk_size=97)
+        assert response.status_code == 200
+        saved = tmp_path / "in" / f"{response.json()['id'][len('neuralizer-'):]}.txt.gz"
+        assert saved.read_bytes() == content
+        job = _app.state.scrub_jobs.submit.await_args.args[0]
+        assert job.output_filename.endswith("_app.log.gz")
+        assert job.output_codec == "gzip"
+        # Addressed by content, so it matches the same log uploaded plain
+        assert job.content_hash == hashlib.sha256(LOG * 500).hexdigest()
+
+    @pytest.mark.asyncio
+    async def test_inflated_limit(self, upload, monkeypatch):
+        """A small upload that decompresses past the limit is cut off early."""
+        monkeypatch.setattr(files, "SCRUB_INFLATED_LIMIT", 64 * 1024)
+        bomb = gzip.compress(LOG * 1_000_000)  # 37 MB of text
+        response = await upload(bomb, filename="bomb.log.gz", chunk_size=1024)
+        assert response.status_code == 413
+        assert "Decompressed" in response.json()["detail"]
+        assert len(upload.sent) < 10
+
+    @pytest.mark.asyncio
+    async def test_compressed_binary_rejected(self, upload):
+        """MIME is sniffed on the decompressed content."""
+        png = gzip.compress(b"\x89PNG\r\n\x1a\n" + b"\x00" * 20000)
+        assert (await upload(png, filename="shot.png.gz")).status_code == 415
+
+    @pytest.mark.asyncio
+    async def test_truncated_rejected(self, upload, tmp_path):
+        """A gzip stream cut short is rejected, not scrubbed as a partial log."""
+        content = gzip.compress(LOG * 500)[:-20]
+        response = await upload(content, filename="app.log.gz")
+        assert response.status_code == 415
+        assert "Truncated" in response.json()["detail"]
+        assert not list((tmp_path / "in").iterdir())
+
+    @pytest.mark.asyncio
+    async def test_passthrough_rejects_compressed(self, upload, tmp_path, monkeypatch):
+        """With scrubbing off, archives are rejected rather than proxied."""
+        from unittest.mock import AsyncMock
+
+        from main import app as _app
+
+        monkeypatch.setattr(_app.state, "scrubbing_enabled", False)
+        proxy = AsyncMock()
+        monkeypatch.setattr(files, "_proxy_file_to_openwebui", proxy)
+        response = await upload(gzip.compress(LOG * 500), filename="app.log.gz")
+        assert response.status_code == 415
+        assert "Compressed" in response.json()["detail"]
+        proxy.assert_not_awaited()
+        assert not list((tmp_path / "in").iterdir())
@@ -0,0 +1,299 @@
+"""scrub_log_file tests — block, sequential and process-pool paths."""
+
+import gzip
+import io
+import time
+
+import pytest
+
+from scrubbing.bench import synthetic_log
+from scrubbing.scrubbers import log
+from scrubbing.scrubbers.core import ScanStats
+from utils.compression import CompressedWriter, available_codecs, open_reader
+from utils.paths import PathSandbox
+
+CODECS = [
+    "gzip",
+    pytest.param(
+        "zstd",
+        marks=pytest.mark.skipif(
+            "zstd" not in available_codecs(), reason="zstandard not installed"
+        ),
+    ),
+]
+
+# Edge cases around chunk boundaries: CRLF, bare CR, non-UTF-8 bytes,
+# text that looks like a token, and no trailing newline
+TAIL = (
+    b"crlf line 10.1.2.3\r\n"
+    b"bare cr 10.1.2.3\r next user=alice\n"
+    b"literal [IP_1] and \xff\xfe bytes from 192.168.0.9\n"
+    b"Bearer abcdefghijklmnopqrstuvwxyz123\n"
+    b"last line 10.0.0.1"
+)
+
+
+@pytest.fixture
+def sandbox(tmp_path, monkeypatch):
+    """Point the scrub sandbox at tmp_path with a multi-chunk input file."""
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "app.log").write_bytes(synthetic_log(3000).encode() + TAIL)
+    monkeypatch.setattr(log, "scrub_sandbox", PathSandbox(tmp_path))
+    return tmp_path
+
+
+def run(sandbox, monkeypatch, workers, output, token_mode="counter"):
+    monkeypatch.setattr(log, "SCRUB_WORKERS", workers)
+    monkeypatch.setattr(log, "PARALLEL_MIN_BYTES", 0)
+    monkeypatch.setattr(log, "CHUNK_BYTES", 16 * 1024)
+    result = log.scrub_log_file("app.log", output, token_mode=token_mode)
+    return result, (sandbox / "out" / output).read_bytes()
+
+
+class TestScrubLogFile:
+    def test_sequential(self, sandbox, monkeypatch):
+        """Sequential run scrubs every line and reports counts."""
+        result, output = run(sandbox, monkeypatch, 1, "seq.log")
+        assert result["lines_processed"] == 3006  # Bare CR ends a line too
+        assert b"192.168.0.9" not in output
+        assert b"literal [IP_1] and" in output
+
+    @pytest.mark.parametrize("token_mode", ["counter", "hash"])
+    def test_parallel_matches_sequential(self, sandbox, monkeypatch, token_mode):
+        """Pool run gives byte-identical output, counts and stats."""
+        seq_result, seq_output = run(sandbox, monkeypatch, 1, "seq.log", token_mode)
+        par_result, par_output = run(sandbox, monkeypatch, 2, "par.log", token_mode)
+        assert par_output == seq_output
+        # Per-chunk accounting depends on where chunks and blocks are cut
+        for key in ("pattern_ms", "prefilter_skipped"):
+            par_result.pop(key)
+            seq_result.pop(key)
+        assert par_result == seq_result
+
+    def test_blocks_match_per_line(self, sandbox, monkeypatch):
+        """Small blocks, one block and line-by-line scrubbing agree."""
+        plan = log.get_profile("all").plan_for(["ip", "name", "user", "secret"])
+        text = (sandbox / "in" / "app.log").read_text(errors="replace")
+        text += "Error John\nSmith said\nuser\nbob password:\nhunter22222\n"
+        expected = "".join(
+            plan.scrub(line, tokenizer)[0]
+            for tokenizer in [log.Tokenizer()]
+            for line in io.StringIO(text)
+        )
+        data = text.encode("utf-8")
+        for block_bytes in (64, 4096, len(data)):
+            monkeypatch.setattr(log, "BLOCK_BYTES", block_bytes)
+            blocks = list(
+                log._scrub_blocks(
+                    log._mapped_blocks(data, 0, len(data)),
+                    plan,
+                    log.Tokenizer(),
+                    ScanStats(),
+                )
+            )
+            assert "".join(block[1] for block in blocks) == expected
+            assert sum(block[2] for block in blocks) == len(list(io.StringIO(text)))
+
+    def test_terminal_user_spans_lines(self, sandbox, monkeypatch):
+        """whoami output on the next line is scrubbed in file mode."""
+        (sandbox / "in" / "shell.log").write_text("❯ whoami\nalice\n$ ls\n")
+        monkeypatch.setattr(log, "SCRUB_WORKERS", 1)
+        result = log.scrub_log_file("shell.log", "shell.log", ["terminal_user"])
+        assert (sandbox / "out" / "shell.log").read_text() == (
+            "❯ whoami\n[USER_1]\n$ ls\n"
+        )
+        assert result["lines_processed"] == 3
+
+    def test_progress_reports_offsets(self, sandbox, monkeypatch):
+        """progress gets increasing offsets, ending at the file size."""
+        monkeypatch.setattr(log, "BLOCK_BYTES", 16 * 1024)
+        calls = []
+        result = log.scrub_log_file(
+            "app.log", "seq.log", progress=lambda *args: calls.append(args)
+        )
+        size = (sandbox / "in" / "app.log").stat().st_size
+        assert len(calls) > 2
+        assert [done for done, _, _ in calls] == sorted(done for done, _, _ in calls)
+        assert calls[-1] == (size, size, result["lines_processed"])
+
+
+class TestLineRanges:
+    def test_ranges_end_on_newlines(self):
+        """Ranges cover the file exactly and each ends after a newline."""
+        data = synthetic_log(500).encode() + b"no newline"
+        ranges = list(log._line_ranges(data, 0, len(data), 1000))
+        assert ranges[0][0] == 0 and ranges[-1][1] == len(data)
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            assert end == start
+            assert data[end - 1 : end] == b"\n"
+
+    @pytest.mark.parametrize("size", [1, 7, 1000, 16 * 1024])
+    def test_stream_blocks_match_line_ranges(self, size):
+        """Blocks cut from a stream are the ones _line_ranges cuts."""
+        data = synthetic_log(500).encode() + b"no newline"
+        expected = [
+            (end, data[start:end])
+            for start, end in log._line_ranges(data, 0, len(data), size)
+        ]
+        assert list(log._stream_blocks(io.BytesIO(data), 0, size)) == expected
+        resumed = list(log._stream_blocks(io.BytesIO(data), expected[1][0], size))
+        assert resumed == expected[2:]
+
+    def test_stream_blocks_long_line_linear(self):
+        """A line much longer than a read is buffered in linear time."""
+        data = b"x" * 4_000_000 + b"\nend\n"
+        start = time.perf_counter()
+        blocks = list(log._stream_blocks(io.BytesIO(data), 0, 512))
+        assert time.perf_counter() - start < 0.5  # Was ~2 s, quadratic
+        assert blocks == [(4_000_001, data[:4_000_001]), (len(data), b"end\n")]
+
+
+def decompress(path, codec):
+    with open(path, "rb") as raw, open_reader(raw, codec) as reader:
+        return reader.read()
+
+
+class TestCompressed:
+    @pytest.fixture
+    def packed(self, sandbox):
+        """Write in/app.log compressed with codec as in/app.log.<codec>."""
+
+        def pack(codec):
+            with open(sandbox / "in" / f"app.log.{codec}", "wb") as raw:
+                with CompressedWriter(raw, codec) as writer:
+                    writer.write((sandbox / "in" / "app.log").read_bytes())
+            return f"app.log.{codec}"
+
+        return pack
+
+    @pytest.mark.parametrize("codec", CODECS)
+    def test_compressed_input_matches_plain(self, sandbox, monkeypatch, packed, codec):
+        """A compressed input scrubs to the plain input's output and counts."""
+        expected, expected_output = run(sandbox, monkeypatch, 2, "plain.log")
+        monkeypatch.setattr(log, "BLOCK_BYTES", 8 * 1024)
+        result = log.scrub_log_file(packed(codec), "packed.log", output_codec="none")
+        output = (sandbox / "out" / "packed.log").read_bytes()
+        assert output == expected_output
+        for key in ("pattern_ms", "prefilter_skipped"):
+            result.pop(key)
+            expected.pop(key)
+        assert result == expected
+
+    @pytest.mark.parametrize("codec", CODECS)
+    def test_output_compressed_like_input(self, sandbox, monkeypatch, packed, codec):
+        """output_codec="auto" compresses with the input's codec."""
+        _, expected_output = run(sandbox, monkeypatch, 1, "plain.log")
+        calls = []
+        log.scrub_log_file(
+            packed(codec), "packed.log", progress=lambda *args: calls.append(args)
+        )
+        path = sandbox / "out" / "packed.log"
+        assert decompress(path, codec) == expected_output
+        assert path.stat().st_size < len(expected_output) / 2
+        # Progress is in compressed bytes
+        size = (sandbox / "in" / f"app.log.{codec}").stat().st_size
+        assert calls[-1][:2] == (size, size)
+
+    def test_unknown_output_codec(self, sandbox):
+        with pytest.raises(ValueError, match="output_codec"):
+            log.scrub_log_file("app.log", "out.log", output_codec="brotli")
+
+
+class TestDecodeBlock:
+    @pytest.mark.parametrize(
+        "data",
+        [b"plain ascii\n", b"crlf\r\nbare\rcr\n", b"caf\xc3\xa9 \xff\xfe\n\xe2\x9d"],
+    )
+    def test_matches_text_mode(self, tmp_path, data):
+        """Fast and general paths both decode as text-mode open() does."""
+        path = tmp_path / "block.log"
+        path.write_bytes(data)
+        assert log._decode_block(data) == path.read_text(errors="replace")
+
+    def test_empty_file(self, sandbox):
+        """An empty input (can't be mmapped) gives an empty output."""
+        (sandbox / "in" / "empty.log").write_bytes(b"")
+        result = log.scrub_log_file("empty.log", "empty.log")
+        assert result["lines_processed"] == 0
+        assert (sandbox / "out" / "empty.log").read_bytes() == b""
+
+
+class TestRenumber:
+    def test_first_seen_order(self):
+        """Chunk-local ids map to global ids in first-seen order."""
+        shared = log.Tokenizer()
+        assert shared.tokenize("a", "IP") == "[IP_1]"
+
+        chunk = log._ChunkTokenizer("")
+        text = f"{chunk.tokenize('b', 'IP')} {chunk.tokenize('a', 'IP')} [IP_1]"
+        assert log._renumber(text, "", chunk.first_seen(), shared) == (
+            "[IP_2] [IP_1] [IP_1]"
+        )
+
+
+class TestCheckpoint:
+    def crash_after(self, monkeypatch, blocks):
+        """Checkpoint after every block, then die mid-job after `blocks`."""
+        calls = iter(range(blocks + 1))
+
+        def due(self):
+            if next(calls, None) is None:
+                raise KeyboardInterrupt  # Block written, checkpoint not saved
+            return True
+
+        monkeypatch.setattr(log.ScrubCheckpoint, "due", due)
+        monkeypatch.setattr(log, "BLOCK_BYTES", 8 * 1024)
+
+    @pytest.mark.parametrize("workers", [1, 2])
+    @pytest.mark.parametrize("token_mode", ["counter", "hash"])
+    def test_resume_matches_full_run(self, sandbox, monkeypatch, workers, token_mode):
+        """A killed job rerun resumes and ends byte-identical to a clean run."""
+        monkeypatch.setenv("SCRUB_TOKEN_KEY", "checkpoint-test")
+        expected, expected_output = run(
+            sandbox, monkeypatch, workers, "full.log", token_mode
+        )
+
+        self.crash_after(monkeypatch, 3)
+        with pytest.raises(KeyboardInterrupt):
+            run(sandbox, monkeypatch, workers, "job.log", token_mode)
+        assert (sandbox / "ckpt" / "job.log.ckpt").exists()
+
+        monkeypatch.undo()
+        monkeypatch.setattr(log, "scrub_sandbox", PathSandbox(sandbox))
+        monkeypatch.setenv("SCRUB_TOKEN_KEY", "checkpoint-test")
+        result, output = run(sandbox, monkeypatch, workers, "job.log", token_mode)
+        assert output == expected_output
+        for key in ("pattern_ms", "prefilter_skipped"):
+            result.pop(key)
+            expected.pop(key)
+        assert result == expected
+        assert not (sandbox / "ckpt" / "job.log.ckpt").exists()
+
+    @pytest.mark.parametrize("codec", CODECS)
+    def test_resume_compressed(self, sandbox, monkeypatch, codec):
+        """Compressed in and out: the resumed output is one valid stream."""
+        _, expected_output = run(sandbox, monkeypatch, 1, "full.log")
+        with open(sandbox / "in" / "app.log.gz", "wb") as raw:
+            raw.write(gzip.compress((sandbox / "in" / "app.log").read_bytes()))
+
+        self.crash_after(monkeypatch, 3)
+        with pytest.raises(KeyboardInterrupt):
+            log.scrub_log_file("app.log.gz", "job.log", output_codec=codec)
+
+        monkeypatch.undo()
+        monkeypatch.setattr(log, "scrub_sandbox", PathSandbox(sandbox))
+        log.scrub_log_file("app.log.gz", "job.log", output_codec=codec)
+        assert decompress(sandbox / "out" / "job.log", codec) == expected_output
+
+    def test_changed_input_starts_over(self, sandbox, monkeypatch):
+        """A checkpoint for a different input is discarded, not resumed."""
+        self.crash_after(monkeypatch, 2)
+        with pytest.raises(KeyboardInterrupt):
+            run(sandbox, monkeypatch, 1, "job.log")
+
+        monkeypatch.undo()
+        monkeypatch.setattr(log, "scrub_sandbox", PathSandbox(sandbox))
+        (sandbox / "in" / "app.log").write_bytes(TAIL)
+        result, output = run(sandbox, monkeypatch, 1, "job.log")
+        assert result["lines_processed"] == 6
+        assert output.startswith(b"crlf line [IP_1]")
@@ -1,9 +1,11 @@
 """MCP subprocess client edge case tests."""
 
 import asyncio
+import json
 from unittest.mock import AsyncMock, MagicMock, patch
 
 import pytest
+import pytest_asyncio
 
 
 class TestMCPClient:
@@ -27,18 +29,19 @@ class TestMCPClient:
             assert call_kwargs.get("stderr") == asyncio.subprocess.DEVNULL
 
     @pytest.mark.asyncio
-    async def test_timeout_raises_error(self):
+    async def test_timeout_raises_error(self, monkeypatch):
         """Tool call exceeding timeout raises RuntimeError."""
-        from services.mcp_client import MCPClient
+        from services import mcp_client
 
-        client = MCPClient()
+        monkeypatch.setattr(mcp_client, "TOOL_TIMEOUT", 0.05)
+        client = mcp_client.MCPClient()
 
         # Mock subprocess that never responds
         mock_process = MagicMock()
         mock_process.returncode = None
         mock_process.stdin = AsyncMock()
         mock_process.stdout = AsyncMock()
-        mock_process.stdout.readline = AsyncMock(side_effect=asyncio.TimeoutError)
+        mock_process.stdout.readline = AsyncMock(side_effect=asyncio.Event().wait)
         mock_process.kill = MagicMock()
         mock_process.wait = AsyncMock()
 
@@ -46,6 +49,9 @@ class TestMCPClient:
 
         with pytest.raises(RuntimeError, match="timed out"):
             await client.call_tool("scrub_prompt", {"text": "test", "item_types": []})
+        # Silent for the whole timeout — wedged, so killed
+        mock_process.kill.assert_called_once()
+        await client.stop()
 
     @pytest.mark.asyncio
     async def test_auto_restart_after_crash(self):
@@ -73,3 +79,742 @@ class TestMCPClient:
             pass
 
         assert start_count > 0
+
+    @pytest.mark.asyncio
+    async def test_scrub_file_retries_after_timeout(self):
+        """A timed-out file scrub is called again to resume from its checkpoint."""
+        from services.mcp_client import MCPClient, MCPToolTimeout
+
+        client = MCPClient()
+        client.call_tool = AsyncMock(
+            side_effect=[MCPToolTimeout("timed out"), {"items_scrubbed": 1}]
+        )
+
+        result = await client.scrub_log_as_file("a.txt", "a_out.txt")
+        assert result == {"items_scrubbed": 1}
+        assert client.call_tool.await_count == 2
+
+    @pytest.mark.asyncio
+    async def test_scrub_file_gives_up_after_attempts(self):
+        """Timeouts past SCRUB_FILE_ATTEMPTS propagate."""
+        from services import mcp_client
+
+        client = mcp_client.MCPClient()
+        client.call_tool = AsyncMock(side_effect=mcp_client.MCPToolTimeout("timed out"))
+
+        with pytest.raises(RuntimeError, match="timed out"):
+            await client.scrub_log_as_file("a.txt", "a_out.txt")
+        assert client.call_tool.await_count == mcp_client.SCRUB_FILE_ATTEMPTS
+
+    @pytest.mark.asyncio
+    async def test_progress_notifications_forwarded(self):
+        """Progress notifications before the response go to on_progress."""
+        import json
+
+        from services.mcp_client import MCPClient
+
+        client = MCPClient()
+        mock_process = MagicMock()
+        mock_process.returncode = None
+        mock_process.stdin = AsyncMock()
+        progress = {"progressToken": 1, "progress": 5, "total": 10}
+        result = {"content": [{"type": "text", "text": '{"items_scrubbed": 2}'}]}
+        lines = [
+            {"jsonrpc": "2.0", "method": "notifications/progress", "params": progress},
+            {"jsonrpc": "2.0", "method": "notifications/message", "params": {}},
+            {"jsonrpc": "2.0", "id": 1, "result": result},
+        ]
+        mock_process.stdout.readline = AsyncMock(
+            side_effect=[(json.dumps(line) + "\n").encode() for line in lines]
+        )
+        client._process = mock_process
+
+        on_progress = AsyncMock()
+        assert await client.call_tool("scrub_log_as_file", {}, on_progress) == {
+            "items_scrubbed": 2
+        }
+        on_progress.assert_awaited_once_with(progress)
+        request = json.loads(mock_process.stdin.write.call_args.args[0])
+        assert request["params"]["_meta"] == {"progressToken": 1}
+
+    def test_scrub_tools_needs_call_tool(self):
+        """A ScrubTools without call_tool fails when built, not when called."""
+        from services.mcp_client import ScrubTools
+
+        class Incomplete(ScrubTools):
+            pass
+
+        with pytest.raises(TypeError, match="call_tool"):
+            Incomplete()
+
+
+class FakeServer:
+    """Stands in for the subprocess: answers tools/call after a per-tool delay.
+
+    Requests are handled concurrently, like the FastMCP server, and
+    cancellations are recorded.
+    """
+
+    def __init__(self, delays: dict[str, float]):
+        self.delays = delays
+        self.cancelled = []
+        self.returncode = None
+        self.pid = None
+        self._lines: asyncio.Queue = asyncio.Queue()
+        self.stdin = MagicMock()
+        self.stdin.write = self._received
+        self.stdin.drain = AsyncMock()
+        self.stdout = MagicMock()
+        self.stdout.readline = self._lines.get
+        self.kill = MagicMock()
+        self.terminate = MagicMock()
+        self.wait = AsyncMock()
+
+    def _received(self, data: bytes):
+        message = json.loads(data)
+        if message.get("method") == "notifications/cancelled":
+            self.cancelled.append(message["params"]["requestId"])
+        elif message.get("method") == "tools/call":
+            asyncio.get_running_loop().create_task(self._answer(message))
+
+    async def _answer(self, request: dict):
+        params = request["params"]
+        delay = self.delays[params["name"]]
+        token = params.get("_meta", {}).get("progressToken")
+        if token is not None:  # Keep the call alive while "working"
+            for _ in range(int(delay / 0.01)):
+                await asyncio.sleep(0.01)
+                self._emit(
+                    {
+                        "jsonrpc": "2.0",
+                        "method": "notifications/progress",
+                        "params": {"progressToken": token, "progress": 1},
+                    }
+                )
+        else:
+            await asyncio.sleep(delay)
+        result = {"tool": params["name"]}
+        if params["arguments"].get("replacements_format") == "columns":
+            result["replacements"] = {"replacement": [], "item_type": [], "types": []}
+        text = json.dumps(result)
+        self._emit(
+            {
+                "jsonrpc": "2.0",
+                "id": request["id"],
+                "result": {"content": [{"type": "text", "text": text}]},
+            }
+        )
+
+    def _emit(self, message: dict):
+        self._lines.put_nowait((json.dumps(message) + "\n").encode())
+
+
+class TestMultiplexing:
+    @pytest.fixture
+    def client(self):
+        from services.mcp_client import MCPClient
+
+        client = MCPClient()
+        yield client
+        if client._reader is not None:
+            client._reader.cancel()
+
+    @pytest.mark.asyncio
+    async def test_prompt_not_queued_behind_file_scrub(self, client):
+        """A prompt scrub completes while a long file scrub is in flight."""
+        client._process = FakeServer({"scrub_log_as_file": 0.5, "scrub_prompt": 0})
+        progress = AsyncMock()
+        file_scrub = asyncio.create_task(
+            client.call_tool("scrub_log_as_file", {}, progress)
+        )
+        await asyncio.sleep(0.05)
+
+        result = await asyncio.wait_for(client.call_tool("scrub_prompt", {}), 0.2)
+        assert result == {"tool": "scrub_prompt"}
+        assert not file_scrub.done()
+        assert await file_scrub == {"tool": "scrub_log_as_file"}
+        assert progress.await_count > 10  # Routed to the file scrub's callback
+
+    @pytest.mark.asyncio
+    async def test_responses_routed_by_id(self, client):
+        """Out-of-order responses reach the calls that sent them."""
+        client._process = FakeServer({"slow": 0.1, "medium": 0.05, "fast": 0})
+        results = await asyncio.gather(
+            *(client.call_tool(name, {}) for name in ("slow", "medium", "fast"))
+        )
+        assert [r["tool"] for r in results] == ["slow", "medium", "fast"]
+
+    @pytest.mark.asyncio
+    async def test_timeout_fails_only_its_call(self, client, monkeypatch):
+        """A timed-out call is cancelled; other calls and the process live on."""
+        from services import mcp_client
+
+        monkeypatch.setattr(mcp_client, "TOOL_TIMEOUT", 0.1)
+        server = FakeServer({"stuck": 10, "busy": 0.3, "fast": 0})
+        client._process = server
+
+        busy = asyncio.create_task(client.call_tool("busy", {}, AsyncMock()))
+        await asyncio.sleep(0.01)
+        with pytest.raises(mcp_client.MCPToolTimeout):
+            await client.call_tool("stuck", {})
+
+        assert server.cancelled == [2]
+        server.kill.assert_not_called()
+        assert await client.call_tool("fast", {}) == {"tool": "fast"}
+        assert await busy == {"tool": "busy"}
+
+    @pytest.mark.asyncio
+    async def test_exit_fails_calls_in_flight(self, client):
+        """EOF from the subprocess fails pending calls without waiting out the timeout."""
+        from services.mcp_client import MCPProcessExited
+
+        server = FakeServer({"stuck": 10})
+        client._process = server
+        call = asyncio.create_task(client.call_tool("stuck", {}))
+        await asyncio.sleep(0.01)
+        server._lines.put_nowait(b"")
+
+        with pytest.raises(MCPProcessExited):
+            await asyncio.wait_for(call, 1)
+        assert client._process is None  # Restarted on the next call
+
+    @pytest.mark.asyncio
+    async def test_exit_before_send(self, client, monkeypatch):
+        """A process gone before the write fails the call cleanly, leaking nothing."""
+        from services.mcp_client import MCPProcessExited, MCPUnavailable
+
+        client._process = FakeServer({"fast": 0})
+        monkeypatch.setattr(
+            client, "_ensure_process", AsyncMock(side_effect=MCPUnavailable("down"))
+        )
+        async with client._write_lock:
+            call = asyncio.create_task(client.call_tool("fast", {}))
+            await asyncio.sleep(0.01)
+            client._process = None  # Exited while the call waited on the lock
+
+        with pytest.raises(MCPUnavailable):
+            await asyncio.wait_for(call, 1)
+        assert client._pending == {}
+        with pytest.raises(MCPProcessExited):
+            await client._send({"jsonrpc": "2.0", "method": "ping"})
+
+    @pytest.mark.asyncio
+    async def test_exit_before_send_retried(self, client, monkeypatch):
+        """The call is retried once on the restarted process."""
+        client._process = FakeServer({"fast": 0})
+
+        async def restart():
+            await client._stop_reader()
+            client._process = FakeServer({"fast": 0})
+
+        monkeypatch.setattr(client, "_ensure_process", restart)
+        async with client._write_lock:
+            call = asyncio.create_task(client.call_tool("fast", {}))
+            await asyncio.sleep(0.01)
+            client._process.returncode = 1
+
+        assert await asyncio.wait_for(call, 1) == {"tool": "fast"}
+        assert client._pending == {}
+
+    @pytest.mark.asyncio
+    async def test_abandoned_call_cancelled(self, client):
+        """A call whose caller goes away is cancelled on the server, not leaked."""
+        server = FakeServer({"stuck": 10, "fast": 0})
+        client._process = server
+        call = asyncio.create_task(client.call_tool("stuck", {}))
+        await asyncio.sleep(0.01)
+        call.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await call
+        await asyncio.sleep(0.01)  # Notification goes out from its own task
+
+        assert server.cancelled == [1]
+        assert client._pending == {}
+        assert await client.call_tool("fast", {}) == {"tool": "fast"}
+
+    @pytest.mark.asyncio
+    async def test_failing_progress_handler_cancels(self, client):
+        """An exception from on_progress abandons (and cancels) the call."""
+        server = FakeServer({"scrub_log_as_file": 1})
+        client._process = server
+        with pytest.raises(ValueError):
+            await client.call_tool(
+                "scrub_log_as_file", {}, AsyncMock(side_effect=ValueError)
+            )
+        await asyncio.sleep(0.01)
+        assert server.cancelled == [1]
+
+
+def fake_client(delays: dict[str, float]):
+    """An MCPClient already talking to a FakeServer."""
+    from services.mcp_client import MCPClient
+
+    client = MCPClient()
+    client._process = FakeServer(delays)
+    return client
+
+
+class TestMCPPool:
+    DELAYS = {"scrub_prompt": 0, "slow": 0.2, "scrub_log_as_file": 0}
+
+    @pytest.fixture
+    def pool(self):
+        from services.mcp_client import MCPPool
+
+        pool = MCPPool(2, 1, client_factory=lambda: fake_client(self.DELAYS))
+        yield pool
+        for clients in pool._pools.values():
+            for client in clients:
+                if client._reader is not None:
+                    client._reader.cancel()
+
+    @pytest.mark.asyncio
+    async def test_least_outstanding_first(self, pool):
+        """A call goes to the prompt process with nothing in flight."""
+        busy, idle = pool._pools["prompt"]
+        slow = asyncio.create_task(busy.call_tool("slow", {}))
+        await asyncio.sleep(0.01)
+
+        for _ in range(3):
+            assert pool._pick(pool._pools["prompt"]) is idle
+        assert (await pool.scrub_prompt("x"))["tool"] == "scrub_prompt"
+        assert busy.outstanding == 1
+        await slow
+        assert busy.outstanding == 0
+
+    @pytest.mark.asyncio
+    async def test_ties_round_robin(self, pool):
+        """Idle processes take turns."""
+        prompt = pool._pools["prompt"]
+        assert {id(pool._pick(prompt)) for _ in range(4)} == set(map(id, prompt))
+
+    @pytest.mark.asyncio
+    async def test_file_scrubs_use_file_pool(self, pool):
+        """scrub_log_as_file goes to the file sub-pool, prompts never do."""
+        (file_client,) = pool._pools["file"]
+        await pool.scrub_log_as_file("a.txt", "a_out.txt")
+        await pool.scrub_prompt("x")
+        assert file_client.starts == 0 and file_client._request_id == 1
+
+    @pytest.mark.asyncio
+    async def test_shared_pool_without_file_processes(self):
+        """With no file processes, file scrubs run on the prompt processes."""
+        from services.mcp_client import MCPPool
+
+        pool = MCPPool(1, 0, client_factory=lambda: fake_client(self.DELAYS))
+        assert await pool.scrub_log_as_file("a.txt", "a_out.txt") == {
+            "tool": "scrub_log_as_file"
+        }
+        assert pool.metrics()["file"] == {"size": 0, "shared_with": "prompt"}
+        pool._pools["prompt"][0]._reader.cancel()
+
+    @pytest.mark.asyncio
+    async def test_restart_backoff(self, pool, monkeypatch):
+        """A process that fails to start sits out a growing backoff."""
+        from services import mcp_client
+
+        broken, healthy = pool._pools["prompt"]
+        broken._process = None
+        broken.start = AsyncMock(side_effect=OSError("spawn failed"))
+
+        with pytest.raises(OSError):
+            await broken.call_tool("scrub_prompt", {})
+        assert not broken.available
+        first = broken._retry_at
+
+        # Skipped while backing off
+        for _ in range(3):
+            assert (await pool.scrub_prompt("x"))["tool"] == "scrub_prompt"
+        assert broken.start.await_count == 1
+
+        # Direct calls fail fast instead of respawning; the next failure
+        # doubles the delay
+        with pytest.raises(mcp_client.MCPUnavailable):
+            await broken.call_tool("scrub_prompt", {})
+        broken._retry_at = 0
+        with pytest.raises(OSError):
+            await broken.call_tool("scrub_prompt", {})
+        assert broken.failures == 2
+        assert broken._retry_at - first > mcp_client.RESTART_BACKOFF
+
+        healthy._process = None
+        healthy._retry_at = float("inf")
+        with pytest.raises(mcp_client.MCPUnavailable):
+            await pool.scrub_prompt("x")
+
+    @pytest.mark.asyncio
+    async def test_crash_counts_as_failure(self, pool):
+        """EOF from a running process backs it off; an answer resets the count."""
+        client = pool._pools["prompt"][0]
+        await client.call_tool("scrub_prompt", {})
+        client._process._lines.put_nowait(b"")
+        await asyncio.sleep(0.01)
+        assert client.failures == 1
+        assert not client.running
+
+    @pytest.mark.asyncio
+    async def test_standby_replaces_dead_process(self, pool):
+        """A dead process is swapped for the ready standby, which is refilled."""
+        dead = pool._pools["prompt"][0]
+        dead._process, dead.starts = None, 1
+        standby = fake_client(self.DELAYS)
+        pool._standby = standby
+
+        assert (await pool.scrub_prompt("x"))["tool"] == "scrub_prompt"
+        assert pool._pools["prompt"][0] is standby
+        assert dead.retired and not dead.available
+        assert pool.swaps == 1
+        await pool._standby_task
+        assert pool.metrics()["standby"] == {"enabled": True, "ready": True, "swaps": 1}
+        pool._pools["prompt"].append(pool._standby)  # Cleaned up by the fixture
+
+    @pytest.mark.asyncio
+    async def test_no_standby_waits_for_restart(self, pool):
+        """Without a standby the dead process restarts in place (with backoff)."""
+        pool.standby = False
+        dead = pool._pools["prompt"][0]
+        dead._process, dead.starts = None, 1
+        pool._pick(pool._pools["prompt"])
+        assert pool._pools["prompt"][0] is dead
+        assert pool._standby_task is None
+
+    @pytest.mark.asyncio
+    async def test_retired_client_not_restarted(self):
+        """A replaced client refuses to start a process nobody would stop."""
+        from services.mcp_client import MCPClient, MCPUnavailable
+
+        client = MCPClient()
+        client.retired = True
+        client.start = AsyncMock()
+        with pytest.raises(MCPUnavailable):
+            await client.call_tool("scrub_prompt", {})
+        client.start.assert_not_awaited()
+
+    @pytest.mark.asyncio
+    async def test_recycle_after_max_requests(self, pool):
+        """A worn process is replaced first, and stopped once its calls finish."""
+        pool.standby = False
+        pool.max_requests = 5
+        worn, other = pool._pools["prompt"]
+        process = worn._process
+        slow = asyncio.create_task(worn.call_tool("slow", {}))
+        await asyncio.sleep(0.01)
+        worn.served = 5
+
+        await pool.scrub_prompt("x")
+        await asyncio.sleep(0.01)
+        replacement = pool._pools["prompt"][0]
+        assert replacement is not worn and pool._pools["prompt"][1] is other
+        assert worn.retired and not worn.available
+        assert pool.metrics()["recycle"]["draining"] == 1
+        process.terminate.assert_not_called()  # Its call is still running
+
+        assert (await slow)["tool"] == "slow"
+        await asyncio.gather(*pool._background)
+        process.terminate.assert_called_once()
+        recycle = pool.metrics()["recycle"]
+        assert recycle["recycles"] == {"requests": 1, "rss": 0}
+        assert recycle["draining"] == 0
+
+    @pytest.mark.asyncio
+    async def test_recycle_on_rss(self, pool, monkeypatch):
+        """RSS is sampled after calls; past the limit the standby takes over."""
+        from services import mcp_client
+
+        monkeypatch.setattr(mcp_client, "_rss_bytes", lambda pid: 600 * 2**20)
+        pool.max_rss = 512 * 2**20
+        standby = fake_client(self.DELAYS)
+        pool._standby = standby
+        (file_client,) = pool._pools["file"]
+
+        await pool.scrub_log_as_file("a.txt", "a_out.txt")
+        assert file_client.status()["rss_mb"] == 600
+        assert file_client.status()["served"] == 1
+        await pool.scrub_log_as_file("b.txt", "b_out.txt")
+        await asyncio.gather(*pool._background)
+        assert pool._pools["file"] == [standby]
+        assert pool.metrics()["recycle"]["recycles"]["rss"] == 1
+        await pool._standby_task
+        pool._pools["prompt"].append(pool._standby)  # Cleaned up by the fixture
+
+    @pytest.mark.asyncio
+    async def test_metrics(self, pool):
+        """Sizes, running processes and calls in flight per sub-pool."""
+        slow = asyncio.create_task(pool.call_tool("slow", {}))
+        await asyncio.sleep(0.01)
+        metrics = pool.metrics()
+        assert metrics["prompt"]["size"] == 2
+        assert metrics["prompt"]["running"] == 2
+        assert metrics["prompt"]["outstanding"] == 1
+        assert metrics["file"]["size"] == 1
+        assert metrics["file"]["processes"][0]["restarts"] == 0
+        await slow
+
+
+class TestLargePayloads:
+    @pytest.fixture
+    def sandbox(self, tmp_path, monkeypatch):
+        from utils import transfer
+        from utils.paths import PathSandbox
+
+        monkeypatch.setattr(transfer, "scrub_sandbox", PathSandbox(tmp_path))
+        monkeypatch.setattr(transfer, "INLINE_BYTES", 1024)
+        return tmp_path / "xfer"
+
+    @pytest.mark.asyncio
+    async def test_large_text_and_result_by_reference(self, sandbox):
+        """Text over INLINE_BYTES goes as a file; a result_ref is read back."""
+        from services.mcp_client import MCPClient
+        from utils import transfer
+
+        client = MCPClient()
+        client._process = MagicMock()
+        client._process.returncode = None
+        text = "mail bob@example.com\n" * 100
+        seen = {}
+
+        async def call(name, arguments, on_progress=None):
+            seen.update(arguments)
+            assert transfer.read(arguments["text_ref"]) == text
+            result = {
+                "sanitized_text": "mail [EMAIL_1]\n" * 100,
+                "replacements": transfer.encode_replacements(
+                    [{"replacement": "[EMAIL_1]", "item_type": "email"}] * 100
+                ),
+                "summary": {"email": 100},
+            }
+            return json.loads(
+                transfer.take(transfer.inline_or_ref(result)["result_ref"])
+            )
+
+        client.call_tool = call
+        result = await client.scrub_prompt(text)
+        assert "text" not in seen and seen["replacements_format"] == "columns"
+        assert len(result["replacements"]) == 100
+        assert result["replacements"][0]["item_type"] == "email"
+        assert not list(sandbox.iterdir())  # Argument file removed after the call
+
+    @pytest.mark.asyncio
+    async def test_result_ref_resolved(self, sandbox):
+        """call_tool replaces a {result_ref} answer with the file's contents."""
+        from services.mcp_client import MCPClient
+        from utils import transfer
+
+        ref = transfer.put(json.dumps({"sanitized_text": "x" * 5000}), ".json")
+        text = json.dumps({"result_ref": ref})
+        response = {
+            "jsonrpc": "2.0",
+            "id": 1,
+            "result": {"content": [{"type": "text", "text": text}]},
+        }
+        client = MCPClient()
+        client._process = MagicMock()
+        client._process.returncode = None
+        client._process.stdin = AsyncMock()
+        client._process.stdout.readline = AsyncMock(
+            side_effect=[(json.dumps(response) + "\n").encode()]
+        )
+
+        result = await client.call_tool("scrub_prompt", {})
+        assert result == {"sanitized_text": "x" * 5000}
+        assert not list(sandbox.iterdir())
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("count", [2, 200])
+    async def test_batch_one_round_trip(self, sandbox, count):
+        """scrub_batch is one call_tool; a large batch goes as a JSON file."""
+        from services.mcp_client import MCPClient
+        from utils import transfer
+
+        texts = [f"mail user{i}@example.com" for i in range(count)]
+        calls = []
+
+        async def call(name, arguments, on_progress=None):
+            calls.append(arguments)
+            sent = arguments.get("texts")
+            if sent is None:
+                sent = json.loads(transfer.read(arguments["texts_ref"]))
+            row = transfer.encode_replacements(
+                [{"replacement": "[EMAIL_1]", "item_type": "email"}]
+            )
+            return {
+                "results": [{"sanitized_text": t, "replacements": row} for t in sent]
+            }
+
+        client = MCPClient()
+        client.call_tool = call
+        results = await client.scrub_log_batch(texts, shared_tokenizer=False)
+
+        assert len(calls) == 1
+        assert calls[0]["profile"] == "all"
+        assert calls[0]["shared_tokenizer"] is False
+        assert ("texts_ref" in calls[0]) == (count == 200)
+        assert [r["sanitized_text"] for r in results] == texts
+        assert results[-1]["replacements"][0]["item_type"] == "email"
+        assert not list(sandbox.glob("*"))
+
+
+class TestRemoteServers:
+    """Networked scrub servers — the real server app over in-process HTTP."""
+
+    @pytest_asyncio.fixture
+    async def scrub_http(self, tmp_path, monkeypatch):
+        """An httpx client for scrubbing/server.py's streamable HTTP app."""
+        import httpx
+
+        from scrubbing import server
+        from utils import transfer
+        from utils.paths import PathSandbox
+
+        monkeypatch.setattr(server, "_by_reference", False)
+        monkeypatch.setattr(transfer, "scrub_sandbox", PathSandbox(tmp_path))
+        monkeypatch.setattr(transfer, "INLINE_BYTES", 1024)
+        app = server.mcp.http_app()
+        started, done = asyncio.Event(), asyncio.Event()
+
+        async def serve():  # Lifespan entered and exited in one task
+            async with app.router.lifespan_context(app):
+                started.set()
+                await done.wait()
+
+        task = asyncio.create_task(serve())
+        await started.wait()
+        transport = httpx.ASGITransport(app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://scrub"
+        ) as http:
+            yield http
+        done.set()
+        await task
+
+    @pytest.fixture
+    def down_http(self):
+        """An httpx client whose server refuses connections."""
+        import httpx
+
+        def refuse(request):
+            raise httpx.ConnectError("Connection refused", request=request)
+
+        return httpx.AsyncClient(transport=httpx.MockTransport(refuse))
+
+    @pytest.mark.asyncio
+    async def test_scrub_over_http(self, scrub_http, tmp_path):
+        """Prompts, batches and large text go inline over one HTTP session."""
+        from services.mcp_client import RemoteMCPClient
+
+        client = RemoteMCPClient("http://scrub/mcp", http=scrub_http)
+        text = "mail bob@example.com\n" * 200  # Over INLINE_BYTES
+        result = await client.scrub_prompt(text)
+        assert result["sanitized_text"] == "mail [EMAIL_1]\n" * 200
+        assert len(result["replacements"]) == 200
+        batch = await client.scrub_batch(["a@example.com", "none"])
+        assert [r["sanitized_text"] for r in batch] == ["[EMAIL_1]", "none"]
+        assert client.starts == 1 and await client.check()
+        assert not (tmp_path / "xfer").exists()  # Nothing by reference
+        await client.stop()
+        assert not client.running
+
+    @pytest.mark.asyncio
+    async def test_tool_error_over_http(self, scrub_http):
+        """A tool that raises is reported as for a subprocess."""
+        from services.mcp_client import RemoteMCPClient
+
+        client = RemoteMCPClient("http://scrub/mcp", http=scrub_http)
+        with pytest.raises(RuntimeError, match="Unknown scrub profile"):
+            await client.scrub_prompt("x", profile="nope")
+        assert client.failures == 0
+
+    @pytest.mark.asyncio
+    async def test_session_lost(self, scrub_http):
+        """A server that forgot the session (restarted) fails the call and is
+        down until a health check reconnects it."""
+        from services.mcp_client import MCPProcessExited, RemoteMCPClient
+
+        client = RemoteMCPClient("http://scrub/mcp", http=scrub_http)
+        await client.scrub_prompt("x")
+        client._session_id = "unknown"
+        with pytest.raises(MCPProcessExited):
+            await client.scrub_prompt("x")
+        assert not client.available and client.failures == 1
+
+        client._retry_at = 0
+        assert await client.check()
+        assert client.available and client.starts == 2
+        assert (await client.scrub_prompt("a@example.com"))["summary"]
+
+    @pytest.mark.asyncio
+    async def test_pool_routes_around_down_server(
+        self, scrub_http, down_http, monkeypatch
+    ):
+        """Calls go only to servers that answered their health check."""
+        from services import mcp_client
+
+        https = {"http://up/mcp": scrub_http, "http://down/mcp": down_http}
+        remote = mcp_client.RemoteMCPClient
+        monkeypatch.setattr(
+            mcp_client, "RemoteMCPClient", lambda url: remote(url, http=https[url])
+        )
+        pool = mcp_client.MCPPool(endpoints=list(https), file_endpoints=[])
+        await pool.start()
+        try:
+            up, down = pool._pools["prompt"]
+            assert up.running and not down.available
+            results = await asyncio.gather(
+                *(pool.scrub_prompt(f"user{i}@example.com") for i in range(6))
+            )
+            assert all(r["sanitized_text"] == "[EMAIL_1]" for r in results)
+            assert up._request_id == 8  # initialize, ping, 6 calls
+
+            metrics = pool.metrics()
+            assert metrics["transport"] == "http"
+            assert metrics["file"] == {"size": 0, "shared_with": "prompt"}
+            assert [p["endpoint"] for p in metrics["prompt"]["processes"]] == list(
+                https
+            )
+            assert metrics["prompt"]["processes"][0]["ping_ms"] is not None
+
+            down._http = scrub_http  # Back up
+            down._retry_at = 0
+            await pool._check_all()
+            assert down.available and down.running
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_all_servers_down(self, down_http, monkeypatch):
+        """With every server down, calls fail fast with MCPUnavailable."""
+        from services import mcp_client
+
+        remote = mcp_client.RemoteMCPClient
+        monkeypatch.setattr(
+            mcp_client, "RemoteMCPClient", lambda url: remote(url, http=down_http)
+        )
+        pool = mcp_client.MCPPool(endpoints=["http://a/mcp", "http://b/mcp"])
+        await pool.start()
+        try:
+            with pytest.raises(mcp_client.MCPUnavailable, match="servers are down"):
+                await pool.scrub_prompt("x")
+        finally:
+            await pool.stop()
+
+    @pytest.mark.asyncio
+    async def test_server_events_parsed(self):
+        """SSE responses: one JSON-RPC message per event, data lines joined."""
+        import httpx
+
+        from services.mcp_client import _response_messages
+
+        body = (
+            'event: message\ndata: {"method": "notifications/progress",\n'
+            'data:  "params": {}}\n\n'
+            ": keep-alive\n\n"
+            'event: message\ndata: {"id": 1, "result": {}}\n\n'
+        )
+        response = httpx.Response(
+            200, headers={"content-type": "text/event-stream"}, content=body
+        )
+        messages = [m async for m in _response_messages(response)]
+        assert messages == [
+            {"method": "notifications/progress", "params": {}},
+            {"id": 1, "result": {}},
+        ]
@@ -0,0 +1,144 @@
+"""MCP server tool bodies — transfer by reference and batches."""
+
+import json
+
+import pytest
+
+from scrubbing import server
+from utils import transfer
+from utils.paths import PathSandbox
+
+MESSAGES = [
+    "mail bob@example.com",
+    "no secrets here",
+    "cc bob@example.com, mail alice@example.com",
+]
+
+
+@pytest.fixture
+def sandbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "scrub_sandbox", PathSandbox(tmp_path))
+    return tmp_path / "xfer"
+
+
+class TestServerTextTools:
+    def test_text_ref_and_columns(self, sandbox, monkeypatch):
+        """The server reads text_ref, encodes columns and returns big results by ref."""
+        monkeypatch.setattr(transfer, "INLINE_BYTES", 1024)
+        text = "mail bob@example.com from 10.0.0.1\n" * 50
+        ref = transfer.put(text)
+
+        answer = server._scrub_text("", ref, None, "all", "counter", "columns")
+        result = json.loads(transfer.take(answer["result_ref"]))
+        assert result["sanitized_text"].startswith("mail [EMAIL_")
+        replacements = transfer.Replacements(result["replacements"])
+        assert len(replacements) == sum(result["summary"].values()) == 100
+        assert [path.name for path in sandbox.iterdir()] == [ref]  # Caller's to delete
+
+    def test_unknown_format_rejected(self):
+        """replacements_format is validated."""
+        with pytest.raises(ValueError, match="replacements_format"):
+            server._scrub_text("x", None, None, "all", "counter", "table")
+
+
+class TestScrubBatch:
+    @pytest.mark.asyncio
+    async def test_results_in_order(self):
+        """One result per text, matching scrub_prompt on each text alone."""
+        answer = await server.scrub_batch.fn(MESSAGES, shared_tokenizer=False)
+        batch = answer["results"]
+        single = [
+            server._scrub_text(m, None, None, "standard", "counter", "rows")
+            for m in MESSAGES
+        ]
+        assert [r["sanitized_text"] for r in batch] == [
+            r["sanitized_text"] for r in single
+        ]
+        assert batch[1]["replacements"] == []
+
+    @pytest.mark.asyncio
+    async def test_shared_tokenizer_consistent_tokens(self):
+        """With a shared tokenizer a value keeps its token across texts."""
+        results = (await server.scrub_batch.fn(MESSAGES))["results"]
+        assert results[0]["sanitized_text"] == "mail [EMAIL_1]"
+        assert results[2]["sanitized_text"] == "cc [EMAIL_1], mail [EMAIL_2]"
+
+    @pytest.mark.asyncio
+    async def test_per_text_tokenizer(self):
+        """Without one, each text numbers its tokens from 1."""
+        answer = await server.scrub_batch.fn(MESSAGES, shared_tokenizer=False)
+        results = answer["results"]
+        assert results[0]["sanitized_text"] == "mail [EMAIL_1]"
+        # Right to left within the text: alice first
+        assert results[2]["sanitized_text"] == "cc [EMAIL_2], mail [EMAIL_1]"
+
+    @pytest.mark.asyncio
+    async def test_texts_by_reference(self, sandbox, monkeypatch):
+        """texts_ref is read as a JSON array; a big answer goes by reference."""
+        monkeypatch.setattr(transfer, "INLINE_BYTES", 256)
+        ref = transfer.put(json.dumps(MESSAGES * 10), ".json")
+        answer = await server.scrub_batch.fn(
+            texts_ref=ref, replacements_format="columns"
+        )
+        results = json.loads(transfer.take(answer["result_ref"]))["results"]
+        assert len(results) == 30
+        assert len(transfer.Replacements(results[2]["replacements"])) == 2
+
+    def test_chunks(self):
+        """Batches are cut into runs of about BATCH_CHUNK_BYTES, in order."""
+        texts = ["a" * 40, "b" * 40, "c" * 100, "d"]
+        assert list(server._chunks(texts, 90)) == [texts[:2], texts[2:3], texts[3:]]
+
+    @pytest.mark.asyncio
+    async def test_cancelled_between_chunks(self, monkeypatch):
+        """A cancelled batch stops after the chunk being scrubbed."""
+        import asyncio
+
+        monkeypatch.setattr(server, "BATCH_CHUNK_BYTES", 1)
+        scrubbed = []
+        release = asyncio.Event()
+
+        async def to_thread(fn, chunk):
+            scrubbed.append(chunk)
+            await release.wait()
+            return fn(chunk)
+
+        monkeypatch.setattr(server.asyncio, "to_thread", to_thread)
+        task = asyncio.create_task(server.scrub_batch.fn(MESSAGES))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert scrubbed == [MESSAGES[:1]]
+
+    @pytest.mark.asyncio
+    async def test_empty_batch(self):
+        """No texts, no results."""
+        assert await server.scrub_batch.fn([]) == {"results": []}
+
+
+class TestOutputLock:
+    def test_writer_waits_for_lock_held_elsewhere(self, tmp_path, monkeypatch):
+        """A scrub waits for a lock on its output held by another open file
+        (as another process or server would hold it), then runs."""
+        import fcntl
+        import threading
+
+        monkeypatch.setattr(server, "scrub_sandbox", PathSandbox(tmp_path))
+        monkeypatch.setattr(server, "scrub_log_file", lambda *args: {"ran": args})
+        lock_path = tmp_path / "ckpt" / "job.log.lock"
+        lock_path.parent.mkdir()
+        results = []
+
+        with open(lock_path, "a") as held:
+            fcntl.flock(held, fcntl.LOCK_EX)
+            thread = threading.Thread(
+                target=lambda: results.append(
+                    server._scrub_exclusive("job.log", "in.log", "job.log")
+                )
+            )
+            thread.start()
+            thread.join(0.2)
+            assert thread.is_alive() and not results  # Blocked on the lock
+        thread.join(5)
+        assert results == [{"ran": ("in.log", "job.log")}]
@@ -1,6 +1,6 @@
 """Regex pattern matching and capture group tests."""
 
-from mcp.scrubbers.core import CAPTURE_GROUP, LOG_PATTERNS, STANDARD_PATTERNS
+from scrubbing.scrubbers.core import CAPTURE_GROUP, LOG_PATTERNS, STANDARD_PATTERNS
 
 
 class TestStandardPatterns:
@@ -0,0 +1,56 @@
+"""Scrub profile registry tests."""
+
+import pytest
+
+from scrubbing.scrubbers.core import (
+    LOG_PATTERNS,
+    STANDARD_PATTERNS,
+    Tokenizer,
+    scrub_text,
+)
+from scrubbing.scrubbers.profiles import (
+    ALL_PATTERNS,
+    get_profile,
+    register_profile,
+)
+
+
+class TestScrubProfiles:
+    def test_builtin_profiles_registered(self):
+        """standard, log and all profiles exist with their pattern sets."""
+        assert get_profile("standard").item_types == tuple(STANDARD_PATTERNS)
+        assert get_profile("log").item_types == tuple(LOG_PATTERNS)
+        assert set(get_profile("all").item_types) == set(ALL_PATTERNS)
+
+    def test_unknown_profile_raises(self):
+        """Unknown profile names raise ValueError listing available profiles."""
+        with pytest.raises(ValueError, match="Unknown scrub profile"):
+            get_profile("nope")
+
+    def test_all_profile_matches_explicit_item_types(self):
+        """Profile scrub is identical to scrub_text with the same type list."""
+        text = "user=bob from 10.0.0.1 mailed bob@example.com GET /api/v1/x"
+        profile = get_profile("all")
+        expected = scrub_text(text, list(profile.item_types), ALL_PATTERNS, Tokenizer())
+        assert profile.scrub(text, Tokenizer()) == expected
+
+    def test_item_types_narrow_profile(self):
+        """item_types restricts a profile; types outside it are ignored."""
+        text = "bob@example.com from 10.0.0.1"
+        result, _, summary = get_profile("standard").scrub(
+            text, Tokenizer(), ["email", "ip"]
+        )
+        assert result == "[EMAIL_1] from 10.0.0.1"
+        assert summary == {"email": 1}
+
+    def test_register_custom_profile(self):
+        """Custom profiles compile once and are retrievable by name."""
+        profile = register_profile("test_ips", ["ip", "private_ip"])
+        assert get_profile("test_ips") is profile
+        result, _, _ = profile.scrub("from 10.0.0.1 bob@example.com", Tokenizer())
+        assert result == "from [IP_1] bob@example.com"
+
+    def test_register_rejects_unknown_item_type(self):
+        """Profiles can't reference item types missing from their patterns."""
+        with pytest.raises(ValueError, match="Unknown item types"):
+            register_profile("bad", ["email", "not_a_type"])
@@ -0,0 +1,97 @@
+"""Scrub job index — TTL and quota reaping of sandbox files."""
+
+import json
+
+import pytest
+
+from services import scrub_index
+from services.scrub_index import (
+    BYTES_KEY,
+    LRU_KEY,
+    ScrubReaper,
+    storage_metrics,
+    touch,
+)
+from utils.paths import PathSandbox
+
+NOW = 1_000_000.0
+
+
+@pytest.fixture
+def jobs(tmp_path, monkeypatch, redis_client):
+    """Create indexed jobs with an output file of size bytes, used at `used`."""
+    monkeypatch.setattr(scrub_index, "scrub_sandbox", PathSandbox(tmp_path))
+    for subdir in ("in", "out", "ckpt"):
+        (tmp_path / subdir).mkdir()
+
+    async def add(job_id: str, used: float, size: int = 100, status="done"):
+        output = f"{job_id}_app.log"
+        (tmp_path / "out" / output).write_bytes(b"x" * size)
+        (tmp_path / "ckpt" / f"{output}.ckpt").write_bytes(b"")
+        (tmp_path / "ckpt" / f"{output}.lock").write_bytes(b"")
+        record = {
+            "job_id": job_id,
+            "status": status,
+            "input_filename": f"{job_id}.txt",
+            "output_filename": output,
+            "output_bytes": size,
+        }
+        await redis_client.set(f"scrub_job:{job_id}", json.dumps(record))
+        await redis_client.incrby(BYTES_KEY, size)
+        await touch(redis_client, job_id, used)
+
+    return add
+
+
+class TestScrubReaper:
+    @pytest.mark.asyncio
+    async def test_ttl(self, redis_client, jobs, tmp_path):
+        """Jobs unused for the TTL lose their record, files and bytes."""
+        await jobs("old", NOW - 7200)
+        await jobs("new", NOW - 60)
+        reaper = ScrubReaper(redis_client, ttl=3600, quota=0)
+        assert await reaper.run_once(NOW) == 1
+
+        assert await redis_client.get("scrub_job:old") is None
+        assert not (tmp_path / "out" / "old_app.log").exists()
+        assert not (tmp_path / "ckpt" / "old_app.log.ckpt").exists()
+        assert not (tmp_path / "ckpt" / "old_app.log.lock").exists()
+        assert (tmp_path / "out" / "new_app.log").exists()
+        metrics = await storage_metrics(redis_client)
+        assert metrics["jobs"] == 1
+        assert metrics["bytes"] == 100
+        assert metrics["evicted_ttl"] == 1
+        assert metrics["bytes_freed"] == 100
+        assert metrics["last_reap_at"] == NOW
+
+    @pytest.mark.asyncio
+    async def test_quota_evicts_least_recently_used(self, redis_client, jobs):
+        """Over quota, the oldest finished jobs go first; running ones stay."""
+        await jobs("a", NOW - 40, status="scrubbing")
+        await jobs("b", NOW - 30)
+        await jobs("c", NOW - 20)
+        await jobs("d", NOW - 10)
+        await touch(redis_client, "b", NOW)  # Downloaded just now
+
+        reaper = ScrubReaper(redis_client, ttl=3600, quota=250)
+        assert await reaper.run_once(NOW) == 2
+        assert await redis_client.zrange(LRU_KEY, 0, -1) == ["a", "b"]
+        metrics = await storage_metrics(redis_client)
+        assert metrics["bytes"] == 200
+        assert metrics["evicted_quota"] == 2
+
+    @pytest.mark.asyncio
+    async def test_quota_unreachable_by_running_jobs(self, redis_client, jobs):
+        """Running jobs alone over quota end the pass instead of looping."""
+        await jobs("a", NOW - 10, size=500, status="queued")
+        reaper = ScrubReaper(redis_client, ttl=3600, quota=100)
+        assert await reaper.run_once(NOW) == 0
+
+    @pytest.mark.asyncio
+    async def test_reaped_once(self, redis_client, jobs):
+        """A job already taken by another reaper isn't counted twice."""
+        await jobs("a", NOW - 7200)
+        reaper = ScrubReaper(redis_client, ttl=3600)
+        assert await reaper.reap("a", "ttl")
+        assert not await reaper.reap("a", "ttl")
+        assert (await storage_metrics(redis_client))["bytes"] == 0
@@ -0,0 +1,375 @@
+"""Background scrub job queue and the upload/status/download routes."""
+
+import gzip
+import json
+from unittest.mock import AsyncMock
+
+import pytest
+
+from services import scrub_index, scrub_jobs, scrub_store
+from services.scrub_jobs import ScrubJob, ScrubJobQueue, get_job_status
+from utils.paths import PathSandbox
+
+LOG_DETECTION = {"needs_sanitization": True, "category": "log_file"}
+JOB = {
+    "job_id": "j1",
+    "filename": "app.log",
+    "input_filename": "j1.txt",
+    "output_filename": "j1_app.log",
+}
+
+
+class FakeClient:
+    """Stands in for the MCP pool — reports progress, then finishes."""
+
+    def __init__(self):
+        self.calls = []
+
+    async def scrub_log_as_file(self, input_path, output_path, on_progress, **kwargs):
+        self.calls.append((input_path, output_path, kwargs))
+        (scrub_jobs.scrub_sandbox.root / "out").mkdir(exist_ok=True)
+        (scrub_jobs.scrub_sandbox.root / "out" / output_path).write_text("[IP_1]\n")
+        await on_progress(
+            {"progress": 50, "total": 100, "message": '{"lines_processed": 5}'}
+        )
+        return {"lines_processed": 10, "items_scrubbed": 3, "summary": {"ip": 3}}
+
+    async def stop(self):
+        pass
+
+
+@pytest.fixture
+def sandbox(tmp_path, monkeypatch):
+    for module in (scrub_jobs, scrub_index, scrub_store):
+        monkeypatch.setattr(module, "scrub_sandbox", PathSandbox(tmp_path))
+    (tmp_path / "in").mkdir()
+    (tmp_path / "in" / "j1.txt").write_text("10.0.0.1 GET /\n")
+    return tmp_path
+
+
+@pytest.fixture
+def events(monkeypatch):
+    """Panel events published by the queue, as (status, extra) pairs."""
+    published = []
+
+    async def publish(redis, filename, status, event_type="file_event", **extra):
+        published.append((event_type, status, extra))
+
+    monkeypatch.setattr(scrub_jobs, "publish_file_event", publish)
+    return published
+
+
+async def run_job(redis_client, detection, client=None):
+    neuralizer = AsyncMock()
+    neuralizer.detect.return_value = detection
+    queue = ScrubJobQueue(redis_client, neuralizer, workers=1, client=client)
+    await queue.start()
+    try:
+        await queue.submit(ScrubJob(**JOB))
+        await queue.join()
+    finally:
+        await queue.stop()
+    return await get_job_status(redis_client, "j1")
+
+
+class TestScrubJobQueue:
+    @pytest.mark.asyncio
+    async def test_scrubs_and_reports_progress(self, redis_client, sandbox, events):
+        """A job runs detection, streams progress and ends done with its summary."""
+        client = FakeClient()
+        job = await run_job(redis_client, LOG_DETECTION, client)
+
+        assert client.calls[0][:2] == ("j1.txt", "j1_app.log")
+        assert client.calls[0][2]["profile"] == "all"
+        assert job["status"] == "done"
+        assert job["summary"] == {"ip": 3}
+        assert job["download_url"] == "/api/v1/files/download/j1"
+
+        progress = [extra for kind, _, extra in events if kind == "file_progress"]
+        assert progress[0]["lines_processed"] == 5
+        assert progress[0]["percent"] == 50.0
+        assert progress[0]["eta_secs"] is not None
+        assert events[-1][0] == "file_scrubbed"
+
+        # Input deleted once scrubbed; the output is what counts to the quota
+        assert not (sandbox / "in" / "j1.txt").exists()
+        assert int(await redis_client.get("scrub_jobs:bytes")) == 7
+        assert await redis_client.zscore("scrub_jobs:lru", "j1") is not None
+
+    @pytest.mark.asyncio
+    async def test_compressed_input_detected_decompressed(
+        self, redis_client, sandbox, events
+    ):
+        """Detection sees the text of a gzip input, not its compressed bytes."""
+        (sandbox / "in" / "j1.txt").write_bytes(gzip.compress(b"10.0.0.1 GET /\n"))
+        neuralizer = AsyncMock()
+        neuralizer.detect.return_value = {"needs_sanitization": False}
+        queue = ScrubJobQueue(redis_client, neuralizer, workers=1, client=FakeClient())
+        await queue._run(ScrubJob(**JOB))
+        neuralizer.detect.assert_awaited_once_with("10.0.0.1 GET /\n")
+
+    @pytest.mark.asyncio
+    async def test_clean_file_not_scrubbed(self, redis_client, sandbox, events):
+        """Clean detections skip scrubbing and drop the saved input."""
+        client = FakeClient()
+        job = await run_job(
+            redis_client, {"needs_sanitization": False, "category": "text"}, client
+        )
+        assert job["status"] == "clean"
+        assert client.calls == []
+        assert not (sandbox / "in" / "j1.txt").exists()
+
+    @pytest.mark.asyncio
+    async def test_detection_error_fails_closed(self, redis_client, sandbox, events):
+        """Detection errors end the job in error without scrubbing."""
+        client = FakeClient()
+        job = await run_job(
+            redis_client, {"category": "error", "summary": "LLM timeout"}, client
+        )
+        assert job["status"] == "error"
+        assert "LLM timeout" in job["error"]
+        assert client.calls == []
+        assert events[-1][1].startswith("Error: Detection failed")
+
+    @pytest.mark.asyncio
+    async def test_scrub_failure_recorded(self, redis_client, sandbox, events):
+        """An MCP failure is recorded on the job, and the worker keeps going."""
+        client = FakeClient()
+        client.scrub_log_as_file = AsyncMock(side_effect=RuntimeError("boom"))
+        job = await run_job(redis_client, LOG_DETECTION, client)
+        assert job["status"] == "error"
+        assert job["error"] == "Unexpected error: boom"
+
+
+class TestResume:
+    @pytest.mark.asyncio
+    async def test_interrupted_job_resumed_on_start(
+        self, redis_client, sandbox, events
+    ):
+        """A job cut off by stop() stays active and is rerun by the next start()."""
+        import asyncio
+
+        started = asyncio.Event()
+
+        class HangingClient(FakeClient):
+            async def scrub_log_as_file(self, *args, **kwargs):
+                started.set()
+                await asyncio.Event().wait()
+
+        neuralizer = AsyncMock()
+        neuralizer.detect.return_value = LOG_DETECTION
+        queue = ScrubJobQueue(redis_client, neuralizer, client=HangingClient())
+        await queue.start()
+        await queue.submit(ScrubJob(**JOB, output_codec="gzip"))
+        await started.wait()
+        await queue.stop()
+        assert (await get_job_status(redis_client, "j1"))["status"] == "scrubbing"
+
+        client = FakeClient()
+        queue = ScrubJobQueue(redis_client, neuralizer, client=client)
+        await queue.start()
+        try:
+            await queue.join()
+        finally:
+            await queue.stop()
+        assert (await get_job_status(redis_client, "j1"))["status"] == "done"
+        assert client.calls[0][2]["output_codec"] == "gzip"
+        assert await redis_client.smembers("scrub_jobs:active") == set()
+
+    @pytest.mark.asyncio
+    async def test_waiting_jobs_resumed_in_order(self, redis_client, sandbox, events):
+        """Jobs still queued at shutdown run after a restart, oldest first."""
+        neuralizer = AsyncMock()
+        neuralizer.detect.return_value = LOG_DETECTION
+        queue = ScrubJobQueue(redis_client, neuralizer, workers=0)
+        for job_id in ("j1", "j2"):
+            (sandbox / "in" / f"{job_id}.txt").write_text("10.0.0.1 GET /\n")
+            await queue.submit(
+                ScrubJob(**{**JOB, "job_id": job_id, "input_filename": f"{job_id}.txt"})
+            )
+        await queue.stop()
+
+        client = FakeClient()
+        queue = ScrubJobQueue(redis_client, neuralizer, workers=1, client=client)
+        await queue.start()
+        try:
+            await queue.join()
+        finally:
+            await queue.stop()
+        assert [call[0] for call in client.calls] == ["j1.txt", "j2.txt"]
+        assert (await get_job_status(redis_client, "j2"))["status"] == "done"
+
+    @pytest.mark.asyncio
+    async def test_lost_input_fails(self, redis_client, sandbox, events):
+        """A job whose input is gone is marked failed, not left active forever."""
+        queue = ScrubJobQueue(redis_client, AsyncMock(), workers=0)
+        await queue.submit(ScrubJob(**JOB))
+        (sandbox / "in" / "j1.txt").unlink()
+
+        await ScrubJobQueue(redis_client, AsyncMock(), workers=0).start()
+        job = await get_job_status(redis_client, "j1")
+        assert job["status"] == "error"
+        assert await redis_client.smembers("scrub_jobs:active") == set()
+
+
+class TestContentStore:
+    async def upload(self, queue, sandbox, job_id: str, filename: str):
+        """Save an identical upload under a new job id and submit it."""
+        (sandbox / "in" / f"{job_id}.txt").write_text("10.0.0.1 GET /\n")
+        return await queue.submit(
+            ScrubJob(
+                job_id=job_id,
+                filename=filename,
+                input_filename=f"{job_id}.txt",
+                output_filename=f"{job_id}_{filename}",
+                content_hash="c0ffee",
+            )
+        )
+
+    @pytest.mark.asyncio
+    async def test_repeat_upload_reuses_output(self, redis_client, sandbox, events):
+        """The same content under a new name is done at submit — no detect, no scrub."""
+        neuralizer = AsyncMock()
+        neuralizer.detect.return_value = LOG_DETECTION
+        client = FakeClient()
+        queue = ScrubJobQueue(redis_client, neuralizer, workers=1, client=client)
+        await queue.start()
+        try:
+            assert (await self.upload(queue, sandbox, "a1", "app.log"))[
+                "status"
+            ] == "queued"
+            await queue.join()
+            second = await self.upload(queue, sandbox, "b2", "renamed.log")
+        finally:
+            await queue.stop()
+
+        assert second["status"] == "done"
+        assert second["cached"] is True
+        assert second["summary"] == {"ip": 3}
+        assert len(client.calls) == 1
+        neuralizer.detect.assert_awaited_once()
+        assert not (sandbox / "in" / "b2.txt").exists()
+        assert not list((sandbox / "out").iterdir())  # Output moved to cas/
+        (blob,) = (sandbox / "cas").glob("*/*")
+        assert second["output_blob"] == blob.name
+
+        metrics = await scrub_index.storage_metrics(redis_client)
+        assert (metrics["cache_hits"], metrics["cache_misses"]) == (1, 1)
+        assert metrics["cache_hit_rate"] == 0.5
+        assert metrics["bytes"] == blob.stat().st_size
+
+        # The blob outlives the first job and goes with the last one
+        reaper = scrub_index.ScrubReaper(redis_client, ttl=3600)
+        await reaper.reap("a1", "ttl")
+        assert blob.exists()
+        await reaper.reap("b2", "ttl")
+        assert not blob.exists()
+        assert (await scrub_index.storage_metrics(redis_client))["bytes"] == 0
+
+    @pytest.mark.asyncio
+    async def test_last_release_and_adopt_serialized(
+        self, redis_client, sandbox, monkeypatch
+    ):
+        """An adopt racing the last release keeps its file: the release's
+        unlink can't land between the adopt's rename and its new reference."""
+        import asyncio
+
+        result = {"bytes": 7, "category": "log_file", "summary": {}}
+        (sandbox / "out").mkdir()
+        (sandbox / "out" / "a.log").write_text("[IP_1]\n")
+        await scrub_store.adopt(redis_client, "ab12", sandbox / "out" / "a.log", result)
+
+        unlinking, resume = asyncio.Event(), asyncio.Event()
+        to_thread = asyncio.to_thread
+
+        async def paused(fn, *args, **kwargs):
+            if getattr(fn, "__name__", "") == "unlink":
+                unlinking.set()
+                await resume.wait()
+            return await to_thread(fn, *args, **kwargs)
+
+        monkeypatch.setattr(scrub_store.asyncio, "to_thread", paused)
+        release = asyncio.create_task(scrub_store.release(redis_client, "ab12"))
+        await unlinking.wait()
+        (sandbox / "out" / "b.log").write_text("[IP_1]\n")
+        adopt = asyncio.create_task(
+            scrub_store.adopt(redis_client, "ab12", sandbox / "out" / "b.log", result)
+        )
+        await asyncio.sleep(0.05)
+        assert not adopt.done()  # Waits for the release to finish
+        resume.set()
+
+        assert await release == 7
+        assert (await adopt)[1] == 7  # A new blob
+        assert scrub_store.blob_path("ab12").exists()
+        assert await redis_client.hget("scrub_blob:ab12", "refs") == "1"
+
+    @pytest.mark.asyncio
+    async def test_adopt_keeps_existing_blob(self, redis_client, sandbox):
+        """A second adopt of the same key drops its output and leaves the blob
+        (and the ETag built from its mtime) untouched."""
+        result = {"bytes": 7, "category": "log_file", "summary": {}}
+        (sandbox / "out").mkdir()
+        (sandbox / "out" / "a.log").write_text("[IP_1]\n")
+        await scrub_store.adopt(redis_client, "ab12", sandbox / "out" / "a.log", result)
+        before = scrub_store.blob_path("ab12").stat()
+
+        (sandbox / "out" / "b.log").write_text("[IP_1]\n")
+        _, added = await scrub_store.adopt(
+            redis_client, "ab12", sandbox / "out" / "b.log", result
+        )
+
+        after = scrub_store.blob_path("ab12").stat()
+        assert added == 0
+        assert (after.st_ino, after.st_mtime_ns) == (before.st_ino, before.st_mtime_ns)
+        assert not list((sandbox / "out").iterdir())
+        assert await redis_client.hget("scrub_blob:ab12", "refs") == "2"
+
+    @pytest.mark.asyncio
+    async def test_cache_key_settings(self, monkeypatch):
+        """Profile, token mode and codec all change the key; random keys opt out."""
+        key = scrub_store.cache_key("c0ffee", "all", "counter", None)
+        assert key != scrub_store.cache_key("c0ffee", "standard", "counter", None)
+        assert key != scrub_store.cache_key("c0ffee", "all", "counter", "gzip")
+        monkeypatch.delenv("SCRUB_TOKEN_KEY", raising=False)
+        assert scrub_store.cache_key("c0ffee", "all", "hash", None) is None
+        monkeypatch.setenv("SCRUB_TOKEN_KEY", "k")
+        assert scrub_store.cache_key("c0ffee", "all", "hash", None) is not None
+
+
+class TestJobRoutes:
+    @pytest.fixture
+    def queued(self, tmp_path, monkeypatch):
+        """Upload route wired to a queue that only records submissions."""
+        from main import app as _app
+        from routes import files
+
+        monkeypatch.setattr(files, "scrub_sandbox", PathSandbox(tmp_path))
+        queue = AsyncMock()
+        queue.submit.return_value = {"status": "queued"}
+        monkeypatch.setattr(_app.state, "scrub_jobs", queue, raising=False)
+        monkeypatch.setattr(_app.state, "scrubbing_enabled", True, raising=False)
+        return queue
+
+    @pytest.mark.asyncio
+    async def test_upload_returns_once_queued(self, app, queued, tmp_path):
+        """The upload only validates, saves and queues — no detection or scrub."""
+        response = await app.post(
+            "/api/v1/files", files={"file": ("app.log", b"10.0.0.1 GET /\n")}
+        )
+        assert response.status_code == 200
+        job = queued.submit.await_args.args[0]
+        assert job.filename == "app.log"
+        assert (tmp_path / "in" / job.input_filename).read_text() == "10.0.0.1 GET /\n"
+
+    @pytest.mark.asyncio
+    async def test_status_and_download_wait(self, app, redis_client):
+        """Status is served from Redis; downloads wait for the job to finish."""
+        state = {"job_id": "j2", "status": "scrubbing", "percent": 40.0}
+        await redis_client.set("scrub_job:j2", json.dumps(state))
+
+        response = await app.get("/api/v1/files/status/j2")
+        assert response.json() == state
+        response = await app.get("/api/v1/files/download/j2")
+        assert response.status_code == 409
+        assert (await app.get("/api/v1/files/status/nope")).status_code == 404
@@ -1,9 +1,19 @@
 """scrub_text function and span replacement tests."""
 
-from mcp.scrubbers.core import (
+import time
+
+import pytest
+
+from scrubbing.bench import synthetic_log
+from scrubbing.scrubbers import core
+from scrubbing.scrubbers.core import (
     LOG_PATTERNS,
+    PREFILTER,
     STANDARD_PATTERNS,
+    PatternBudgetExceeded,
+    ScanStats,
     Tokenizer,
+    get_scan_plan,
     scrub_text,
 )
 
@@ -128,3 +138,159 @@ class TestScrubText:
         tokenizer2 = Tokenizer()
         result2, _, _ = scrub_text(text, ["ip"], LOG_PATTERNS, tokenizer2)
         assert "[IP_1]" in result2
+
+    def test_token_numbering_right_to_left(self):
+        """Tokens are numbered from the end of the text, as replacement runs."""
+        text = "from 10.0.0.1 to 10.0.0.2 and back to 10.0.0.1"
+        result, replacements, summary = scrub_text(
+            text, ["ip"], LOG_PATTERNS, Tokenizer()
+        )
+        assert result == "from [IP_1] to [IP_2] and back to [IP_1]"
+        assert [r["replacement"] for r in replacements] == [
+            "[IP_1]",
+            "[IP_2]",
+            "[IP_1]",
+        ]
+        assert summary == {"ip": 3}
+
+    def test_dense_overlaps_keep_longest_spans(self):
+        """Many adjacent and nested candidates resolve to the longest spans."""
+        line = "GET /api/v1/users from 192.168.1.1 at 2024-01-15T10:30:45\n"
+        text = line * 500
+        result, replacements, _ = scrub_text(
+            text,
+            ["endpoint", "path", "ip", "private_ip", "timestamp"],
+            LOG_PATTERNS | STANDARD_PATTERNS,
+            Tokenizer(),
+        )
+        assert result == "GET [ENDPOINT_1] from [IP_1] at [TIMESTAMP_1]\n" * 500
+        assert len(replacements) == 1500
+
+
+class TestScanPlan:
+    def test_plan_cached_per_selection(self):
+        """Same item types against the same pattern set reuse one plan."""
+        plan1 = get_scan_plan(["email", "phone"], STANDARD_PATTERNS)
+        plan2 = get_scan_plan(["email", "phone"], STANDARD_PATTERNS)
+        assert plan1 is plan2
+
+    def test_plan_drops_unknown_and_duplicate_types(self):
+        """Unknown types are skipped, duplicates collapse to first occurrence."""
+        plan = get_scan_plan(["email", "unknown", "email", "ip"], LOG_PATTERNS)
+        assert plan.item_types == ("ip",)
+
+    def test_plan_uses_capture_group_span(self):
+        """Scan reports the capture group value and span, not the full match."""
+        plan = get_scan_plan(["endpoint"], LOG_PATTERNS)
+        matches = plan.scan("GET /api/v1/users")
+        assert matches == [(4, 17, "/api/v1/users", "endpoint")]
+
+
+class TestPrefilter:
+    SAMPLES = [
+        "",
+        "plain words only",
+        "GET /api/v1/users HTTP/1.1",
+        "user=johndoe uid:1000",
+        "whoami\nroot",
+        "Contact John Smith at john@example.com",
+        "10.0.0.1 172.16.0.1 192.168.1.1 8.8.8.8",
+        "2024-01-15T10:30:45 and 10:30:45.123",
+        "password=supersecret123 AUTH: abcdefghijkl",
+        "Bearer eyJhbGciOiJIUzI1NiJ9abcdefgh",
+        "https://api.internal/v1 ~/projects /home/user/docs",
+        "proj:myorg:res_abc123def456 sk-abcdefghij12345678901234",
+        "Call 555-123-4567",
+    ]
+
+    def test_prefilter_never_rejects_a_match(self):
+        """Every prefilter is a necessary condition for its pattern."""
+        patterns = STANDARD_PATTERNS | LOG_PATTERNS
+        for item_type, check in PREFILTER.items():
+            for sample in self.SAMPLES:
+                if patterns[item_type].search(sample):
+                    assert check(sample), (item_type, sample)
+
+    def test_skipped_counts_reported(self):
+        """Patterns ruled out by the prefilter are counted per item type."""
+        stats = ScanStats()
+        plan = get_scan_plan(
+            ["email", "ip", "bearer"], STANDARD_PATTERNS | LOG_PATTERNS
+        )
+        plan.scan("nothing to see here", stats)
+        plan.scan("from 10.0.0.1", stats)
+        assert stats.skipped == {"email": 2, "bearer": 2, "ip": 1}
+
+
+class TestPatternBudget:
+    @pytest.fixture
+    def slow_clock(self, monkeypatch):
+        """Clock that advances one second per reading — every check overruns."""
+        ticks = iter(range(10**9))
+        monkeypatch.setattr(core, "perf_counter", lambda: float(next(ticks)))
+        monkeypatch.setattr(core, "PATTERN_BUDGET_MS", 1500)
+
+    def test_stats_record_time_and_matches(self):
+        """Per-type time and match counts are collected for patterns that ran."""
+        stats = ScanStats()
+        plan = get_scan_plan(["ip", "email"], STANDARD_PATTERNS | LOG_PATTERNS)
+        plan.scan("from 10.0.0.1 and 10.0.0.2", stats)
+        assert stats.matches == {"ip": 2}
+        assert set(stats.seconds) == {"ip"}
+        assert stats.overruns == []
+
+    def test_overrun_windowed_keeps_all_matches(self, slow_clock, monkeypatch):
+        """window action finishes the chunk in windows with the same matches."""
+        monkeypatch.setattr(core, "BUDGET_ACTION", "window")
+        text = synthetic_log(50)
+        plan = get_scan_plan(["ip", "timestamp"], LOG_PATTERNS, "re")
+        stats = ScanStats()
+        matches = plan.scan(text, stats)
+        monkeypatch.setattr(core, "PATTERN_BUDGET_MS", 0)
+        assert sorted(matches) == sorted(plan.scan(text))
+        assert {o["item_type"] for o in stats.overruns} == {"ip", "timestamp"}
+        assert all(o["action"] == "window" for o in stats.overruns)
+        assert stats.overruns[0]["chars"] == len(text)
+
+    def test_overrun_fail_closed(self, slow_clock, monkeypatch):
+        """fail action raises with the offending pattern and input size."""
+        monkeypatch.setattr(core, "BUDGET_ACTION", "fail")
+        plan = get_scan_plan(["ip"], LOG_PATTERNS, "re")
+        with pytest.raises(PatternBudgetExceeded, match="'ip'") as exc:
+            plan.scan("from 10.0.0.1 and 10.0.0.2")
+        assert exc.value.chars == len("from 10.0.0.1 and 10.0.0.2")
+
+    def test_completed_overrun_fails_closed(self, monkeypatch):
+        """One long backtrack that finishes over budget still fails under fail."""
+        monkeypatch.setattr(core, "PATTERN_BUDGET_MS", 20)
+        monkeypatch.setattr(core, "BUDGET_ACTION", "fail")
+        plan = get_scan_plan(["email"], STANDARD_PATTERNS, "re")
+        with pytest.raises(PatternBudgetExceeded, match="'email'"):
+            plan.scan("x." + "a" * 8000 + "@")  # Quadratic, no match to stop at
+
+    def test_windowed_after_overrun(self, monkeypatch):
+        """Once a pattern overruns, its later chunks are scanned in windows."""
+        monkeypatch.setattr(core, "PATTERN_BUDGET_MS", 20)
+        monkeypatch.setattr(core, "BUDGET_ACTION", "window")
+        plan = get_scan_plan(["email"], STANDARD_PATTERNS, "re")
+        stats = ScanStats()
+        plan.scan("x." + "a" * 8000 + "@", stats)
+        assert [o["action"] for o in stats.overruns] == ["completed"]
+
+        monkeypatch.setattr(core, "WINDOW_OVERLAP", 256)
+        monkeypatch.setattr(core, "WINDOW_CHARS", 1024)
+        text = "x." + "a" * 40000 + "@ bob@example.com"  # ~10 s in one scan
+        started = time.perf_counter()
+        matches = plan.scan(text, stats)
+        assert time.perf_counter() - started < 2
+        assert [m[2] for m in matches] == ["bob@example.com"]
+
+    @pytest.mark.parametrize("item_type", sorted(STANDARD_PATTERNS | LOG_PATTERNS))
+    def test_windowed_finditer_matches_full_scan(self, item_type):
+        """Windowed scanning finds the same spans as a full finditer."""
+        pattern = (STANDARD_PATTERNS | LOG_PATTERNS)[item_type]
+        text = synthetic_log(400) + TestPrefilter.SAMPLES[-3] * 300
+        window = 2 * core.WINDOW_OVERLAP
+        full = [m.span() for m in pattern.finditer(text)]
+        windowed = [m.span() for m in core._windowed_finditer(pattern, text, 0, window)]
+        assert windowed == full
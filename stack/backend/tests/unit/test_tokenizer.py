@@ -1,6 +1,15 @@
 """Tokenizer class tests."""
 
-from mcp.scrubbers.core import Tokenizer
+import re
+
+import pytest
+
+from scrubbing.scrubbers.core import (
+    HashTokenizer,
+    Tokenizer,
+    derive_token_key,
+    make_tokenizer,
+)
 
 
 class TestTokenizer:
@@ -34,3 +43,87 @@ class TestTokenizer:
         t.tokenize("b@example.com", "EMAIL")
         t.tokenize("555-1234", "PHONE")
         assert t.total_tokens == 3
+
+    def test_long_values_keyed_by_digest(self):
+        """Long values are stored by digest but still map consistently."""
+        t = Tokenizer()
+        long_value = "/api/v1/users/" + "x" * 200
+        assert t.tokenize(long_value, "ENDPOINT") == "[ENDPOINT_1]"
+        assert t.tokenize(long_value + "y", "ENDPOINT") == "[ENDPOINT_2]"
+        assert t.tokenize(long_value, "ENDPOINT") == "[ENDPOINT_1]"
+
+    def test_spill_to_disk_keeps_numbering(self):
+        """Crossing the spill threshold moves maps to disk without renumbering."""
+        values = [f"10.0.{i // 256}.{i % 256}" for i in range(500)]
+        in_memory = Tokenizer()
+        spilling = Tokenizer(spill_mb=0.01)
+        try:
+            for value in values + values[::-1]:
+                assert spilling.tokenize(value, "IP") == in_memory.tokenize(value, "IP")
+            assert spilling.spilled
+            assert spilling.total_tokens == in_memory.total_tokens == 500
+        finally:
+            spilling.close()
+
+    @pytest.mark.parametrize("spill_mb", [0, 0.01])
+    def test_journal_restore_continues_numbering(self, spill_mb):
+        """A tokenizer restored from another's journal numbers on identically."""
+        values = [f"10.0.{i // 256}.{i % 256}" for i in range(500)]
+        original = Tokenizer()
+        original.tokenize("ignored", "HOST")  # Before the journal starts
+        original.start_journal()
+        for value in values[:300]:
+            original.tokenize(value, "IP")
+        rows = original.drain_journal()
+        assert len(rows) == 300 and original.drain_journal() == []
+
+        restored = Tokenizer(spill_mb=spill_mb)
+        try:
+            restored.restore([("HOST", "ignored", 1), *rows])
+            assert restored.spilled == bool(spill_mb)
+            for value in values[::-1]:
+                assert restored.tokenize(value, "IP") == original.tokenize(value, "IP")
+            assert restored.tokenize("new", "HOST") == "[HOST_2]"
+        finally:
+            restored.close()
+
+
+class TestHashTokenizer:
+    def test_same_key_same_tokens_across_instances(self):
+        """Independent tokenizers sharing a key agree on every token."""
+        key = derive_token_key("shared-secret")
+        a, b = HashTokenizer(key), HashTokenizer(key)
+        values = ["10.0.0.1", "10.0.0.2", "bob@example.com"]
+        assert [a.tokenize(v, "IP") for v in values] == [
+            b.tokenize(v, "IP") for v in reversed(values)
+        ][::-1]
+
+    def test_token_format_and_prefix_separation(self):
+        """Tokens carry the prefix and a hex digest; prefixes hash separately."""
+        t = HashTokenizer(derive_token_key("k"), chars=12)
+        ip = t.tokenize("10.0.0.1", "IP")
+        assert re.fullmatch(r"\[IP_[0-9a-f]{12}\]", ip)
+        assert t.tokenize("10.0.0.1", "URL")[5:] != ip[4:]
+        assert t.tokenize("10.0.0.1", "IP") == ip
+
+    def test_different_keys_different_tokens(self):
+        a = HashTokenizer(derive_token_key("one"))
+        b = HashTokenizer(derive_token_key("two"))
+        assert a.tokenize("10.0.0.1", "IP") != b.tokenize("10.0.0.1", "IP")
+
+    def test_collision_falls_back_to_full_digest(self):
+        """Values colliding on the short digest get distinct full-length tokens."""
+        t = HashTokenizer(derive_token_key("k"), chars=8)
+        # 8 hex chars = 32 bits; force a collision by pre-seeding the map
+        first = t.tokenize("value-0", "IP")
+        t._seen["IP"][t.tokenize("value-1", "IP")[4:-1]] = "someone-else"
+        second = t.tokenize("value-1", "IP")
+        assert t.collisions == 1
+        assert re.fullmatch(r"\[IP_[0-9a-f]{32}\]", second)
+        assert first != second
+
+    def test_make_tokenizer_modes(self):
+        assert isinstance(make_tokenizer("counter"), Tokenizer)
+        assert isinstance(make_tokenizer("hash"), HashTokenizer)
+        with pytest.raises(ValueError, match="Unknown token mode"):
+            make_tokenizer("uuid")
@@ -0,0 +1,70 @@
+"""MCP payloads by reference and columnar replacements."""
+
+import json
+import os
+import time
+
+import pytest
+
+from utils import transfer
+from utils.paths import PathSandbox
+
+ROWS = [
+    {"replacement": "[IP_2]", "item_type": "ip"},
+    {"replacement": "[EMAIL_1]", "item_type": "email"},
+    {"replacement": "[IP_1]", "item_type": "ip"},
+]
+
+
+@pytest.fixture
+def sandbox(tmp_path, monkeypatch):
+    monkeypatch.setattr(transfer, "scrub_sandbox", PathSandbox(tmp_path))
+    return tmp_path / "xfer"
+
+
+class TestReplacements:
+    def test_columns_round_trip(self):
+        """Columns read back as the original rows."""
+        columns = transfer.encode_replacements(ROWS)
+        assert columns["types"] == ["ip", "email"]
+        assert columns["item_type"] == [0, 1, 0]
+        replacements = transfer.Replacements(columns)
+        assert len(replacements) == 3
+        assert replacements == ROWS
+        assert replacements[-1] == ROWS[-1]
+        assert replacements[1:] == ROWS[1:]
+
+    def test_columns_smaller(self):
+        """The columnar encoding is much smaller than rows of objects."""
+        rows = [{"replacement": f"[IP_{i}]", "item_type": "ip"} for i in range(1000)]
+        columns = json.dumps(transfer.encode_replacements(rows))
+        assert len(columns) < len(json.dumps(rows)) / 2
+
+
+class TestTransferFiles:
+    def test_small_result_inline(self, sandbox):
+        """Results under INLINE_BYTES are returned as they are."""
+        assert transfer.inline_or_ref({"a": 1}) == {"a": 1}
+        assert not sandbox.exists()
+
+    def test_large_result_by_reference(self, sandbox, monkeypatch):
+        """A large result becomes a file the reader takes (and deletes)."""
+        monkeypatch.setattr(transfer, "INLINE_BYTES", 100)
+        result = {"sanitized_text": "ü" * 100}
+        ref = transfer.inline_or_ref(result)
+        assert list(ref) == ["result_ref"]
+        assert json.loads(transfer.take(ref["result_ref"])) == result
+        assert not list(sandbox.iterdir())
+
+    def test_names_confined(self, sandbox):
+        """A reference can't name a file outside xfer/."""
+        with pytest.raises(ValueError):
+            transfer.read("../in/secret.txt")
+
+    def test_sweep_old_files(self, sandbox):
+        """Only files older than max_age are swept."""
+        old, new = transfer.put("old"), transfer.put("new")
+        stale = time.time() - 7200
+        os.utime(sandbox / old, (stale, stale))
+        assert transfer.sweep(3600) == 1
+        assert [path.name for path in sandbox.iterdir()] == [new]
@@ -0,0 +1,243 @@
+"""gzip / zstd streams for compressed log uploads and scrubbed output.
+
+Codecs are identified by magic bytes, never by file name — upload names
+and MCP arguments aren't trusted. zstd needs the optional zstandard
+package; without it only gzip is accepted.
+
+Compressed output can be cut back to a CompressedWriter.flush() point and
+continued from there, which scrub checkpoints rely on. gzip output stays a
+single member — clients decoding Content-Encoding: gzip commonly stop after
+the first one — so a flush is a full deflate flush, and the CRC and length
+needed to resume are in CompressedWriter.state. zstd output is a series of
+frames, one per flush.
+"""
+
+import gzip
+import struct
+import zlib
+from typing import BinaryIO, Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # Optional dependency
+    zstandard = None
+
+MAGIC = {"gzip": b"\x1f\x8b", "zstd": b"\x28\xb5\x2f\xfd"}
+SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+# Content-Encoding token per codec
+ENCODINGS = {"gzip": "gzip", "zstd": "zstd"}
+# zstd input per decompress call — bounds the output of one call (a block
+# header and a few bytes of sequences can expand to 128 KiB)
+_ZSTD_SLICE = 64
+# Fixed gzip member header: deflate, no flags, no mtime, Unix
+_GZIP_HEADER = b"\x1f\x8b\x08\x00\x00\x00\x00\x00\x00\x03"
+
+
+def available_codecs() -> tuple[str, ...]:
+    return ("gzip", "zstd") if zstandard is not None else ("gzip",)
+
+
+def sniff_codec(head: bytes) -> Optional[str]:
+    """Codec whose magic bytes start head, or None for plain data."""
+    for codec, magic in MAGIC.items():
+        if head.startswith(magic):
+            return codec
+    return None
+
+
+def file_codec(path) -> Optional[str]:
+    with open(path, "rb") as f:
+        return sniff_codec(f.read(4))
+
+
+def strip_suffix(name: str, codec: Optional[str]) -> str:
+    """Drop the codec's suffix: "app.log.gz" -> "app.log" for gzip."""
+    suffix = SUFFIXES.get(codec, "")
+    return name[: -len(suffix)] if suffix and name.endswith(suffix) else name
+
+
+def _require(codec: str) -> None:
+    if codec not in available_codecs():
+        raise ValueError(
+            f"Unsupported compression '{codec}'. Available: {available_codecs()}"
+        )
+
+
+class Inflater:
+    """Incremental decompressor for data arriving in chunks (uploads).
+
+    feed() yields decompressed pieces of bounded size, so a small, highly
+    compressed chunk can't expand into one huge buffer: gzip output is
+    capped per call, zstd input is fed in small slices. Concatenated gzip
+    members / zstd frames are followed.
+    """
+
+    def __init__(self, codec: str, max_piece: int = 1024 * 1024):
+        _require(codec)
+        self.codec = codec
+        self.max_piece = max_piece
+        self._obj = self._new()
+        self._ended = False
+
+    def _new(self):
+        if self.codec == "gzip":
+            return zlib.decompressobj(wbits=31)
+        return zstandard.ZstdDecompressor().decompressobj()
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        """Decompress data.
+
+        Raises:
+            ValueError: On a corrupt stream
+        """
+        try:
+            if self.codec == "gzip":
+                yield from self._feed_gzip(data)
+            else:
+                for start in range(0, len(data), _ZSTD_SLICE):
+                    yield from self._feed_zstd(data[start : start + _ZSTD_SLICE])
+        except (zlib.error, EOFError) as e:
+            raise ValueError(f"Corrupt {self.codec} data: {e}") from e
+        except Exception as e:
+            if zstandard is not None and isinstance(e, zstandard.ZstdError):
+                raise ValueError(f"Corrupt {self.codec} data: {e}") from e
+            raise
+
+    def _feed_gzip(self, data: bytes) -> Iterator[bytes]:
+        while True:
+            if data:
+                self._ended = False
+            piece = self._obj.decompress(data, self.max_piece)
+            data = self._obj.unconsumed_tail
+            if self._obj.eof:  # Member done; the rest starts a new one
+                data = self._obj.unused_data
+                self._obj = self._new()
+                self._ended = True
+            if piece:
+                yield piece
+            # A full piece may leave output pending even with no input left
+            if not data and len(piece) < self.max_piece:
+                return
+
+    def _feed_zstd(self, data: bytes) -> Iterator[bytes]:
+        while data:
+            self._ended = False
+            piece = self._obj.decompress(data)
+            data = b""
+            if self._obj.eof:
+                data = self._obj.unused_data
+                self._obj = self._new()
+                self._ended = True
+            if piece:
+                yield piece
+
+    def finish(self) -> None:
+        """Raise ValueError if the stream stopped mid-member/frame."""
+        if not self._ended:
+            raise ValueError(f"Truncated {self.codec} data")
+
+
+def open_reader(raw: BinaryIO, codec: str) -> BinaryIO:
+    """Decompressing reader over an open binary file."""
+    _require(codec)
+    if codec == "gzip":
+        return gzip.GzipFile(fileobj=raw, mode="rb")
+    return zstandard.ZstdDecompressor().stream_reader(
+        raw, read_across_frames=True, closefd=False
+    )
+
+
+def iter_decompressed(raw: BinaryIO, codec: str, size: int) -> Iterator[bytes]:
+    """Decompressed data from raw in pieces of about size bytes."""
+    with open_reader(raw, codec) as reader:
+        yield from iter(lambda: reader.read(size), b"")
+
+
+class CompressedWriter:
+    """Binary writer that compresses into raw; see the module docstring.
+
+    resume is the state saved at the flush point raw was cut back to, or
+    None to start a new stream at raw's position.
+    """
+
+    def __init__(
+        self,
+        raw: BinaryIO,
+        codec: str,
+        level: Optional[int] = None,
+        resume: Optional[dict] = None,
+    ):
+        _require(codec)
+        self.raw = raw
+        self.codec = codec
+        self.level = level
+        self._obj = None
+        self._written = False
+        self._crc = 0
+        self._size = 0
+        if codec == "gzip":
+            if resume is None:
+                raw.write(_GZIP_HEADER)
+            else:
+                self._crc, self._size = resume["crc"], resume["size"]
+
+    def _new(self):
+        if self.codec == "gzip":
+            level = 6 if self.level is None else self.level
+            return zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS)
+        level = 3 if self.level is None else self.level
+        return zstandard.ZstdCompressor(level=level).compressobj()
+
+    @property
+    def state(self) -> dict:
+        """What resume needs to continue from the last flush."""
+        if self.codec == "gzip":
+            return {"crc": self._crc, "size": self._size}
+        return {}
+
+    def write(self, data: bytes) -> int:
+        if self._obj is None:
+            self._obj = self._new()
+            self._written = True
+        if self.codec == "gzip":
+            self._crc = zlib.crc32(data, self._crc)
+            self._size = (self._size + len(data)) & 0xFFFFFFFF
+        self.raw.write(self._obj.compress(data))
+        return len(data)
+
+    def flush(self) -> None:
+        """Make everything written so far a resumable flush point in raw."""
+        if self._obj is not None:
+            if self.codec == "gzip":
+                # Byte-aligned and independent of what came before, so a
+                # new compressor can carry on from here after a cut
+                self.raw.write(self._obj.flush(zlib.Z_FULL_FLUSH))
+            else:
+                self.raw.write(self._obj.flush())
+                self._obj = None
+        self.raw.flush()
+
+    def tell(self) -> int:
+        """Position in raw — a flush point only right after flush()."""
+        return self.raw.tell()
+
+    def fileno(self) -> int:
+        return self.raw.fileno()
+
+    def close(self) -> None:
+        """End the stream — even an empty one is a valid member/frame."""
+        # A gzip member needs its final block; zstd frames end at flush()
+        if self._obj is None and (self.codec == "gzip" or not self._written):
+            self._obj = self._new()
+        if self._obj is not None:
+            self.raw.write(self._obj.flush())
+        if self.codec == "gzip":
+            self.raw.write(struct.pack("<II", self._crc, self._size))
+        self._obj = None
+        self.raw.close()
+
+    def __enter__(self) -> "CompressedWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
@@ -0,0 +1,126 @@
+"""Large MCP payloads by reference, and the columnar replacements encoding.
+
+JSON-RPC messages on the MCP stdio pipe are single lines, read with a
+bounded StreamReader. Anything bigger than INLINE_BYTES goes through a file
+under /data/scrub/xfer instead and the message carries its name:
+    arguments  {"text_ref": name}    instead of {"text": ...}
+    result     {"result_ref": name}  instead of the result
+The client writes and deletes argument files; the server writes result
+files and the client deletes them as it reads them. How much text a prompt
+may have is policy (SCRUB_PROMPT_LIMIT_KB), not a transport limit.
+
+Replacements travel as columns, item types dictionary-encoded:
+    {"replacement": ["[EMAIL_1]", "[IP_1]"], "item_type": [0, 1],
+     "types": ["email", "ip"]}
+rather than one {"replacement": ..., "item_type": ...} object per match.
+"""
+
+import json
+import os
+import time
+import uuid
+from collections.abc import Sequence
+
+from utils.paths import scrub_sandbox
+
+# Largest argument or result sent inline (bytes of JSON)
+INLINE_BYTES = int(os.getenv("SCRUB_MCP_INLINE_KB", "64")) * 1024
+# Client line limit: an inline result is JSON text inside the JSON-RPC
+# response, so escaped once more (at most doubled), plus the envelope
+LINE_LIMIT = 4 * INLINE_BYTES
+SUBDIR = "xfer"
+
+
+def put(data: str, suffix: str = ".txt") -> str:
+    """Write data to a new transfer file and return its name."""
+    name = f"{uuid.uuid4().hex}{suffix}"
+    path = scrub_sandbox.resolve(name, SUBDIR)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(data, encoding="utf-8")
+    return name
+
+
+def read(name: str) -> str:
+    """Contents of a transfer file (ValueError for names outside xfer/)."""
+    return scrub_sandbox.resolve(name, SUBDIR).read_text(encoding="utf-8")
+
+
+def take(name: str) -> str:
+    """Read a transfer file and delete it."""
+    try:
+        return read(name)
+    finally:
+        discard(name)
+
+
+def discard(name: str) -> None:
+    scrub_sandbox.resolve(name, SUBDIR).unlink(missing_ok=True)
+
+
+def sweep(max_age: float) -> int:
+    """Delete transfer files older than max_age seconds — left by calls that
+    timed out before the client read their result.
+
+    Returns:
+        Number of files deleted
+    """
+    directory = scrub_sandbox.resolve("", SUBDIR)
+    if not directory.is_dir():
+        return 0
+    cutoff = time.time() - max_age
+    removed = 0
+    for path in directory.iterdir():
+        try:
+            if path.stat().st_mtime < cutoff:
+                path.unlink()
+                removed += 1
+        except FileNotFoundError:  # Taken meanwhile
+            pass
+    return removed
+
+
+def inline_or_ref(result: dict) -> dict:
+    """result itself if small enough, else {"result_ref": name}."""
+    encoded = json.dumps(result, ensure_ascii=False)  # As FastMCP sends it
+    if len(encoded.encode("utf-8")) <= INLINE_BYTES:
+        return result
+    return {"result_ref": put(encoded, ".json")}
+
+
+def encode_replacements(rows: list[dict]) -> dict:
+    """Rows of {"replacement", "item_type"} to columns."""
+    types: dict[str, int] = {}
+    return {
+        "replacement": [row["replacement"] for row in rows],
+        "item_type": [types.setdefault(row["item_type"], len(types)) for row in rows],
+        "types": list(types),
+    }
+
+
+class Replacements(Sequence):
+    """Columnar replacements, read as a list of {"replacement", "item_type"}."""
+
+    def __init__(self, columns: dict):
+        self.columns = columns
+        self._tokens = columns["replacement"]
+        self._types = columns["types"]
+        self._type_ids = columns["item_type"]
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        return {
+            "replacement": self._tokens[index],
+            "item_type": self._types[self._type_ids[index]],
+        }
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Replacements):
+            return list(self) == list(other)
+        return isinstance(other, list) and list(self) == other
+
+    def __repr__(self) -> str:
+        return f"Replacements({len(self)} items, types={self._types})"
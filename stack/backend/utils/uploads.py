@@ -0,0 +1,85 @@
+"""Streaming multipart reader — file uploads arrive chunk by chunk."""
+
+from typing import AsyncIterator
+
+from python_multipart.multipart import MultipartParser, parse_options_header
+from starlette.requests import Request
+
+
+class UploadFormError(ValueError):
+    """Body is not multipart/form-data, or has no such file field."""
+
+
+async def iter_upload(
+    request: Request, field: str = "file"
+) -> AsyncIterator[tuple[str, bytes]]:
+    """Yield (filename, chunk) for one file field as the body streams in.
+
+    UploadFile spools the whole body before the endpoint runs; parsing
+    request.stream() here lets the caller reject an upload (size, type)
+    before the rest of it arrives. The first item is (filename, b"") so the
+    name is known before any data. Other parts are skipped, and reading
+    stops at the end of the field.
+
+    Raises:
+        UploadFormError: If the body is not multipart or lacks the field
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise UploadFormError("Expected a multipart/form-data upload")
+
+    # Parser callbacks are synchronous: queue events, handle them per chunk
+    events: list[tuple[str, object]] = []
+    headers: dict[bytes, bytes] = {}
+    header = [b"", b""]
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header[0] += data[start:end]
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header[1] += data[start:end]
+
+    def on_header_end() -> None:
+        headers[header[0].lower()] = header[1]
+        header[:] = [b"", b""]
+
+    parser = MultipartParser(
+        boundary,
+        {
+            "on_part_begin": headers.clear,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": lambda: events.append(("part", dict(headers))),
+            "on_part_data": lambda data, start, end: events.append(
+                ("data", data[start:end])
+            ),
+            "on_part_end": lambda: events.append(("end", None)),
+        },
+    )
+
+    filename = None
+    in_field = False
+    async for chunk in request.stream():
+        parser.write(chunk)
+        for kind, value in events:
+            if kind == "part":
+                _, options = parse_options_header(
+                    value.get(b"content-disposition", b"")
+                )
+                in_field = (
+                    options.get(b"name") == field.encode() and b"filename" in options
+                )
+                if in_field:
+                    filename = options[b"filename"].decode("utf-8", "replace")
+                    yield filename, b""
+            elif kind == "data" and in_field and value:
+                yield filename, value
+            elif kind == "end" and in_field:
+                return
+        events.clear()
+
+    if filename is not None:
+        raise UploadFormError("Upload ended before the file did")
+    raise UploadFormError(f"No file in form field '{field}'")